@@ -0,0 +1,156 @@
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+
+from prefilter import SNIFF_SIZE
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+ARCHIVE_CHUNK_SIZE = 64 * 1024 * 1024  # staged bytes per Gitleaks run, the peak scratch disk usage
+MEMBER_SEPARATOR = "!"  # findings inside archives are reported as archive!member (archive!layer.tar!member...)
+MAX_NESTING = 3  # archives inside archives (image layers...) are scanned up to this depth
+SKIP_REASONS = ("too_large", "binary", "empty", "unsafe")
+
+
+class ArchiveError(Exception):
+    """ the archive cannot be read (corrupted, truncated, not an archive) """
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def member_path(archive_path, member_name):
+    return f"{archive_path}{MEMBER_SEPARATOR}{member_name}"
+
+
+def _staged_name(member_name):
+    """ the member name as a relative path that stays inside the staging directory (no absolute or .. path) """
+    return '/'.join(part for part in member_name.replace('\\', '/').split('/') if part not in ('', '.', '..'))
+
+
+class ArchiveStager:
+    """ stream the regular members of an archive into a staging directory, one chunk at a time: at most
+    `chunk_size` bytes are on disk at once, whatever the size of the archive. binary, empty and too large
+    members (bigger than `max_file_size`, or than a chunk) are skipped without being written. tar archives
+    are read sequentially (they are never seeked, so compressed tarballs are decompressed once), zip
+    archives through their central directory. archives found inside the archive are scanned too """
+
+    def __init__(self, archive_path, staging_dir, chunk_size=ARCHIVE_CHUNK_SIZE, max_file_size=None,
+                 skip_binary=True):
+        self.archive_path = archive_path
+        self.staging_dir = staging_dir
+        self.chunk_size = chunk_size
+        self.max_file_size = chunk_size if max_file_size is None else min(max_file_size, chunk_size)
+        self.skip_binary = skip_binary
+        self.files = self.kept_bytes = self.chunks = 0
+        self.skipped = {reason: [0, 0] for reason in SKIP_REASONS}
+        self._members = {}  # staged relative path -> member name, for the current chunk
+        self._chunk_bytes = 0
+
+    def iter_chunks(self):
+        """ yields {staged relative path: member name} for every chunk staged in the staging directory.
+        the chunk stays on disk until the next one is requested """
+        self._clear()
+        try:
+            with open(self.archive_path, 'rb') as archive:
+                yield from self._iter_archive(archive, self.archive_path, prefix='', depth=0)
+        except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+            raise ArchiveError(f"Failed to read the archive {self.archive_path}: {str(e)}")
+        if self._members:
+            yield from self._flush()
+
+    def _iter_archive(self, archive, name, prefix, depth):
+        if name.lower().endswith('.zip'):
+            with zipfile.ZipFile(archive) as zip_archive:
+                for info in zip_archive.infolist():
+                    if not info.is_dir():
+                        yield from self._add_member(prefix + info.filename, info.file_size,
+                                                    lambda info=info: zip_archive.open(info), depth)
+        else:
+            with tarfile.open(fileobj=archive, mode='r|*') as tar_archive:
+                for info in tar_archive:
+                    if info.isreg():
+                        yield from self._add_member(prefix + info.name, info.size,
+                                                    lambda info=info: tar_archive.extractfile(info), depth)
+
+    def _add_member(self, member_name, size, open_member, depth):
+        if member_name.lower().endswith(ARCHIVE_SUFFIXES) and depth < MAX_NESTING:
+            yield from self._add_nested_archive(member_name, size, open_member, depth)
+            return
+        staged_name = _staged_name(member_name)
+        reason = None
+        if not staged_name:
+            reason = "unsafe"
+        elif size == 0:
+            reason = "empty"
+        elif size > self.max_file_size:
+            reason = "too_large"
+        if reason is None:
+            with open_member() as member:
+                head = member.read(SNIFF_SIZE)
+                if self.skip_binary and b'\0' in head:
+                    reason = "binary"
+                else:
+                    if self._chunk_bytes + size > self.chunk_size or staged_name in self._members:
+                        yield from self._flush()
+                    if not self._write(staged_name, head, member):
+                        yield from self._flush()  # its path clashes with a file or directory of the chunk
+                        self._write(staged_name, head, member)
+        if reason is not None:
+            self.skipped[reason][0] += 1
+            self.skipped[reason][1] += size
+            return
+        self._members[staged_name] = member_name
+        self._chunk_bytes += size
+        self.files += 1
+        self.kept_bytes += size
+
+    def _add_nested_archive(self, member_name, size, open_member, depth):
+        """ scan an archive member as an archive of its own: tars are streamed, zips need random access and
+        are only read when they fit in a chunk (they are held in memory) """
+        prefix = member_name + MEMBER_SEPARATOR
+        if member_name.lower().endswith('.zip'):
+            if size > self.chunk_size:
+                self.skipped["too_large"][0] += 1
+                self.skipped["too_large"][1] += size
+                return
+            with open_member() as member:
+                nested = io.BytesIO(member.read())
+        else:
+            nested = open_member()
+        with nested:
+            yield from self._iter_archive(nested, member_name, prefix, depth + 1)
+
+    def _write(self, staged_name, head, member):
+        """ stage one member, returns False (nothing written) when a file and a directory of the chunk clash """
+        staged_path = os.path.join(self.staging_dir, staged_name)
+        try:
+            os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+            staged_file = open(staged_path, 'wb')
+        except (FileExistsError, NotADirectoryError, IsADirectoryError):
+            return False
+        with staged_file:
+            staged_file.write(head)
+            shutil.copyfileobj(member, staged_file)
+        return True
+
+    def _flush(self):
+        self.chunks += 1
+        yield self._members
+        self._clear()
+
+    def _clear(self):
+        self._members = {}
+        self._chunk_bytes = 0
+        if os.path.isdir(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+        os.makedirs(self.staging_dir)
+
+    def summary(self):
+        skipped = sum(files for files, _ in self.skipped.values())
+        details = ', '.join(f"{reason.replace('_', ' ')} {files} ({size} bytes)"
+                            for reason, (files, size) in self.skipped.items() if files)
+        return (f"scanned {self.files} members ({self.kept_bytes} bytes) in {self.chunks} chunks, "
+                f"skipped {skipped} members{': ' + details if details else ''}")
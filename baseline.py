@@ -0,0 +1,104 @@
+import hashlib
+import os
+
+from archives import MEMBER_SEPARATOR
+
+STATUS_NEW, STATUS_RESOLVED = "new", "resolved"
+
+
+def relative_path(path, root=None):
+    """ the path of a finding relative to the scanned root: a directory, or an archive whose members are reported
+    as archive!member (the member path then). paths outside of the root are returned as they are """
+    if not root:
+        return path
+    root = root.rstrip(os.sep)
+    for separator in (os.sep, MEMBER_SEPARATOR):  # the fast path, paths are reported below the root as given
+        if path.startswith(root + separator):
+            return path[len(root) + len(separator):]
+    relative = os.path.relpath(path, root or os.sep)
+    return path if relative == os.pardir or relative.startswith(os.pardir + os.sep) else relative
+
+
+def fingerprint(finding, root=None):
+    """ stable identity of a raw Gitleaks finding: a 64-bit hash of its file, rule, line and secret hash
+    (the secret itself is never stored). the file is taken relative to the scanned `root`, so that the
+    fingerprints do not depend on how the directory was given (relative, absolute, mounted elsewhere) """
+    secret_hash = hashlib.sha256(finding.get('Secret', '').encode()).hexdigest()
+    path = relative_path(finding['File'], root)
+    key = f"{path}\0{finding.get('RuleID', '')}\0{secret_hash}\0{finding['StartLine']}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def format_fingerprint(value):
+    return (value & 0xFFFFFFFFFFFFFFFF).to_bytes(8, 'big').hex()
+
+
+class Baseline:
+    """ persistent fingerprint index of the findings of the previous scans.
+    every fingerprint remembers the last scan it was seen in (indexed), so the diff against the last scan
+    costs one primary key lookup per current finding, and the resolved findings are one index range:
+    the size of the history does not matter. the index is only updated when `update` is set """
+
+    def __init__(self, baseline_path, update=False):
+        import sqlite3  # only imported with --baseline, see tests/test_startup.py
+
+        self.baseline_path = baseline_path
+        self.update = update
+        self.new = self.resolved = 0
+        self.connection = sqlite3.connect(baseline_path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+            CREATE TABLE IF NOT EXISTS findings (
+                fingerprint INTEGER PRIMARY KEY,
+                filename TEXT NOT NULL,
+                line_range TEXT NOT NULL,
+                description TEXT NOT NULL,
+                first_seen INTEGER NOT NULL,
+                last_seen INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS findings_last_seen ON findings (last_seen);
+        ''')
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'scan'").fetchone()
+        self.last_scan = row[0] if row is not None else 0
+
+    def diff(self, findings):
+        """ yields the findings (custom findings with a 'fingerprint') that are new since the last scan, then the
+        ones of the last scan that are gone, each with its 'status'. duplicates within the scan are dropped """
+        scan = self.last_scan + 1
+        connection = self.connection
+        try:
+            for finding in findings:
+                value = finding['fingerprint']
+                row = connection.execute("SELECT last_seen FROM findings WHERE fingerprint = ?", (value,)).fetchone()
+                if row is None:
+                    connection.execute(
+                        "INSERT INTO findings (fingerprint, filename, line_range, description, first_seen, last_seen) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (value, finding['filename'], finding['line_range'], finding['description'], scan, scan)
+                    )
+                elif row[0] != scan:
+                    connection.execute("UPDATE findings SET last_seen = ? WHERE fingerprint = ?", (scan, value))
+                if row is None or row[0] < self.last_scan:  # never seen, or seen before and resolved since
+                    self.new += 1
+                    yield dict(finding, fingerprint=format_fingerprint(value), status=STATUS_NEW)
+
+            if self.last_scan:
+                for value, filename, line_range, description in connection.execute(
+                        "SELECT fingerprint, filename, line_range, description FROM findings WHERE last_seen = ?",
+                        (self.last_scan,)):
+                    self.resolved += 1
+                    yield {"filename": filename, "line_range": line_range, "description": description,
+                           "fingerprint": format_fingerprint(value), "status": STATUS_RESOLVED}
+
+            if self.update:
+                connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scan', ?)", (scan,))
+                connection.commit()
+                self.last_scan = scan
+        finally:
+            if connection.in_transaction:
+                connection.rollback()  # a dry diff (or an interrupted one) leaves the index untouched
+
+    def close(self):
+        if self.connection.in_transaction:
+            self.connection.rollback()
+        self.connection.close()
@@ -0,0 +1,107 @@
+""" scanning a tarball: full extraction then one scan vs the chunked archive mode (--archive_chunk_size), with the
+    fake Gitleaks. reports the time, the peak scratch disk usage and checks both give the same findings.
+
+    python benchmarks/bench_archives.py --files 2000 --file_size 4096 --chunk_size 1M 8M
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import bench_pipeline
+import controller
+from prefilter import file_size
+
+MARKER = "SECRET"
+
+
+def make_archive(archive_path, files, size):
+    """ a release tarball: text files of `size` bytes, one in ten holding a leak, plus a few binaries """
+    with tarfile.open(archive_path, 'w:gz') as tar:
+        for index in range(files):
+            line = f"token = '{MARKER}'\n" if index % 10 == 0 else "print('hello')\n"
+            data = (line * (size // len(line) + 1))[:size].encode()
+            if index % 50 == 49:
+                data = b'\0' + data[1:]
+            info = tarfile.TarInfo(f"release/pkg{index % 20}/module{index}.py")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def _tree_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def measure_extract(archive_path, scratch_dir):
+    """ returns (seconds, scratch bytes, sorted findings) of extracting the whole archive and scanning it """
+    start = time.perf_counter()
+    extract_dir = os.path.join(scratch_dir, "extracted")
+    with tarfile.open(archive_path) as tar:
+        tar.extractall(extract_dir, filter='data')
+    disk = _tree_size(extract_dir)
+    report_path = os.path.join(scratch_dir, "extracted.json")
+    controller.run_gitleaks(extract_dir, "extracted.json", report_path=report_path)
+    findings = sorted((os.path.relpath(finding['File'], extract_dir), finding['StartLine'])
+                      for finding in controller.iter_findings_from_output_file(report_path))
+    return time.perf_counter() - start, disk, findings
+
+
+def measure_chunked(archive_path, scratch_dir, chunk_size):
+    """ returns (seconds, peak staged bytes, sorted findings) of the archive mode """
+    peak = [0]
+    run_gitleaks = controller.run_gitleaks
+
+    def measured_run_gitleaks(directory_to_scan, output_file, **kwargs):
+        peak[0] = max(peak[0], _tree_size(directory_to_scan))
+        return run_gitleaks(directory_to_scan, output_file, **kwargs)
+
+    report_path = os.path.join(scratch_dir, "chunked.json")
+    start = time.perf_counter()
+    with patch("controller.run_gitleaks", side_effect=measured_run_gitleaks):
+        controller.run_gitleaks_archive(archive_path, report_path, chunk_size=chunk_size)
+    prefix = f"{archive_path}!"
+    findings = sorted((finding['File'][len(prefix):], finding['StartLine'])
+                      for finding in controller.iter_findings_from_output_file(report_path))
+    return time.perf_counter() - start, peak[0], findings
+
+
+def run(files, size, chunk_sizes):
+    os.environ.update(FAKE_GITLEAKS_MARKER=MARKER, FAKE_GITLEAKS_STARTUP="0")
+    with tempfile.TemporaryDirectory() as root:
+        bin_dir = os.path.join(root, "bin")
+        os.makedirs(bin_dir)
+        bench_pipeline.install_fake_gitleaks(bin_dir)
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+        archive_path = os.path.join(root, "release.tar.gz")
+        make_archive(archive_path, files, size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = {"extract": measure_extract(archive_path, root)}
+            for chunk_size in chunk_sizes:
+                results[f"chunk {chunk_size}"] = measure_chunked(archive_path, root, chunk_size)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--file_size', type=file_size, default=4096)
+    parser.add_argument('--chunk_size', type=file_size, nargs='+', default=[1024 ** 2, 8 * 1024 ** 2])
+    args = parser.parse_args()
+
+    controller.logger.setLevel('ERROR')  # every chunk logs a 'leaks detected' warning
+    results = run(args.files, args.file_size, args.chunk_size)
+    reference = results["extract"][2]
+    print(f"{'mode':>16} {'seconds':>9} {'peak disk':>12} {'findings':>9} {'same as extraction':>19}")
+    for mode, (seconds, disk, findings) in results.items():
+        print(f"{mode:>16} {seconds:>9.3f} {disk:>12} {len(findings):>9} {str(findings == reference):>19}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+""" time of the --baseline diff of one scan against a fingerprint index holding millions of historical findings.
+
+    python benchmarks/bench_baseline.py --history 1000000 --findings 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import synthetic
+import controller
+from baseline import Baseline
+
+
+def scan_findings(count, offset=0):
+    """ custom findings (with fingerprints) of a scan, the same secrets on every call """
+    rng = random.Random(offset)
+    raw = (synthetic.make_finding(index, rng) for index in range(offset, offset + count))
+    return list(controller.transform_findings(raw, fingerprints=True))
+
+
+def build_index(baseline_path, history, findings):
+    """ an index with `history` fingerprints of old scans, then one recorded scan of `findings` """
+    index = Baseline(baseline_path, update=True)
+    with index.connection:
+        index.connection.executemany(
+            "INSERT INTO findings VALUES (?, ?, '1-1', 'historical finding', 0, 0)",
+            ((value, f"/old/file{value % 1000}.py") for value in range(-history, 0))
+        )
+    for _ in index.diff(scan_findings(findings)):
+        pass
+    index.close()
+
+
+def measure_diff(baseline_path, findings, changed):
+    """ seconds of the diff of a scan where `changed` findings were fixed and as many new ones appeared """
+    scan = scan_findings(findings - changed) + scan_findings(changed, offset=findings)
+    index = Baseline(baseline_path)
+    start = time.perf_counter()
+    statuses = [finding['status'] for finding in index.diff(scan)]
+    seconds = time.perf_counter() - start
+    index.close()
+    return seconds, statuses.count("new"), statuses.count("resolved")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--findings', type=int, default=10_000)
+    parser.add_argument('--changed', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'history':>10} {'findings':>9} {'new':>6} {'resolved':>9} {'diff seconds':>13}")
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for history in args.history:
+            baseline_path = os.path.join(scratch_dir, f"baseline-{history}.sqlite")
+            build_index(baseline_path, history, args.findings)
+            seconds, new, resolved = measure_diff(baseline_path, args.findings, args.changed)
+            print(f"{history:>10} {args.findings:>9} {new:>6} {resolved:>9} {seconds:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+""" many small targets: one Gitleaks process per directory vs --batch_size batches, with the fake Gitleaks and
+    a start-up cost per process (loading and compiling the rules), checking both give the same findings.
+
+    python benchmarks/bench_batch.py --targets 200 --batch_size 50 --startup 0.05
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import bench_pipeline
+import controller
+
+MARKER = "SECRET"
+
+
+def make_targets(root, targets):
+    """ small packages of a monorepo, a few files each, every other file holding a leak """
+    dirnames = []
+    for index in range(targets):
+        dirname = os.path.join(root, f"package{index}")
+        os.makedirs(os.path.join(dirname, "src"))
+        for file_index in range(4):
+            with open(os.path.join(dirname, "src", f"module{file_index}.py"), 'w') as f:
+                f.write(f"token = '{MARKER}'\n" if file_index % 2 else "print('hello')\n")
+        dirnames.append(dirname)
+    return dirnames
+
+
+def measure(dirnames, batch_size, jobs):
+    """ returns (seconds, sorted (file, line) findings) of a multi-directory scan """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # clean_outputfile prints for every directory
+        custom_output = controller.scan_directories(dirnames, "output.json", jobs, None, save_customize_output=False,
+                                                    batch_size=batch_size)
+        findings = sorted((finding['filename'], finding['line_range']) for finding in custom_output['findings'])
+    return time.perf_counter() - start, findings
+
+
+def run(targets, batch_sizes, jobs, startup):
+    os.environ.update(FAKE_GITLEAKS_MARKER=MARKER, FAKE_GITLEAKS_STARTUP=str(startup))
+    with tempfile.TemporaryDirectory() as root:
+        bin_dir = os.path.join(root, "bin")
+        os.makedirs(bin_dir)
+        bench_pipeline.install_fake_gitleaks(bin_dir)
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+        dirnames = make_targets(os.path.join(root, "monorepo"), targets)
+        return {batch_size: measure(dirnames, batch_size, jobs) for batch_size in batch_sizes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', type=int, default=200)
+    parser.add_argument('--batch_size', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--startup', type=float, default=0.05)
+    args = parser.parse_args()
+
+    controller.logger.setLevel('ERROR')  # every scan logs a 'leaks detected' warning
+    results = run(args.targets, args.batch_size, args.jobs, args.startup)
+    reference = next(iter(results.values()))[1]
+    print(f"{'batch size':>10} {'seconds':>9} {'findings':>9} {'same as unbatched':>18}")
+    for batch_size, (seconds, findings) in results.items():
+        print(f"{batch_size:>10} {seconds:>9.3f} {len(findings):>9} {str(findings == reference):>18}")
+
+
+if __name__ == '__main__':
+    main()
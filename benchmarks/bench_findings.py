@@ -0,0 +1,55 @@
+""" findings per second of the post-scan transformation (report -> custom dicts -> LeakReport models),
+    before (one validated LeakReport per finding) and after (batched TypeAdapter conversion).
+
+    python benchmarks/bench_findings.py --findings 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import synthetic
+from bonus import LeakReport, iter_leak_reports
+import controller
+
+
+def per_finding_validation(report_path):
+    """ the previous path: a formatted dict, then one validated LeakReport per finding """
+    findings = controller.get_findings_from_output_file(report_path)
+    custom = [{"filename": f['File'], "line_range": f"{f['StartLine']}-{f['EndLine']}",
+               "description": f['Description']} for f in findings]
+    return sum(1 for _ in [LeakReport(**finding_dict) for finding_dict in custom])
+
+
+def fast_path(report_path, validate):
+    custom_output = controller.parse_json_output(os.path.dirname(report_path), os.path.basename(report_path),
+                                                 save_customize_output=False)
+    return sum(1 for _ in iter_leak_reports(custom_output['findings'], validate=validate))
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    count = function(*args)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--findings', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'findings':>10} {'per finding (before)':>20} {'batch --validate':>18} {'batch (default)':>18}")
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for count in args.findings:
+            report_path = synthetic.write_report(os.path.join(scratch_dir, f"report-{count}.json"), count)
+            before = measure(per_finding_validation, report_path)
+            validated = measure(fast_path, report_path, True)
+            trusted = measure(fast_path, report_path, False)
+            print(f"{count:>10} {before:>16,.0f} f/s {validated:>14,.0f} f/s {trusted:>14,.0f} f/s")
+
+
+if __name__ == '__main__':
+    main()
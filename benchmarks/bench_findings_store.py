@@ -0,0 +1,80 @@
+""" memory per finding of the ways to hold a whole report in memory: the raw Gitleaks dicts, the custom dicts of
+    parse_json_output, the LeakReport models of show_results and the compact FindingsStore (findings_store.py).
+    measured with tracemalloc, once the container is built (the generator feeding it is not counted).
+
+    python benchmarks/bench_findings_store.py --findings 100000 1000000 --findings_per_file 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import synthetic
+import controller
+from bonus import iter_leak_reports
+from findings_store import FindingsStore
+
+REPRESENTATIONS = ("raw", "custom", "models", "store")
+
+
+def iter_report(count, findings_per_file):
+    """ raw findings where every file holds about `findings_per_file` findings, so filenames repeat like in a real
+    report. each filename is a new string object, as it would be when decoded from the JSON report """
+    rng = random.Random(0)
+    files = max(count // findings_per_file, 1)
+    for index in range(count):
+        finding = synthetic.make_finding(index, rng)
+        file_index = rng.randrange(files)
+        finding["File"] = f"/code/repo/pkg{file_index % 97}/module{file_index % 13}/file{file_index}.py"
+        yield finding
+
+
+def build(representation, findings):
+    if representation == "raw":
+        return list(findings)
+    if representation == "custom":
+        return list(controller.transform_findings(findings))
+    if representation == "models":
+        return list(iter_leak_reports(controller.transform_findings(findings)))
+    return FindingsStore.from_report(findings)
+
+
+def measure(representation, count, findings_per_file):
+    """ returns (bytes per finding, seconds to build) """
+    tracemalloc.start()
+    start = time.perf_counter()
+    container = build(representation, iter_report(count, findings_per_file))
+    seconds = time.perf_counter() - start
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(container) == count
+    del container
+    return held / count, seconds
+
+
+def run_size(count, findings_per_file=4, representations=REPRESENTATIONS):
+    return {representation: measure(representation, count, findings_per_file) for representation in representations}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--findings', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--findings_per_file', type=int, default=4)
+    parser.add_argument('--representation', nargs='+', choices=REPRESENTATIONS, default=list(REPRESENTATIONS),
+                        help="the raw dicts need about 1 GB per million findings")
+    args = parser.parse_args()
+
+    print(f"{'findings':>9} {'representation':>15} {'bytes/finding':>14} {'total (MiB)':>12} {'build (s)':>10}")
+    for count in args.findings:
+        for representation, (per_finding, seconds) in run_size(count, args.findings_per_file,
+                                                                args.representation).items():
+            print(f"{count:>9} {representation:>15} {per_finding:>14.1f} {per_finding * count / 2 ** 20:>12.1f} "
+                  f"{seconds:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
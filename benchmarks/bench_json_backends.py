@@ -0,0 +1,65 @@
+""" decode time of a Gitleaks report with every installed JSON backend (through a memory map), compared to the
+    streaming parser used for the reports bigger than controller.MMAP_DECODE_LIMIT.
+
+    python benchmarks/bench_json_backends.py --findings 10000 100000
+"""
+import argparse
+import mmap
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import synthetic
+import controller
+import json_backends
+
+
+def streaming(report_path):
+    with open(report_path, 'r') as report_file:
+        return sum(1 for _ in controller.iter_json_array(report_file))
+
+
+def mapped(report_path, backend):
+    with open(report_path, 'rb') as report_file, \
+            mmap.mmap(report_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return len(backend.loads(buffer))
+
+
+def measure(function, *args, repeat=3):
+    """ best of `repeat` runs, in seconds """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_size(report_path):
+    results = {"streaming": measure(streaming, report_path)}
+    for name in json_backends.available_backends():
+        results[f"mmap+{name}"] = measure(mapped, report_path, json_backends.load_backend(name))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--findings', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'findings':>10} {'size (MiB)':>11} {'decoder':>14} {'seconds':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for count in args.findings:
+            report_path = synthetic.write_report(os.path.join(scratch_dir, f"report-{count}.json"), count)
+            size = os.path.getsize(report_path) / 1024 / 1024
+            results = run_size(report_path)
+            for decoder, seconds in results.items():
+                print(f"{count:>10} {size:>11.1f} {decoder:>14} {seconds:>9.3f} "
+                      f"{results['streaming'] / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
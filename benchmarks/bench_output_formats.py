@@ -0,0 +1,51 @@
+""" write time and file size of every custom output format (--format), from the same synthetic report.
+
+    python benchmarks/bench_output_formats.py --findings 10000 100000
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import synthetic
+import controller
+from output_formats import OUTPUT_FORMATS, with_format_extension
+
+
+def measure_format(scratch_dir, output_format):
+    """ returns (seconds, bytes) of streaming the report into the custom output of the given format """
+    start = time.perf_counter()
+    custom_output = controller.parse_json_output(scratch_dir, "output.json", output_format=output_format)
+    controller.consume_findings(custom_output)
+    seconds = time.perf_counter() - start
+    return seconds, os.path.getsize(os.path.join(scratch_dir, with_format_extension(
+        controller.CUSTOM_OUTPUT_FILENAME, output_format)))
+
+
+def run_size(count, output_formats=OUTPUT_FORMATS):
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        synthetic.write_report(os.path.join(scratch_dir, "output.json"), count)
+        return {output_format: measure_format(scratch_dir, output_format) for output_format in output_formats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--findings', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    output_formats = [output_format for output_format in OUTPUT_FORMATS
+                      if output_format != 'msgpack' or importlib.util.find_spec('msgpack')]
+    print(f"{'findings':>10} {'format':>8} {'seconds':>9} {'size (KiB)':>11} {'size vs json':>13}")
+    for count in args.findings:
+        results = run_size(count, output_formats)
+        json_size = results["json"][1]
+        for output_format, (seconds, size) in results.items():
+            print(f"{count:>10} {output_format:>8} {seconds:>9.3f} {size / 1024:>11,.0f} {size / json_size:>12.0%}")
+
+
+if __name__ == '__main__':
+    main()
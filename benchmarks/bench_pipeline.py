@@ -0,0 +1,156 @@
+""" benchmark of the controller pipeline, stage by stage, against a fake Gitleaks binary.
+
+    python benchmarks/bench_pipeline.py --findings 10 1000 100000 1000000 --output results.json
+    python benchmarks/bench_pipeline.py --compare results.json --tolerance 0.25
+
+every report size runs in a fresh interpreter, so the peak RSS of one size is not hidden by a bigger one.
+the stages are streamed, so each one is timed as a full pass over the pipeline up to that stage:
+`seconds` is that pass and `self_seconds` what the stage adds to the previous one.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+FAKE_GITLEAKS = os.path.join(BENCHMARKS_DIR, 'fake_gitleaks.py')
+REPORT_FILENAME = "output_test.json"
+MIN_COMPARED_SECONDS = 0.05  # shorter stages are too noisy to be compared between runs
+
+
+def install_fake_gitleaks(bin_dir):
+    """ put a `gitleaks` executable running fake_gitleaks.py in bin_dir """
+    wrapper_path = os.path.join(bin_dir, 'gitleaks')
+    with open(wrapper_path, 'w') as wrapper:
+        wrapper.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_GITLEAKS}" "$@"\n')
+    os.chmod(wrapper_path, 0o755)
+    return wrapper_path
+
+
+def peak_rss_kb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KiB on Linux
+
+
+def run_stages(scan_dir):
+    """ time every stage of the pipeline in this process, returns the list of stage results """
+    sys.path.insert(0, ROOT_DIR)
+    import controller
+
+    controller.logger.setLevel('WARNING')  # the benchmark measures the pipeline, not the log handlers
+    report_path = os.path.join(scan_dir, REPORT_FILENAME)
+
+    def parse(save_customize_output):
+        return controller.parse_json_output(scan_dir, REPORT_FILENAME, save_customize_output=save_customize_output)
+
+    def show_results():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            controller.show_results(parse(False), bonus=True)
+
+    stages = [
+        ("execute_command", lambda: controller.run_gitleaks(scan_dir, REPORT_FILENAME)),
+        ("get_findings_from_output_file", lambda: sum(1 for _ in controller.iter_findings_from_output_file(report_path))),
+        ("parse_json_output", lambda: controller.consume_findings(parse(False))),
+        ("custom_output", lambda: controller.consume_findings(parse(True))),
+        ("show_results", show_results),
+    ]
+    upstream = {"execute_command": None, "get_findings_from_output_file": None,
+                "parse_json_output": "get_findings_from_output_file", "custom_output": "parse_json_output",
+                "show_results": "parse_json_output"}
+
+    results, seconds = [], {}
+    for name, stage in stages:
+        wall, cpu = time.perf_counter(), time.process_time()
+        stage()
+        seconds[name] = time.perf_counter() - wall
+        results.append({
+            "stage": name,
+            "seconds": seconds[name],
+            "self_seconds": max(seconds[name] - seconds.get(upstream[name], 0.0), 0.0),
+            "cpu_seconds": time.process_time() - cpu,
+            "peak_rss_kb": peak_rss_kb(),
+        })
+    results[0]["child_peak_rss_kb"] = peak_rss_kb(resource.RUSAGE_CHILDREN)
+    return results
+
+
+def run_size(count):
+    """ run one report size in a fresh interpreter with the fake gitleaks first in PATH """
+    with tempfile.TemporaryDirectory(prefix='gitleaks-bench-') as scratch_dir:
+        bin_dir = os.path.join(scratch_dir, 'bin')
+        scan_dir = os.path.join(scratch_dir, 'scan')
+        os.makedirs(bin_dir)
+        os.makedirs(scan_dir)
+        install_fake_gitleaks(bin_dir)
+        env = dict(os.environ, FAKE_GITLEAKS_FINDINGS=str(count), PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', scan_dir],
+                                 env=env, cwd=scratch_dir, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"benchmark of {count} findings failed:\n{process.stderr}")
+        report_size = os.path.getsize(os.path.join(scan_dir, REPORT_FILENAME))
+    return {"findings": count, "report_bytes": report_size, "stages": json.loads(process.stdout.splitlines()[-1])}
+
+
+def compare(results, baseline, tolerance):
+    """ list the stages that got slower than the baseline by more than `tolerance` (a ratio) """
+    previous = {(run["findings"], stage["stage"]): stage["self_seconds"]
+                for run in baseline["runs"] for stage in run["stages"]}
+    regressions = []
+    for run in results["runs"]:
+        for stage in run["stages"]:
+            before = previous.get((run["findings"], stage["stage"]))
+            if before and before > MIN_COMPARED_SECONDS and stage["self_seconds"] > before * (1 + tolerance):
+                regressions.append(f"{stage['stage']} @ {run['findings']} findings: "
+                                   f"{before:.3f}s -> {stage['self_seconds']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--findings', type=int, nargs='+', default=[10, 1000, 100_000],
+                        help="report sizes to benchmark (up to 1000000)")
+    parser.add_argument('--output', type=str, default=None, help="write the results as JSON to this file")
+    parser.add_argument('--compare', type=str, default=None, help="previous results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slow-down ratio for --compare")
+    parser.add_argument('--run-one', dest='run_one', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:  # child process: one size, results on the last stdout line
+        results = run_stages(args.run_one)
+        sys.stdout.flush()
+        print(json.dumps(results))
+        return 0
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.time(),
+        "runs": [run_size(count) for count in args.findings],
+    }
+    for run in results["runs"]:
+        print(f"{run['findings']:>9} findings ({run['report_bytes'] / 1e6:.1f} MB report)")
+        for stage in run["stages"]:
+            print(f"    {stage['stage']:<32} {stage['self_seconds']:>9.4f}s  peak RSS {stage['peak_rss_kb'] / 1024:>8.1f} MiB")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
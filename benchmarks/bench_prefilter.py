@@ -0,0 +1,56 @@
+""" speed of the --prefilter walk (sequential vs parallel traversal) on a synthetic tree shaped like a web project:
+    sources, a big node_modules, vendored binaries and build artefacts. prints what would be skipped.
+
+    python benchmarks/bench_prefilter.py --files 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from prefilter import DEFAULT_EXCLUDES, IgnoreRules, prefilter_tree
+
+
+def make_project(root, files):
+    """ 10% sources, 70% node_modules, 10% binaries, 10% build artefacts """
+    for index in range(files):
+        kind = index % 10
+        if kind == 0:
+            path, content = f"src/pkg{index % 50}/module{index}.py", b"token = 'not a secret'\n" * 20
+        elif kind == 1:
+            path, content = f"vendor/bin/tool{index}.so", b"\x7fELF\0\0" + os.urandom(4096)
+        elif kind == 2:
+            path, content = f"build/out{index % 20}/chunk{index}.js", b"var a=1;" * 500
+        else:
+            path, content = f"node_modules/lib{index % 300}/dist/file{index}.js", b"module.exports = {};\n" * 50
+        file_path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+
+
+def measure(root, jobs, rules):
+    start = time.perf_counter()
+    result = prefilter_tree(root, rules, jobs=jobs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20_000)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    rules = IgnoreRules([*DEFAULT_EXCLUDES, "build/"])
+    with tempfile.TemporaryDirectory() as root:
+        make_project(root, args.files)
+        for jobs in args.jobs:
+            seconds, result = measure(root, jobs, rules)
+            print(f"jobs={jobs:<3} walk {seconds:.3f}s: {result.summary()}")
+
+
+if __name__ == '__main__':
+    main()
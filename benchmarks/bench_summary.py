@@ -0,0 +1,57 @@
+""" time and printed volume of the ways to look at a large scan: printing every finding, printing one page
+    (--page_size) and the --summary pass, from the same synthetic report.
+
+    python benchmarks/bench_summary.py --findings 10000 100000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import synthetic
+import controller
+from summary import Summary
+
+PAGE_SIZE = 50
+
+
+def measure(scratch_dir, mode):
+    """ returns (seconds, printed characters) of one way to show the report """
+    printed = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(printed):
+        summary = Summary() if mode == "summary" else None
+        custom_output = controller.parse_json_output(scratch_dir, "output.json", save_customize_output=False,
+                                                     summary=summary)
+        if mode == "summary":
+            controller.consume_findings(custom_output)
+            print(summary.render())
+        else:
+            controller.show_results(custom_output, bonus=False, page_size=PAGE_SIZE if mode == "page" else None)
+    return time.perf_counter() - start, len(printed.getvalue())
+
+
+def run_size(count, modes=("all", "page", "summary")):
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        synthetic.write_report(os.path.join(scratch_dir, "output.json"), count)
+        return {mode: measure(scratch_dir, mode) for mode in modes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--findings', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'findings':>10} {'mode':>8} {'seconds':>9} {'printed (KiB)':>14}")
+    for count in args.findings:
+        for mode, (seconds, printed) in run_size(count).items():
+            print(f"{count:>10} {mode:>8} {seconds:>9.3f} {printed / 1024:>14,.1f}")
+
+
+if __name__ == '__main__':
+    main()
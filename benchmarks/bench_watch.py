@@ -0,0 +1,105 @@
+""" --watch latency: time from saving a file to its finding being reported, on a large tree, for the inotify and
+    the polling backends, against a full scan of the tree. runs with the fake Gitleaks.
+
+    python benchmarks/bench_watch.py --files 20000 --saves 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import bench_pipeline
+import controller
+import watch
+
+MARKER = "SECRET"
+
+
+def make_tree(root, files):
+    """ a large source tree, 100 files per directory, one in a hundred holding a leak """
+    for index in range(files):
+        directory = os.path.join(root, f"pkg{index // 1000}", f"mod{index // 100 % 10}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{index}.py"), 'w') as f:
+            f.write(f"token = '{MARKER}'\n" if index % 100 == 0 else "print('hello')\n")
+
+
+def measure_full_scan(root):
+    start = time.perf_counter()
+    controller.run_gitleaks(root, "output.json")
+    return time.perf_counter() - start
+
+
+def measure_watch(root, backend, saves, interval):
+    """ returns the save -> finding latency of every save """
+    passes = []
+    ready = threading.Condition()
+
+    def on_pass(session, new_findings):
+        with ready:
+            passes.append((time.perf_counter(), len(new_findings)))
+            ready.notify_all()
+
+    stop = threading.Event()
+    thread = threading.Thread(target=watch.run_watch, args=(root, os.path.join(root, "output.json")),
+                              kwargs=dict(backend=backend, stop=stop, on_pass=on_pass, show_result=False,
+                                          interval=interval))
+    thread.start()
+    latencies = []
+    try:
+        with ready:
+            ready.wait_for(lambda: passes, timeout=600)
+        for save in range(saves):
+            count = len(passes)
+            saved_at = time.perf_counter()
+            with open(os.path.join(root, "pkg0", "mod1", f"saved{save}.py"), 'w') as f:
+                f.write(f"password = '{MARKER}'\n")
+            with ready:
+                ready.wait_for(lambda: len(passes) > count, timeout=60)
+            latencies.append(passes[-1][0] - saved_at)
+    finally:
+        stop.set()
+        thread.join()
+    return latencies
+
+
+def run(files, saves, backends, interval=watch.DEFAULT_POLL_INTERVAL):
+    os.environ.update(FAKE_GITLEAKS_MARKER=MARKER, FAKE_GITLEAKS_STARTUP="0")
+    with tempfile.TemporaryDirectory() as root:
+        bin_dir = os.path.join(root, "bin")
+        os.makedirs(bin_dir)
+        bench_pipeline.install_fake_gitleaks(bin_dir)
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+        tree = os.path.join(root, "tree")
+        make_tree(tree, files)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = {"full scan": [measure_full_scan(tree)]}
+            for backend in backends:
+                results[backend] = measure_watch(tree, backend, saves, interval)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--saves', type=int, default=5)
+    parser.add_argument('--backend', nargs='+', choices=watch.WATCH_BACKENDS[1:], default=["inotify", "poll"])
+    parser.add_argument('--interval', type=float, default=watch.DEFAULT_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    controller.logger.setLevel('ERROR')
+    watch.logger.setLevel('ERROR')
+    results = run(args.files, args.saves, args.backend, args.interval)
+    print(f"{'mode':>10} {'mean (s)':>9} {'max (s)':>9}")
+    for mode, seconds in results.items():
+        print(f"{mode:>10} {sum(seconds) / len(seconds):>9.3f} {max(seconds):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+""" stand-in for the gitleaks binary, used by the benchmarks.
+
+    `detect ... --report-path PATH ...` writes a synthetic report to PATH, its size is taken from the
+    FAKE_GITLEAKS_FINDINGS environment variable (default: 10). with FAKE_GITLEAKS_MARKER set, the files of
+    `--source` are scanned instead, every line containing the marker is a finding. FAKE_GITLEAKS_STARTUP is a
+    start-up time in seconds (what loading and compiling the rules costs the real binary). exits with 1 when
+    findings were "detected", like Gitleaks. `version` prints a fake version.
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+
+FAKE_VERSION = "v8.5.1-fake"
+
+
+def scan_source(source, marker):
+    """ one finding per line containing the marker, in the files below source """
+    findings = []
+    for dirpath, _, filenames in os.walk(source):
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            with open(file_path, 'r', errors='ignore') as f:
+                for line_number, line in enumerate(f, start=1):
+                    if marker in line:
+                        findings.append(dict(synthetic.make_finding(len(findings)), File=file_path,
+                                             StartLine=line_number, EndLine=line_number, Secret=marker))
+    return findings
+
+
+def main(argv):
+    if argv[:1] == ['version']:
+        print(FAKE_VERSION)
+        return 0
+    if argv[:1] != ['detect'] or '--report-path' not in argv:
+        print(f"fake gitleaks: unsupported arguments {argv}", file=sys.stderr)
+        return 126
+
+    report_path = argv[argv.index('--report-path') + 1]
+    time.sleep(float(os.environ.get('FAKE_GITLEAKS_STARTUP', '0')))
+    print("fake gitleaks: scanning", file=sys.stderr)
+    marker = os.environ.get('FAKE_GITLEAKS_MARKER')
+    if marker:
+        findings = scan_source(argv[argv.index('--source') + 1], marker)
+        with open(report_path, 'w') as report_file:
+            json.dump(findings, report_file, indent=1)
+        count = len(findings)
+    else:
+        count = int(os.environ.get('FAKE_GITLEAKS_FINDINGS', '10'))
+        synthetic.write_report(report_path, count)
+    print(f"fake gitleaks: {count} leaks found", file=sys.stderr)
+    return 1 if count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
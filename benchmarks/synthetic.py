@@ -0,0 +1,55 @@
+import json
+import random
+import string
+
+RULES = [
+    ("aws-access-token", "AWS"),
+    ("github-pat", "GitHub Personal Access Token"),
+    ("private-key", "Private Key"),
+    ("slack-access-token", "Slack token"),
+    ("generic-api-key", "Generic API Key"),
+]
+EXTENSIONS = [".py", ".js", ".yml", ".env", ".json", ".go", ""]
+
+
+def make_finding(index, rng=random):
+    """ one synthetic finding, shaped like the findings of a Gitleaks v8 JSON report """
+    rule_id, description = RULES[index % len(RULES)]
+    secret = ''.join(rng.choices(string.ascii_letters + string.digits, k=32))
+    line = rng.randint(1, 5000)
+    directory = f"/code/repo/pkg{index % 97}/module{index % 13}"
+    return {
+        "Description": description,
+        "StartLine": line,
+        "EndLine": line + (index % 3 == 0),
+        "StartColumn": rng.randint(1, 80),
+        "EndColumn": rng.randint(81, 160),
+        "Match": f"token = \"{secret}\"",
+        "Secret": secret,
+        "File": f"{directory}/file{index % 1009}{EXTENSIONS[index % len(EXTENSIONS)]}",
+        "Commit": "",
+        "Entropy": round(rng.uniform(2.5, 5.5), 6),
+        "Author": "",
+        "Email": "",
+        "Date": "",
+        "Message": "",
+        "Tags": [],
+        "RuleID": rule_id,
+    }
+
+
+def iter_findings(count, seed=0):
+    rng = random.Random(seed)
+    for index in range(count):
+        yield make_finding(index, rng)
+
+
+def write_report(report_path, count, seed=0):
+    """ write a synthetic Gitleaks report with `count` findings, in the layout Gitleaks uses (indent of 1) """
+    with open(report_path, 'w') as report_file:
+        report_file.write('[')
+        for index, finding in enumerate(iter_findings(count, seed)):
+            report_file.write('\n' if index == 0 else ',\n')
+            report_file.write(json.dumps(finding, indent=1).replace('\n', '\n '))
+        report_file.write('\n]' if count else ']')
+    return report_path
@@ -1,13 +1,32 @@
+import itertools
 import json
 
-from pydantic import BaseModel
-from typing import Optional
+VALIDATION_BATCH_SIZE = 1000
+LAZY_MODELS = ("LeakReport", "LEAK_REPORTS_ADAPTER")
 
 
-class LeakReport(BaseModel):
-    filename: str
-    line_range: str
-    description: str
+def __getattr__(name):
+    """ the pydantic models (bonus_models) are only imported when they are used: pydantic is the slowest import
+    of the controller, and most runs (--no-bonus, --help...) never need it """
+    if name in LAZY_MODELS:
+        import bonus_models
+        return getattr(bonus_models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def iter_leak_reports(findings, validate=False, batch_size=VALIDATION_BATCH_SIZE):
+    """ lazily convert custom findings into LeakReport models, in batches through a TypeAdapter (one call into
+    pydantic-core per batch instead of one model per finding). Gitleaks output is trusted, so the default is a
+    lax conversion; with validate, every batch goes through strict validation (no type coercion at all).
+    note: model_construct is not used for the trusted path, in pydantic v2 it is slower than batch validation """
+    from bonus_models import LEAK_REPORTS_ADAPTER
+
+    findings = iter(findings)
+    while True:
+        batch = list(itertools.islice(findings, batch_size))
+        if not batch:
+            return
+        yield from LEAK_REPORTS_ADAPTER.validate_python(batch, strict=validate)
 
 
 def log_error_to_file(exit_code, error_message, error_file="error.json"):
@@ -0,0 +1,21 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, TypeAdapter
+
+
+class LeakReport(BaseModel):
+    filename: str
+    line_range: str
+    description: str
+    fingerprint: Optional[str] = None  # set when the scan is diffed against a --baseline
+    status: Optional[str] = None  # "new" or "resolved", against the --baseline
+    triage: Optional[str] = None  # verdict of --triage
+    score: Optional[float] = None  # score of --triage, 0 (false positive) to 1
+
+    def __repr_args__(self):
+        """ the baseline and triage fields are only shown when they are set """
+        return [(name, value) for name, value in super().__repr_args__()
+                if value is not None or name not in ('fingerprint', 'status', 'triage', 'score')]
+
+
+LEAK_REPORTS_ADAPTER = TypeAdapter(List[LeakReport])
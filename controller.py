@@ -1,28 +1,58 @@
+import codecs
+import collections
+import concurrent.futures
+import heapq
+import io
+import itertools
 import json
 import logging
+import mmap
+import operator
 import os
-import pdb
 import shlex
+import shutil
+import signal
 import stat
 import subprocess
 import argparse
 import sys
+import tempfile
+import textwrap
+import threading
+
+import archives
+import json_backends
+import metrics
+import scan_limits
+import staging
+from baseline import Baseline, fingerprint
+from bonus import iter_leak_reports, log_error_to_file
+from logging_setup import LOG_BACKUP_COUNT, add_logging_arguments, configure_logging
+from output_formats import OUTPUT_FORMATS, MissingFormatDependency, check_format, open_output, \
+    with_format_extension
+from prefilter import DEFAULT_EXCLUDES, IgnoreRules, file_size, prefilter_tree
+from scan_cache import CACHE_FILENAME, ScanCache, hash_config, iter_files
+from staging import restore_findings, restore_path, scratch_directory, stage_files
+from summary import DEFAULT_DEPTH, DEFAULT_TOP, Summary
+from triage import DEFAULT_MIN_ENTROPY, TRIAGE_ACTIONS, Triage, load_allowlist
+
+REPORT_CHUNK_SIZE = 64 * 1024  # characters read from the report per chunk
+STREAM_LINE_LIMIT = 1024 * 1024  # longest subprocess output line the async reader accepts
+STREAM_TAIL_LINES = 100  # subprocess output lines kept in memory (for error reports)
+MAX_LOGGED_LINE_LENGTH = 2000  # longer subprocess output lines are truncated in the logs
+MAX_LOGGED_LINES = 1000  # subprocess output lines logged per stream, the rest is only counted
 
-from bonus import LeakReport, log_error_to_file
-
-# Configure logging
-LOG_FILE = "runtime_logs.log"
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler(LOG_FILE, mode="w")
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
+def __getattr__(name):
+    """ kept importable from here, without importing pydantic with the controller """
+    if name == "LeakReport":
+        import bonus
+        return bonus.LeakReport
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 class MyCustomArgumentParser(argparse.ArgumentParser):
     """Custom ArgumentParser to handle unrecognized arguments."""
 
@@ -32,16 +62,86 @@ class MyCustomArgumentParser(argparse.ArgumentParser):
         sys.exit(2)
 
 
-def execute_command(command, **kwargs):
-    """ execute a Gitleaks command in a subprocess """
+class OutputLogger:
+    """ logs the lines of one subprocess stream as they arrive, instead of one huge record at the end.
+    lines are truncated, only the first MAX_LOGGED_LINES are logged and the last `tail_size` are kept
+    (for the error reports), so memory stays bounded whatever the amount of output """
+
+    def __init__(self, stream_name, tail_size=STREAM_TAIL_LINES):
+        self.stream_name = stream_name
+        self.tail = collections.deque(maxlen=tail_size)
+        self.lines = 0
+        self.enabled = logger.isEnabledFor(logging.DEBUG)
+
+    def log(self, line):
+        line = line.rstrip('\n')
+        if len(line) > MAX_LOGGED_LINE_LENGTH:
+            line = f"{line[:MAX_LOGGED_LINE_LENGTH]}... ({len(line) - MAX_LOGGED_LINE_LENGTH} characters truncated)"
+        self.tail.append(line)
+        self.lines += 1
+        if self.enabled and self.lines <= MAX_LOGGED_LINES:
+            logger.debug(f'{self.stream_name}: {line}')
+
+    def close(self):
+        if self.enabled and self.lines > MAX_LOGGED_LINES:
+            logger.debug(f'{self.stream_name}: {self.lines - MAX_LOGGED_LINES} more lines were not logged')
+        return '\n'.join(self.tail)
+
+
+def _drain_stream(stream, output_logger):
+    for line in stream:
+        output_logger.log(line)
+    return output_logger.close()
+
+
+def _start_watchdog(process, timeout):
+    """ kill the process group of `process` after `timeout` seconds, returns (timer, timed out event) """
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        try:
+            os.killpg(process.pid, signal.SIGKILL)  # Gitleaks and the git processes it started
+        except ProcessLookupError:
+            pass
+
+    timer = threading.Timer(timeout, kill)
+    timer.daemon = True
+    timer.start()
+    return timer, timed_out
+
+
+def _popen_limits(limits, kwargs):
+    """ the Popen arguments of the scan limits: a process group of its own when there is a timeout (so the whole
+    group can be killed). the rest is applied with limits.wrap() and limits.apply() """
+    if limits.timeout is not None:
+        kwargs.setdefault('start_new_session', True)
+    return kwargs
+
+
+def execute_command(command, tail_size=STREAM_TAIL_LINES, limits=None, **kwargs):
+    """ execute a Gitleaks command in a subprocess, under the scan limits (see scan_limits).
+    its output is streamed into the logger line by line (never buffered in full), the returned
+    CompletedProcess only keeps the last `tail_size` lines of stdout and stderr. a scan killed by the
+    timeout returns 124, one killed by a signal (or by the memory limit) 128 + the signal number """
+    limits = limits if limits is not None else scan_limits.get_limits()
     try:
         command_split = shlex.split(command)
-        process = subprocess.run(command_split, capture_output=True, text=True, **kwargs)
-        if process.stdout:
-            logger.debug(f'stdout:\n{process.stdout}')
-        if process.stderr:
-            logger.debug(f'stderr:\n{process.stderr}')
-        return process
+        with subprocess.Popen(limits.wrap(command_split), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                              errors='replace', **_popen_limits(limits, kwargs)) as process:
+            limits.apply(process.pid)
+            timer, timed_out = _start_watchdog(process, limits.timeout) if limits.timeout is not None else (None, None)
+            try:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as stderr_reader:
+                    stderr = stderr_reader.submit(_drain_stream, process.stderr, OutputLogger('stderr', tail_size))
+                    stdout = _drain_stream(process.stdout, OutputLogger('stdout', tail_size))
+                    stderr = stderr.result()
+                returncode = process.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+        returncode = scan_limits.exit_code(returncode, timed_out is not None and timed_out.is_set(), stderr, limits)
+        return subprocess.CompletedProcess(args=command_split, returncode=returncode, stdout=stdout, stderr=stderr)
     except subprocess.CalledProcessError as e:
         log_error_to_file(exit_code=e.returncode, error_message=str(e))
         sys.exit(e.returncode)
@@ -52,21 +152,175 @@ def execute_command(command, **kwargs):
         sys.exit(2)
 
 
-def run_gitleaks(directory_to_scan, output_file):
+class ScanError(Exception):
+    """ raised by the library API (`scan`) instead of exiting, `exit_code` follows the CLI exit codes """
+
+    def __init__(self, exit_code, message):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+class ScanTimeoutError(ScanError):
+    """ the Gitleaks subprocess did not finish in time and was killed """
+
+
+async def _log_stream(stream, stream_name, tail_size):
+    """ log a subprocess stream line by line as it arrives, only the last `tail_size` lines are kept """
+    output_logger = OutputLogger(stream_name, tail_size)
+    async for raw_line in stream:
+        output_logger.log(raw_line.decode(errors='replace'))
+    return output_logger.close()
+
+
+async def execute_command_async(command, timeout=None, tail_size=STREAM_TAIL_LINES, limits=None):
+    """ asyncio version of execute_command, under the same scan limits (see scan_limits): the output is streamed
+    into the logger instead of being buffered, only its last lines are kept in the returned CompletedProcess.
+    the subprocess (and the processes it started) is killed when `timeout` (seconds, the --timeout of the limits
+    by default) expires (ScanTimeoutError, exit code 124) or when the calling task is cancelled. a scan killed
+    by a signal (or by the memory limit) returns 128 + the signal number """
+    import asyncio  # the library API only, the CLI never starts an event loop
+
+    limits = limits if limits is not None else scan_limits.get_limits()
+    timeout = timeout if timeout is not None else limits.timeout
+    command_split = shlex.split(command)
+    process = await asyncio.create_subprocess_exec(
+        *limits.wrap(command_split), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        limit=STREAM_LINE_LIMIT, start_new_session=timeout is not None
+    )
+    limits.apply(process.pid)
+    try:
+        stdout, stderr, _ = await asyncio.wait_for(asyncio.gather(
+            _log_stream(process.stdout, 'stdout', tail_size),
+            _log_stream(process.stderr, 'stderr', tail_size),
+            process.wait()
+        ), timeout)
+    except asyncio.TimeoutError:
+        await _kill(process, process_group=True)
+        raise ScanTimeoutError(exit_code=scan_limits.TIMEOUT_EXIT_CODE,
+                               message=f"Command timed out after {timeout} seconds: {command}")
+    except asyncio.CancelledError:
+        await _kill(process, process_group=timeout is not None)
+        raise
+    returncode = scan_limits.exit_code(process.returncode, stderr=stderr, limits=limits)
+    return subprocess.CompletedProcess(args=command_split, returncode=returncode, stdout=stdout, stderr=stderr)
+
+
+async def _kill(process, process_group=False):
+    if process.returncode is None:
+        if process_group:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)  # Gitleaks and the git processes it started
+            except ProcessLookupError:
+                pass
+        else:
+            process.kill()
+        await process.wait()
+
+
+def _load_custom_findings(report_path, compact=False):
+    """ read a report into the custom output format, raising ScanError instead of exiting.
+    with compact, the findings go straight into a FindingsStore instead of a list of dicts """
+    if compact:
+        from findings_store import FindingsStore
+    try:
+        with open(report_path, 'r') as report_file:
+            if compact:
+                return FindingsStore.from_report(iter_json_array(report_file))
+            return list(transform_findings(iter_json_array(report_file)))
+    except FileNotFoundError:
+        return FindingsStore() if compact else []  # Gitleaks did not write any report, nothing was found
+    except json.JSONDecodeError as e:
+        raise ScanError(exit_code=3, message=f"JSON decoding error: {str(e)}")
+
+
+async def scan(directory, config_path=None, timeout=None, compact=False):
+    """ library API: scan a directory with Gitleaks and return its findings in the custom output format.
+    the report goes to a temporary file (nothing is written into the scanned directory), many scans can run
+    concurrently on the same event loop. the scan limits (scan_limits.configure) apply like for the CLI, with
+    `timeout` overriding theirs. errors raise ScanError (with the CLI exit codes) instead of exiting the interpreter.
+    with compact, a findings_store.FindingsStore is returned instead of a list of dicts (much less memory) """
+    import asyncio
+
+    if not os.path.isdir(directory):
+        raise ScanError(exit_code=2, message=f"The directory {directory} does not exist.")
+
+    with tempfile.TemporaryDirectory(prefix='gitleaks-scan-') as scratch_dir:
+        report_path = os.path.join(scratch_dir, 'report.json')
+        command = build_gitleaks_command(directory, report_path, config_path=config_path)
+        try:
+            process = await execute_command_async(command, timeout=timeout)
+        except FileNotFoundError as e:
+            raise ScanError(exit_code=2, message=f"Failed to execute Gitleaks. Command: {command}. Error: {str(e)}")
+        if scan_limits.is_killed(process.returncode):
+            raise ScanError(exit_code=process.returncode,
+                            message=scan_limits.describe_kill(process.returncode, scan_limits.get_limits()))
+        if process.returncode not in (0, 1):
+            raise ScanError(exit_code=process.returncode,
+                            message=process.stderr or f"Gitleaks failed with return code {process.returncode}")
+        findings = await asyncio.to_thread(_load_custom_findings, report_path, compact)
+
+    logger.info(f"Scanned {directory}: {len(findings)} findings")
+    return findings
+
+
+async def scan_many(directories, jobs=None, return_exceptions=False, **kwargs):
+    """ library API: scan many directories from one event loop, at most `jobs` Gitleaks processes at a time.
+    returns the findings of every directory, in the same order """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(jobs or os.cpu_count() or 1)
+
+    async def bounded_scan(directory):
+        async with semaphore:
+            return await scan(directory, **kwargs)
+
+    return await asyncio.gather(*(bounded_scan(directory) for directory in directories),
+                                return_exceptions=return_exceptions)
+
+
+def build_gitleaks_command(source, report_path, config_path=None, git_history=False, log_opts=None):
+    """ build the Gitleaks command line that scans `source` and writes its JSON report to `report_path`.
+    by default the files are scanned as-is (--no-git), with git_history the commits are scanned instead,
+    optionally restricted with `log_opts` (e.g. a commit range) """
+    command = "gitleaks detect" if git_history else "gitleaks detect --no-git"
+    command += f" --report-path {shlex.quote(report_path)} --source {shlex.quote(source)}"
+    if config_path:
+        command += f" --config {shlex.quote(config_path)}"
+    if git_history and log_opts:
+        command += f" --log-opts {shlex.quote(log_opts)}"
+    return command
+
+
+def get_gitleaks_version():
+    """ the version of the installed Gitleaks binary """
+    process = execute_command("gitleaks version")
+    return process.stdout.strip() if process is not None and process.stdout else ''
+
+
+def run_gitleaks(directory_to_scan, output_file, report_path=None, config_path=None, git_history=False,
+                 log_opts=None):
     if not os.path.exists(directory_to_scan):
         error_message = f"The directory {directory_to_scan} does not exist."
         log_error_to_file(exit_code=2, error_message=error_message)
         sys.exit(2)
 
-    report_path = os.path.join(directory_to_scan, output_file)
-    command = f"gitleaks detect --no-git --report-path {directory_to_scan}/output_test.json --source {directory_to_scan}"
+    if report_path is None:
+        report_path = os.path.join(directory_to_scan, output_file)
+    command = build_gitleaks_command(directory_to_scan, report_path, config_path=config_path,
+                                     git_history=git_history, log_opts=log_opts)
     try:
-        process = execute_command(command)
+        with metrics.stage("gitleaks"):
+            process = execute_command(command)
         if process is not None:
             if process.returncode == 0:
                 logger.info(f"Gitleaks scan completed successfully. No leaks found. Report saved at {report_path}")
             elif process.returncode == 1:
                 logger.warning(f"Gitleaks scan completed. Leaks detected. Report saved at {report_path}")
+            elif scan_limits.is_killed(process.returncode):
+                error_message = f"{scan_limits.describe_kill(process.returncode, scan_limits.get_limits())}. " \
+                                f"Directory: {directory_to_scan}"
+                logger.error(error_message)
+                log_error_to_file(exit_code=process.returncode, error_message=error_message)
             else:
                 logger.error(f"Error occurred during Gitleaks scan. Return code: {process.returncode}")
                 if process.stderr:
@@ -81,46 +335,1007 @@ def run_gitleaks(directory_to_scan, output_file):
         sys.exit(2)
 
 
-def get_findings_from_output_file(output_filepath):
-    """ parse the original Gitleaks JSON output file and return it """
+def exit_if_killed(process):
+    """ a scan killed by a limit (already reported by run_gitleaks) stops the controller with its exit code """
+    if process is not None and scan_limits.is_killed(process.returncode):
+        sys.exit(process.returncode)
+
+
+def exit_if_failed(process):
+    """ a failed scan (already reported by run_gitleaks) stops the controller with its exit code, instead of
+    parsing a partial report as if the scan had succeeded """
+    if process is None:
+        sys.exit(2)
+    if process.returncode not in (0, 1):
+        sys.exit(process.returncode)
+
+
+REPORT_STDOUT = "/dev/stdout"
+REPORT_PIPE_PATHS = ('-', REPORT_STDOUT)
+
+
+def is_report_pipe(report_path):
+    """ whether the report goes through a pipe: Gitleaks stdout ('-' or /dev/stdout) or a named FIFO """
+    if report_path in REPORT_PIPE_PATHS:
+        return True
     try:
-        findings = []
-        with open(output_filepath, 'r') as output_file:
-            findings = json.load(output_file)
-        return findings
+        return stat.S_ISFIFO(os.stat(report_path).st_mode)
+    except OSError:
+        return False
+
+
+class PipeReader:
+    """ text reads of a binary pipe that return as soon as some data is available
+    (read(n) on a text pipe waits until n characters arrived), so the report is parsed while it is written """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def read(self, size):
+        while True:
+            data = self.raw.read1(size)
+            text = self.decoder.decode(data, final=not data)
+            if text or not data:
+                return text
+
+
+def _open_fifo(fifo_path):
+    """ open the FIFO for reading before Gitleaks starts, together with a write end held until Gitleaks exits:
+    the reader never waits for a writer, and it gets an end of file once Gitleaks exited (even when Gitleaks
+    failed before opening its report) """
+    read_fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+    write_fd = os.open(fifo_path, os.O_WRONLY)
+    os.set_blocking(read_fd, True)
+    return os.fdopen(read_fd, 'rb'), write_fd
+
+
+def _release_fifo(process, write_fd):
+    process.wait()
+    os.close(write_fd)
+
+
+def iter_gitleaks_report(directory_to_scan, report_path, config_path=None):
+    """ run Gitleaks with its report sent to a pipe and lazily yield the raw findings while it is written.
+    nothing is written to disk: the report goes to the Gitleaks stdout ('-' or /dev/stdout) or to the
+    given named FIFO. Gitleaks errors exit with its return code, an invalid report with 3 """
+    if not os.path.isdir(directory_to_scan):
+        log_error_to_file(exit_code=2, error_message=f"The directory {directory_to_scan} does not exist.")
+        sys.exit(2)
+
+    to_stdout = report_path in REPORT_PIPE_PATHS
+    command = build_gitleaks_command(directory_to_scan, REPORT_STDOUT if to_stdout else report_path,
+                                     config_path=config_path)
+    limits = scan_limits.get_limits()
+    report, write_fd = None, None
+    if not to_stdout:
+        report, write_fd = _open_fifo(report_path)
+    try:
+        process = subprocess.Popen(limits.wrap(shlex.split(command)), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   **_popen_limits(limits, {}))
+    except FileNotFoundError as e:
+        if report is not None:
+            report.close()
+            os.close(write_fd)
+        log_error_to_file(exit_code=2, error_message=f"Failed to execute Gitleaks. Command: {command}. Error: {str(e)}")
+        sys.exit(2)
+    limits.apply(process.pid)
+
+    decode_error = None
+    timer, timed_out = _start_watchdog(process, limits.timeout) if limits.timeout is not None else (None, None)
+    with process, concurrent.futures.ThreadPoolExecutor(max_workers=3) as readers:
+        stderr = readers.submit(_drain_stream, io.TextIOWrapper(process.stderr, errors='replace'),
+                                OutputLogger('stderr'))
+        try:
+            if to_stdout:
+                report = process.stdout
+            else:
+                readers.submit(_drain_stream, io.TextIOWrapper(process.stdout, errors='replace'),
+                               OutputLogger('stdout'))
+                readers.submit(_release_fifo, process, write_fd)
+            with report:
+                try:
+                    yield from iter_json_array(PipeReader(report))
+                except json.JSONDecodeError as e:
+                    decode_error = e
+                    while report.read1(REPORT_CHUNK_SIZE):  # let Gitleaks finish writing, its return code tells more
+                        pass
+        except BaseException:
+            process.kill()  # the consumer stopped early (or failed), don't leave Gitleaks running
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        returncode = scan_limits.exit_code(process.wait(), timed_out is not None and timed_out.is_set(),
+                                           stderr.result(), limits)
+
+    if scan_limits.is_killed(returncode):
+        error_message = scan_limits.describe_kill(returncode, limits)
+        logger.error(f"{error_message}. Directory: {directory_to_scan}")
+        log_error_to_file(exit_code=returncode, error_message=error_message)
+        sys.exit(returncode)
+    if returncode not in (0, 1):
+        error_message = stderr.result() or f"Gitleaks failed with return code {returncode}"
+        logger.error(f"Error occurred during Gitleaks scan. Return code: {returncode}")
+        log_error_to_file(exit_code=returncode, error_message=error_message)
+        sys.exit(returncode)
+    if decode_error is not None:
+        log_error_to_file(exit_code=3, error_message=f"JSON decoding error: {str(decode_error)}")
+        sys.exit(3)
+    logger.info(f"Gitleaks scan completed (return code: {returncode}), the report was read from {report_path}")
+
+
+CUSTOM_OUTPUT_FILENAME = "custom_output_test.json"
+COMBINED_OUTPUT_FILENAME = "combined_custom_output.json"
+STATE_FILENAME = "gitleaks_state.json"
+SHARDS_AUTO = 0
+MIN_AUTO_SHARD_SIZE = 64 * 1024 * 1024  # --shards auto never makes shards smaller than this
+JSON_WHITESPACE = ' \t\n\r'
+MMAP_DECODE_LIMIT = 32 * 1024 * 1024  # bigger reports are streamed instead of decoded in one go
+BATCH_MAX_BYTES = 64 * 1024 * 1024  # --batch_size only groups directories up to this size, and batches up to it
+
+
+def _decode_error(msg, buffer, pos, consumed, lines, column):
+    """ build a JSONDecodeError whose position refers to the whole report and not only to the read window """
+    newline = buffer.rfind('\n', 0, pos)
+    lineno = lines + buffer.count('\n', 0, pos) + 1
+    colno = pos - newline if newline != -1 else column + pos + 1
+    error = json.JSONDecodeError(msg, buffer, pos)
+    error.pos, error.lineno, error.colno = consumed + pos, lineno, colno
+    error.args = (f"{msg}: line {lineno} column {colno} (char {consumed + pos})",)
+    return error
+
+
+def iter_json_array(stream, chunk_size=REPORT_CHUNK_SIZE):
+    """ incrementally decode a top-level JSON array from a text stream, yielding one element at a time.
+    only the current element (plus one chunk) is held in memory, whatever the size of the stream """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    consumed = lines = column = 0  # what was already dropped from the front of the buffer
+
+    def fill():
+        nonlocal buffer, pos, eof, consumed, lines, column
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        dropped = buffer[:pos]
+        newline = dropped.rfind('\n')
+        column = len(dropped) - newline - 1 if newline != -1 else column + len(dropped)
+        lines += dropped.count('\n')
+        consumed += pos
+        buffer, pos = buffer[pos:] + chunk, 0
+        return True
+
+    def peek():
+        """ skip whitespace and return the next significant character ('' at the end of the stream) """
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in JSON_WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof or not fill():
+                return ''
+
+    def error(msg):
+        return _decode_error(msg, buffer, pos, consumed, lines, column)
+
+    if peek() != '[':
+        raise error("Expecting value")
+    pos += 1
+    if peek() == ']':
+        pos += 1
+    else:
+        while True:
+            peek()
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                if end == len(buffer) and not eof and fill():
+                    continue  # a scalar may continue in the next chunk, decode it again
+            except json.JSONDecodeError as e:
+                if not eof and fill():
+                    continue  # the element is split across chunks, read more and retry
+                raise _decode_error(e.msg, buffer, e.pos, consumed, lines, column)
+            pos = end
+            yield element
+
+            delimiter = peek()
+            if delimiter == ']':
+                pos += 1
+                break
+            if delimiter != ',':
+                raise error("Expecting ',' delimiter")
+            pos += 1
+    if peek():
+        raise error("Extra data")
+
+
+def _map_report(output_file):
+    """ memory map the report when it is a regular file small enough to be decoded at once, None otherwise
+    (pipes, empty or huge reports are streamed instead) """
+    try:
+        fd = output_file.fileno()
+    except (OSError, ValueError):
+        return None
+    if not isinstance(fd, int):
+        return None
+    file_stat = os.fstat(fd)
+    if not stat.S_ISREG(file_stat.st_mode) or not 0 < file_stat.st_size <= MMAP_DECODE_LIMIT:
+        return None
+    try:
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def _decode_mapped_report(buffer):
+    """ decode a whole memory-mapped report with the fastest JSON backend installed """
+    backend = json_backends.get_backend()
+    try:
+        findings = backend.loads(buffer)
+    except backend.errors as e:
+        raise json.JSONDecodeError(f"{str(e)} ({backend.name})", '', 0) from e
+    if not isinstance(findings, list):
+        raise json.JSONDecodeError("Expecting a JSON array of findings", '', 0)
+    return findings
+
+
+def _iter_report(output_file):
+    with output_file:
+        try:
+            buffer = _map_report(output_file)
+            if buffer is None:
+                yield from iter_json_array(output_file)
+            else:
+                with buffer:
+                    findings = _decode_mapped_report(buffer)
+                yield from findings
+        except json.JSONDecodeError as e:
+            log_error_to_file(exit_code=3, error_message=f"JSON decoding error: {str(e)}")
+            sys.exit(3)
+
+
+def iter_findings_from_output_file(output_filepath):
+    """ open the original Gitleaks JSON output file and lazily yield its findings one at a time.
+    reports up to MMAP_DECODE_LIMIT are memory mapped and decoded at once by the selected JSON backend,
+    bigger ones (and pipes) go through the streaming parser so the memory use stays bounded """
+    try:
+        output_file = open(output_filepath, 'r')
     except FileNotFoundError:
         log_error_to_file(exit_code=2, error_message=f"File not found: {output_filepath}")
         sys.exit(2)
-    except json.JSONDecodeError as e:
-        log_error_to_file(exit_code=3, error_message=f"JSON decoding error: {str(e)}")
-        sys.exit(3)
+    return _iter_report(output_file)
+
+
+def get_findings_from_output_file(output_filepath):
+    """ parse the original Gitleaks JSON output file and return it """
+    return list(iter_findings_from_output_file(output_filepath))
+
+
+def transform_findings(findings, fingerprints=False, triage=False, root=None):
+    """ lazily convert raw Gitleaks findings into the custom output format.
+    with fingerprints, each finding also gets its (integer) fingerprint of its path relative to the scanned `root`,
+    see baseline.fingerprint.
+    with triage, each finding also gets the verdict and score of the triage stage, see triage.Triage """
+    get_fields = operator.itemgetter('File', 'StartLine', 'EndLine', 'Description')
+    for __finding__ in findings:
+        filename, start_line, end_line, desc = get_fields(__finding__)
+        custom = {"filename": filename, "line_range": f"{start_line}-{end_line}", "description": desc}
+        if fingerprints:
+            custom["fingerprint"] = fingerprint(__finding__, root)
+        if triage:
+            custom["triage"], custom["score"] = __finding__['Triage'], __finding__['TriageScore']
+        yield custom
+
+
+def write_custom_output(findings, custom_output_filepath, output_format="json"):
+    """ write the custom findings to a file while passing them through, so the output is never held in memory.
+    the json layout is the same as json.dump({'findings': [...]}, f, indent=4), see output_formats for the others """
+    writer, f = open_output(custom_output_filepath, output_format)
+    with f:
+        yield from writer(findings, f)
+        metrics.add("custom_output", bytes_written=f.tell())
+
+
+def _read_and_transform(output_filepath, baseline=None, summary=None, root=None, triage=None):
+    """ the instrumented report reading and conversion stages of the pipeline """
+    if os.path.isfile(output_filepath):
+        metrics.add("read_report", bytes_read=os.path.getsize(output_filepath))
+    findings = metrics.timed("read_report", iter_findings_from_output_file(output_filepath))
+    return _triage_and_transform(findings, baseline, summary, root, triage)
+
+
+def _triage_and_transform(findings, baseline=None, summary=None, root=None, triage=None):
+    findings = _apply_triage(findings, triage)
+    findings = _summarise(findings, summary, root)
+    return metrics.timed("transform", transform_findings(findings, fingerprints=baseline is not None,
+                                                         triage=triage is not None, root=root))
+
+
+def _apply_triage(findings, triage):
+    """ score the raw findings while they still hold their secret, dropping the false positives with --triage drop """
+    if triage is None:
+        return findings
+    return metrics.timed("triage", triage.apply(findings))
+
+
+def _summarise(findings, summary, root=None):
+    """ count the raw findings (rule, path, commit, entropy) on their way to the conversion, which drops them """
+    if summary is None:
+        return findings
+    return metrics.timed("summary", summary.observe(findings, root))
+
+
+def _apply_baseline(findings, baseline):
+    """ only keep the findings that are new or resolved since the baseline scan """
+    if baseline is None:
+        return findings
+    return metrics.timed("baseline", baseline.diff(findings))
+
+
+def _save_custom_output(findings, custom_output_dir, output_format):
+    __custom_output_filepath__ = os.path.join(custom_output_dir,
+                                              with_format_extension(CUSTOM_OUTPUT_FILENAME, output_format))
+    return metrics.timed("custom_output", write_custom_output(findings, __custom_output_filepath__, output_format))
 
 
 def parse_json_output(_current_dir_, __output_filename__,
-                      save_customize_output=True):
-    """ given the output JSON file, this method manipulates the output as requested in the assignment """
+                      save_customize_output=True, output_format="json", custom_output_dir=None, baseline=None,
+                      summary=None, triage=None, root=None):
+    """ given the output JSON file, this method manipulates the output as requested in the assignment.
+    the findings are returned as a lazy stream: the report is read, converted and (optionally) written to
+    the custom output file, in the selected format, while the caller iterates over output['findings'].
+    the summary and the fingerprints use the paths relative to `root`, the scanned directory (or archive),
+    _current_dir_ by default """
     output_filepath = os.path.join(_current_dir_, __output_filename__)
-    findings = get_findings_from_output_file(output_filepath)
+    findings = _apply_baseline(_read_and_transform(output_filepath, baseline, summary, root or _current_dir_,
+                                                   triage), baseline)
+    if save_customize_output:  # by default, the custom output is saved inside the container
+        findings = _save_custom_output(findings, custom_output_dir or _current_dir_, output_format)
 
-    output = {
-        'findings': []
+    return {
+        'findings': findings
     }
-    for __finding__ in findings:
-        filename = __finding__['File']
-        line_range = f"{__finding__['StartLine']}-{__finding__['EndLine']}"
-        desc = __finding__['Description']
-        finding_dict = {
-            "filename": filename,
-            "line_range": line_range,
-            "description": desc
-        }
-        output['findings'].append(finding_dict)
-    if save_customize_output:  # by default, the custom output is saved inside the container
-        __custom_output_filepath__ = os.path.join(_current_dir_, "custom_output_test.json")
-        with open(__custom_output_filepath__, 'w') as f:
-            json.dump(output, f, indent=4)
 
-    return output
+
+def stream_json_output(directory_to_scan, report_path, config_path=None, save_customize_output=True,
+                       output_format="json", custom_output_dir=None, baseline=None, summary=None, triage=None):
+    """ same as run_gitleaks followed by parse_json_output, but the report goes through a pipe (see
+    iter_gitleaks_report) and is parsed while Gitleaks writes it: no report file is written, and the
+    custom output goes to `custom_output_dir` (the current directory by default), not into the scanned tree """
+    findings = metrics.timed("read_report", iter_gitleaks_report(directory_to_scan, report_path, config_path))
+    findings = _triage_and_transform(findings, baseline, summary, directory_to_scan, triage)
+    findings = _apply_baseline(findings, baseline)
+    if save_customize_output:
+        findings = _save_custom_output(findings, custom_output_dir or os.getcwd(), output_format)
+    return {
+        'findings': findings
+    }
+
+
+def consume_findings(custom_output):
+    """ drain the findings stream without printing it (so the custom output still gets written) """
+    return _drain(custom_output['findings'])
+
+
+def read_manifest(manifest_path):
+    """ read the directories to scan from a manifest file.
+    one directory per line, blank lines and lines starting with # are ignored, relative paths are
+    resolved against the manifest location """
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            lines = [line.strip() for line in manifest_file]
+    except OSError as e:
+        log_error_to_file(exit_code=2, error_message=f"Failed to read the manifest file: {manifest_path}. Error: {str(e)}")
+        sys.exit(2)
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    return [os.path.join(manifest_dir, line) for line in lines if line and not line.startswith('#')]
+
+
+def get_scan_directories(__args__):
+    """ collect every directory to scan from the repeated --dir flags and the manifest, without duplicates """
+    dirnames = list(__args__.dirnames or [__args__.dirname])
+    if __args__.manifest:
+        if not __args__.dirnames:  # the default --dir (cwd) is only scanned when no manifest is given
+            dirnames = []
+        dirnames.extend(read_manifest(__args__.manifest))
+
+    unique_dirnames, seen = [], set()
+    for dirname in dirnames:
+        key = os.path.abspath(dirname)
+        if key not in seen:
+            seen.add(key)
+            unique_dirnames.append(dirname)
+    if not unique_dirnames:
+        log_error_to_file(exit_code=2, error_message="No directories to scan.")
+        sys.exit(2)
+    return unique_dirnames
+
+
+def scan_directory(dirname, output_filename, config_path=None):
+    """ clean the previous report of a directory and scan it, each directory keeps its own report path """
+    clean_outputfile(os.path.join(dirname, output_filename))
+    return run_gitleaks(dirname, output_filename, config_path=config_path)
+
+
+def scan_batch(dirnames, output_filename, config_path=None):
+    """ scan several (small) directories with a single Gitleaks process, so its start-up (loading and compiling
+    the rules) is paid once for the whole batch. the files of every directory are staged (hard linked) into
+    their own subdirectory of one staging directory, the report is then split back: every directory gets its
+    report at its usual path, with its original paths, as if it had been scanned on its own """
+    for dirname in dirnames:
+        clean_outputfile(os.path.join(dirname, output_filename))
+
+    parent = os.path.commonpath([os.path.abspath(dirname) for dirname in dirnames])
+    if parent in map(os.path.abspath, dirnames):  # nested directories, stay out of the walked trees
+        parent = os.path.dirname(parent)
+    with scratch_directory(parent, 'gitleaks-batch-') as scratch_dir:
+        staging_dir = os.path.join(scratch_dir, 'staging')
+        report_path = os.path.join(scratch_dir, output_filename)
+        for index, dirname in enumerate(dirnames):
+            target_dir = os.path.join(staging_dir, str(index))
+            os.makedirs(target_dir)
+            stage_files((file_path for file_path, _ in iter_files(dirname)), dirname, target_dir)
+
+        process = run_gitleaks(staging_dir, output_filename, report_path=report_path, config_path=config_path)
+        if process is None or process.returncode not in (0, 1):
+            return process  # the failure was already reported
+
+        findings_per_target = [[] for _ in dirnames]
+        for finding in iter_findings_from_output_file(report_path):
+            index, _, _ = os.path.relpath(finding['File'], staging_dir).partition(os.sep)
+            target = int(index)
+            finding['File'] = restore_path(finding['File'], os.path.join(staging_dir, index), dirnames[target])
+            findings_per_target[target].append(finding)
+
+    count = 0
+    for dirname, findings in zip(dirnames, findings_per_target):
+        count += write_report(findings, os.path.join(dirname, output_filename))
+    logger.info(f"Scanned {len(dirnames)} directories with one Gitleaks process ({count} findings)")
+    return subprocess.CompletedProcess(args=f"batched scan of {len(dirnames)} directories",
+                                       returncode=1 if count else 0)
+
+
+def plan_batches(dirnames, batch_size, max_bytes=BATCH_MAX_BYTES):
+    """ group the directories into scan batches, smallest first: up to `batch_size` directories and `max_bytes`
+    per batch. directories bigger than `max_bytes` are scanned on their own. returns lists of directories """
+    sizes = _directory_sizes(dirnames)
+    batches, batch, batch_bytes = [], [], 0
+    for dirname in sorted(dirnames, key=sizes.__getitem__):
+        if batch and (len(batch) == batch_size or batch_bytes + sizes[dirname] > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(dirname)
+        batch_bytes += sizes[dirname]
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _scan_batch_or_directory(batch, output_filename, config_path=None):
+    if len(batch) == 1:
+        return scan_directory(batch[0], output_filename, config_path)
+    return scan_batch(batch, output_filename, config_path)
+
+
+def scan_directories(dirnames, output_filename, jobs, combined_output_filepath, save_customize_output=True,
+                     config_path=None, output_format="json", baseline=None, summary=None, batch_size=1,
+                     batch_max_bytes=BATCH_MAX_BYTES, triage=None):
+    """ scan many directories at the same time on a bounded pool of workers, then merge all the reports
+    into one combined (lazy) custom output. every worker only waits on its own Gitleaks subprocess,
+    so the scans themselves run in parallel on all the available cores. the smallest directories are
+    scanned first (shortest job first), the combined output keeps the order of `dirnames`. the directories
+    whose scan failed or was killed by a limit (--timeout...) are reported and left out of the combined output.
+    the summary paths start with the name of each scanned directory. with a `batch_size`, small directories
+    are scanned together, up to `batch_size` per Gitleaks process (see scan_batch) """
+    for dirname in dirnames:  # fail fast, before any scan was started
+        if not os.path.isdir(dirname):
+            log_error_to_file(exit_code=2, error_message=f"The directory {dirname} does not exist.")
+            sys.exit(2)
+
+    if batch_size > 1:
+        batches = plan_batches(dirnames, batch_size, batch_max_bytes)
+    else:
+        batches = [[dirname] for dirname in schedule_directories(dirnames)]
+    logger.info(f"Scanning {len(dirnames)} directories in {len(batches)} Gitleaks runs with {jobs} workers")
+    failed = {}  # directory -> return code of its failed or killed scan (already reported by run_gitleaks)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_scan_batch_or_directory, batch, output_filename, config_path): batch
+                   for batch in batches}
+        for future in concurrent.futures.as_completed(futures):
+            process = future.result()
+            returncode = process.returncode if process is not None else None
+            logger.debug(f"Finished scanning {', '.join(futures[future])} (return code: {returncode})")
+            if returncode not in (0, 1):  # no (complete) report to read
+                failed.update(dict.fromkeys(futures[future], 2 if returncode is None else returncode))
+    killed = sorted(dirname for dirname, returncode in failed.items() if scan_limits.is_killed(returncode))
+    if killed:
+        logger.warning(f"Left out of the combined output, their scan was killed: {', '.join(killed)}")
+    errors = sorted(f"{dirname} (return code {returncode})" for dirname, returncode in failed.items()
+                    if not scan_limits.is_killed(returncode))
+    if errors:
+        logger.warning(f"Left out of the combined output, their scan failed: {', '.join(errors)}")
+
+    findings = itertools.chain.from_iterable(
+        _read_and_transform(os.path.join(dirname, output_filename), baseline, summary,
+                            os.path.dirname(dirname.rstrip('/')), triage)
+        for dirname in dirnames if dirname not in failed
+    )
+    findings = _apply_baseline(findings, baseline)
+    if save_customize_output:
+        combined_output_filepath = with_format_extension(combined_output_filepath, output_format)
+        findings = metrics.timed("custom_output",
+                                 write_custom_output(findings, combined_output_filepath, output_format))
+    return {
+        'findings': findings
+    }
+
+
+def _directory_sizes(dirnames):
+    sizes = {}
+    for dirname in dirnames:
+        try:
+            sizes[dirname] = _measure_tree(dirname, {})
+        except OSError:
+            sizes[dirname] = 0  # let the scan report it
+    return sizes
+
+
+def schedule_directories(dirnames):
+    """ the directories in shortest job first order: by size of their tree, smallest first, so the many
+    small scans are not stuck behind a huge one and their results come early """
+    sizes = _directory_sizes(dirnames)
+    return sorted(dirnames, key=sizes.__getitem__)
+
+
+def write_report(findings, report_path):
+    """ stream raw findings into a Gitleaks-style JSON report (same layout as the reports Gitleaks writes),
+    returns the number of findings written """
+    count = 0
+    with open(report_path, 'w') as report_file:
+        report_file.write('[')
+        for count, finding in enumerate(findings, start=1):
+            report_file.write('\n' if count == 1 else ',\n')
+            report_file.write(textwrap.indent(json.dumps(finding, indent=1), ' '))
+        report_file.write('\n]' if count else ']')
+    return count
+
+
+def finding_key(finding):
+    """ identity of a raw finding, used to de-duplicate findings coming from several reports """
+    return (finding['File'], finding['StartLine'], finding['EndLine'], finding.get('StartColumn'),
+            finding.get('EndColumn'), finding.get('RuleID'), finding.get('Secret'), finding.get('Commit'))
+
+
+def deduplicate_findings(findings):
+    seen = set()
+    for finding in findings:
+        key = finding_key(finding)
+        if key not in seen:
+            seen.add(key)
+            yield finding
+
+
+def _measure_tree(path, sizes):
+    """ total size in bytes of a directory, the size of every subdirectory is recorded in `sizes` """
+    total = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                total += _measure_tree(entry.path, sizes)
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+    sizes[path] = total
+    return total
+
+
+def plan_shards(directory, shards):
+    """ split a directory into scan units balanced by size.
+    subtrees that fit in a shard are scanned as-is, bigger ones are split recursively. the loose files of a
+    split directory are grouped into file units (up to one shard worth of bytes), which get staged for the scan.
+    returns (units, shards), every unit being a (size, directory or list of files) tuple, largest first """
+    sizes = {}
+    total_size = _measure_tree(directory, sizes)
+    if shards == SHARDS_AUTO:
+        shards = max(1, min(os.cpu_count() or 1, total_size // MIN_AUTO_SHARD_SIZE))
+    target = max(total_size // shards, 1)
+
+    units, file_group, file_group_size = [], [], 0
+    pending = [directory]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if sizes[entry.path] > target:
+                        pending.append(entry.path)
+                    elif sizes[entry.path]:  # empty subtrees cannot hold any leak
+                        units.append((sizes[entry.path], entry.path))
+                elif entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_size:
+                    file_group.append(entry.path)
+                    file_group_size += entry.stat(follow_symlinks=False).st_size
+                    if file_group_size >= target:
+                        units.append((file_group_size, file_group))
+                        file_group, file_group_size = [], 0
+    if file_group:
+        units.append((file_group_size, file_group))
+
+    units.sort(key=lambda unit: unit[0], reverse=True)  # largest first keeps the workers balanced
+    logger.debug(f"Planned {len(units)} scan units of {directory} ({total_size} bytes) for {shards} shards")
+    return units, shards
+
+
+def pack_shards(units, shards):
+    """ bin-pack the scan units into at most `shards` shards of similar size: every unit, largest first, goes to
+    the lightest shard so far. returns the shards as (size, [directories and files]) tuples, largest first """
+    bins = [(0, index, []) for index in range(min(shards, len(units)))]
+    for size, source in units:  # plan_shards sorts them largest first
+        bin_size, index, sources = heapq.heappop(bins)
+        sources.extend(source if isinstance(source, list) else [source])
+        heapq.heappush(bins, (bin_size + size, index, sources))
+    return sorted(((size, sources) for size, _, sources in bins), key=lambda shard: shard[0], reverse=True)
+
+
+def _iter_shard_files(sources):
+    """ the non-empty regular files of the directories and files of a shard """
+    for source in sources:
+        if not os.path.isdir(source):
+            yield source
+            continue
+        for dirpath, _, filenames in os.walk(source):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                if not os.path.islink(file_path) and os.path.getsize(file_path):
+                    yield file_path
+
+
+def _scan_shard(shard, directory, report_path, staging_dir, config_path=None):
+    """ scan one shard with a single Gitleaks process. a shard made of one directory is scanned in place, the
+    others are staged first. returns the Gitleaks process """
+    _, sources = shard
+    if len(sources) == 1 and os.path.isdir(sources[0]):
+        source = sources[0]
+    else:
+        stage_files(_iter_shard_files(sources), directory, staging_dir)
+        source = staging_dir
+    process = run_gitleaks(source, os.path.basename(report_path), report_path=report_path, config_path=config_path)
+    exit_if_killed(process)
+    return process
+
+
+def run_gitleaks_sharded(directory_to_scan, output_file, shards, config_path=None):
+    """ scan a (big) directory as several Gitleaks subprocesses running in parallel, exactly one per shard.
+    the per-shard reports are merged and de-duplicated into the usual report path, with every path
+    relative to the original directory, so the result matches a single-process scan. a tree that makes a
+    single shard is scanned with a plain run_gitleaks """
+    if not os.path.isdir(directory_to_scan):
+        log_error_to_file(exit_code=2, error_message=f"The directory {directory_to_scan} does not exist.")
+        sys.exit(2)
+
+    output_filepath = os.path.join(directory_to_scan, output_file)
+    units, shards = plan_shards(directory_to_scan, shards)
+    packed = pack_shards(units, shards)
+    if len(packed) <= 1:
+        return run_gitleaks(directory_to_scan, output_file, config_path=config_path)
+    logger.info(f"Scanning {directory_to_scan} as {len(packed)} shards ({len(units)} scan units)")
+
+    with scratch_directory(directory_to_scan, 'gitleaks-shards-') as scratch_dir:  # shards are subtrees
+        report_paths = [os.path.join(scratch_dir, f"shard-{i}.json") for i in range(len(packed))]
+        staging_dirs = [os.path.join(scratch_dir, f"staging-{i}") for i in range(len(packed))]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(packed)) as executor:
+            processes = list(executor.map(_scan_shard, packed, itertools.repeat(directory_to_scan), report_paths,
+                                          staging_dirs, itertools.repeat(config_path)))
+        for process in processes:
+            if process is None or process.returncode not in (0, 1):
+                return process  # the failure was already reported, its shard has no report to merge
+
+        findings = itertools.chain.from_iterable(
+            restore_findings(iter_findings_from_output_file(report_path), staging_dir, directory_to_scan)
+            for report_path, staging_dir in zip(report_paths, staging_dirs)
+        )
+        count = write_report(deduplicate_findings(findings), output_filepath)
+
+    logger.info(f"Merged {len(packed)} shard reports into {output_filepath} ({count} findings)")
+    return subprocess.CompletedProcess(args=f"sharded scan of {directory_to_scan}", returncode=1 if count else 0)
+
+
+def run_gitleaks_prefiltered(directory_to_scan, output_file, rules, max_file_size=None, skip_binary=True,
+                             config_path=None):
+    """ scan only the files worth scanning: the tree is walked in parallel first, ignored directories
+    (node_modules...), too large, binary and empty files are left out, the kept files are staged and fed to
+    Gitleaks. the findings are written to the usual report path, with the original paths """
+    if not os.path.isdir(directory_to_scan):
+        log_error_to_file(exit_code=2, error_message=f"The directory {directory_to_scan} does not exist.")
+        sys.exit(2)
+
+    output_filepath = os.path.join(directory_to_scan, output_file)
+    with metrics.stage("prefilter"):
+        result = prefilter_tree(directory_to_scan, rules, max_file_size=max_file_size, skip_binary=skip_binary,
+                                skip_paths=(output_filepath,))
+    metrics.add("prefilter", bytes_read=result.kept_bytes, findings=len(result.files))
+    logger.info(f"Prefilter of {directory_to_scan}: {result.summary()}")
+
+    with scratch_directory(directory_to_scan, 'gitleaks-prefilter-') as scratch_dir:
+        staging_dir = os.path.join(scratch_dir, 'staging')
+        report_path = os.path.join(scratch_dir, output_file)
+        os.makedirs(staging_dir)
+        stage_files(result.files, os.path.abspath(directory_to_scan), staging_dir)
+        process = run_gitleaks(staging_dir, output_file, report_path=report_path, config_path=config_path)
+        if process is None or process.returncode not in (0, 1):
+            return process  # the failure was already reported
+        count = write_report(restore_findings(iter_findings_from_output_file(report_path), staging_dir,
+                                              directory_to_scan), output_filepath)
+
+    logger.info(f"Report saved at {output_filepath} ({count} findings)")
+    return subprocess.CompletedProcess(args=f"prefiltered scan of {directory_to_scan}", returncode=1 if count else 0)
+
+
+def _iter_archive_findings(stager, staging_dir, chunk_report, config_path, failures):
+    """ scan the archive one staged chunk at a time, the findings point at archive!member. stops at the first
+    failed Gitleaks run, which is appended to `failures` """
+    for members in stager.iter_chunks():
+        process = run_gitleaks(staging_dir, os.path.basename(chunk_report), report_path=chunk_report,
+                               config_path=config_path)
+        if process is None or process.returncode not in (0, 1):
+            failures.append(process)
+            return
+        for finding in iter_findings_from_output_file(chunk_report):
+            member = members.get(os.path.relpath(finding['File'], staging_dir), finding['File'])
+            finding['File'] = archives.member_path(stager.archive_path, member)
+            yield finding
+
+
+def run_gitleaks_archive(archive_path, report_path, chunk_size=archives.ARCHIVE_CHUNK_SIZE, max_file_size=None,
+                         skip_binary=True, config_path=None):
+    """ scan a tarball (.tar, .tar.gz...), a zip or a container image (docker save) without extracting it:
+    the members are streamed out of the archive and staged a chunk at a time, so the scratch disk usage stays
+    below `chunk_size` whatever the size of the archive. the findings of all the chunks go to one report """
+    if not os.path.isfile(archive_path):
+        log_error_to_file(exit_code=2, error_message=f"The archive {archive_path} does not exist.")
+        sys.exit(2)
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='gitleaks-archive-') as scratch_dir:
+        staging_dir = os.path.join(scratch_dir, 'staging')
+        stager = archives.ArchiveStager(archive_path, staging_dir, chunk_size=chunk_size,
+                                        max_file_size=max_file_size, skip_binary=skip_binary)
+        findings = _iter_archive_findings(stager, staging_dir, os.path.join(scratch_dir, 'chunk.json'),
+                                          config_path, failures)
+        try:
+            with metrics.stage("archive"):
+                count = write_report(findings, report_path)
+        except archives.ArchiveError as e:
+            log_error_to_file(exit_code=2, error_message=str(e))
+            sys.exit(2)
+    metrics.add("archive", bytes_read=stager.kept_bytes, findings=count)
+    logger.info(f"Archive {archive_path}: {stager.summary()}")
+    if failures:
+        os.remove(report_path)  # only holds the chunks scanned before the failure
+        return failures[0]  # the failure was already reported
+
+    logger.info(f"Report saved at {report_path} ({count} findings)")
+    return subprocess.CompletedProcess(args=f"archive scan of {archive_path}", returncode=1 if count else 0)
+
+
+def get_triage(__args__):
+    """ the triage stage selected by --triage, None without it """
+    if not __args__.triage:
+        return None
+    allowlist = ()
+    if __args__.triage_allowlist:
+        try:
+            allowlist = load_allowlist(__args__.triage_allowlist)
+        except (OSError, ValueError) as e:
+            log_error_to_file(exit_code=2, error_message=f"Failed to read the triage allowlist: {str(e)}")
+            sys.exit(2)
+    return Triage(__args__.triage, allowlist=allowlist, min_entropy=__args__.triage_min_entropy,
+                  jobs=__args__.triage_jobs)
+
+
+def get_ignore_rules(__args__):
+    """ the exclusion patterns of the prefilter: the defaults, the --exclude_from file and the --exclude flags """
+    patterns = [*DEFAULT_EXCLUDES, *(__args__.exclude or [])]
+    if __args__.exclude_from:
+        try:
+            return IgnoreRules.from_file(__args__.exclude_from, patterns)
+        except OSError as e:
+            log_error_to_file(exit_code=2, error_message=f"Failed to read the exclude file: {__args__.exclude_from}. "
+                                                         f"Error: {str(e)}")
+            sys.exit(2)
+    return IgnoreRules(patterns)
+
+
+def positive_int(value):
+    """ argparse type of the page and count flags """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    return number
+
+
+def shard_count(value):
+    """ argparse type of --shards: 'auto' or a positive number of shards """
+    if value == 'auto':
+        return SHARDS_AUTO
+    try:
+        shards = int(value)
+    except ValueError:
+        shards = 0
+    if shards < 1:
+        raise argparse.ArgumentTypeError(f"expected 'auto' or a positive integer, got {value!r}")
+    return shards
+
+
+def run_gitleaks_cached(directory_to_scan, output_file, cache_path=None, config_path=None):
+    """ scan a directory through the content-hash scan cache.
+    unchanged files reuse the findings cached on the previous run, only the changed files are staged and
+    fed to Gitleaks. the merged findings are written to the usual report path, as a full scan would """
+    if not os.path.isdir(directory_to_scan):
+        log_error_to_file(exit_code=2, error_message=f"The directory {directory_to_scan} does not exist.")
+        sys.exit(2)
+
+    output_filepath = os.path.join(directory_to_scan, output_file)
+    cache_path = cache_path or os.path.join(directory_to_scan, CACHE_FILENAME)
+    skip_paths = (output_filepath, cache_path, f"{cache_path}-journal",
+                  *(os.path.join(directory_to_scan, with_format_extension(CUSTOM_OUTPUT_FILENAME, output_format))
+                    for output_format in OUTPUT_FORMATS))
+    cache = ScanCache(cache_path, scanner_key=f"{get_gitleaks_version()}|{hash_config(config_path)}")
+    try:
+        cached_findings, changed, seen = [], {}, set()
+        for file_path, file_stat in iter_files(directory_to_scan, skip_paths):
+            relative_path = os.path.relpath(file_path, directory_to_scan)
+            seen.add(relative_path)
+            findings, digest = cache.lookup(relative_path, file_path, file_stat.st_size, file_stat.st_mtime_ns)
+            if findings is None:
+                changed[relative_path] = (file_stat.st_size, file_stat.st_mtime_ns, digest)
+            else:
+                cached_findings.extend(findings)
+        pruned = cache.prune(seen)
+        logger.info(f"Scan cache: {cache.hits} hits, {cache.misses} misses "
+                    f"({cache.hit_ratio:.1%} hit ratio), {pruned} deleted files forgotten")
+
+        new_findings = []
+        if changed:
+            process, new_findings = _scan_changed_files(directory_to_scan, output_file, changed, len(seen), cache,
+                                                        config_path)
+            if process is None or process.returncode not in (0, 1):
+                # already reported. no report is written: the cached findings alone would pass for a clean scan
+                return process
+
+        for finding in cached_findings:  # the cache keeps paths relative to the scanned directory
+            finding['File'] = os.path.join(directory_to_scan, finding['File'])
+        count = write_report(itertools.chain(cached_findings, new_findings), output_filepath)
+    finally:
+        cache.close()
+
+    logger.info(f"Report saved at {output_filepath} ({count} findings, {len(changed)} files scanned)")
+    return subprocess.CompletedProcess(args=f"cached scan of {directory_to_scan}", returncode=1 if count else 0)
+
+
+def _scan_changed_files(directory_to_scan, output_file, changed, total_files, cache, config_path=None):
+    """ run Gitleaks over the changed files only and save their findings into the cache.
+    returns the Gitleaks process and the findings of the changed files (none when the scan failed) """
+    in_place = len(changed) == total_files  # nothing to reuse (first run), scan the directory itself
+    scratch = (tempfile.TemporaryDirectory(prefix='gitleaks-cache-') if in_place
+               else scratch_directory(directory_to_scan, 'gitleaks-cache-'))
+    with scratch as scratch_dir:
+        report_path = os.path.join(scratch_dir, output_file)
+        if in_place:
+            staging_dir = source = directory_to_scan
+        else:
+            staging_dir = source = os.path.join(scratch_dir, 'staging')
+            stage_files((os.path.join(directory_to_scan, path) for path in changed), directory_to_scan, staging_dir)
+
+        process = run_gitleaks(source, output_file, report_path=report_path, config_path=config_path)
+        exit_if_killed(process)
+        if process is None or process.returncode not in (0, 1):
+            return process, []  # do not cache anything from a broken scan
+
+        findings_per_file = {path: [] for path in changed}
+        new_findings = []
+        for finding in restore_findings(iter_findings_from_output_file(report_path), staging_dir, directory_to_scan):
+            relative_path = os.path.relpath(finding['File'], directory_to_scan)
+            if relative_path in findings_per_file:  # skip our own artefacts (report, cache...)
+                findings_per_file[relative_path].append(dict(finding, File=relative_path))
+                new_findings.append(finding)
+
+    cache.store((path, *changed[path], findings) for path, findings in findings_per_file.items())
+    return process, new_findings
+
+
+def load_scan_state(state_path):
+    """ the incremental scan state: {repository path: {"last_commit": sha}} """
+    try:
+        with open(state_path, 'r') as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        logger.warning(f"Ignoring the corrupted scan state file {state_path}: {str(e)}")
+        return {}
+
+
+def save_scan_state(state, state_path):
+    """ atomically replace the scan state file, so an interrupted run never leaves a half written state """
+    tmp_state_path = f"{state_path}.tmp"
+    with open(tmp_state_path, 'w') as state_file:
+        json.dump(state, state_file, indent=4)
+    os.replace(tmp_state_path, state_path)
+
+
+def _is_ancestor(repo, ancestor, commit):
+    import git
+
+    try:
+        return repo.is_ancestor(ancestor, commit)
+    except (git.GitCommandError, ValueError):  # the commit vanished (rewritten history, gc...)
+        return False
+
+
+def run_gitleaks_incremental(directory_to_scan, output_file, state_path, config_path=None):
+    """ scan the git history of a repository, starting from the last commit scanned on the previous run.
+    only the new commit range is given to Gitleaks (--log-opts last..HEAD), its findings are merged into
+    the cumulative report kept at the usual report path. the first run, a rewritten history or a missing
+    cumulative report fall back to a full history scan """
+    import git  # GitPython is slow to import and only the --git mode needs it
+
+    try:
+        repo = git.Repo(directory_to_scan)
+        head = repo.head.commit.hexsha
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+        log_error_to_file(exit_code=2, error_message=f"The directory {directory_to_scan} is not a git repository.")
+        sys.exit(2)
+    except ValueError:
+        log_error_to_file(exit_code=2, error_message=f"The repository {directory_to_scan} has no commits yet.")
+        sys.exit(2)
+
+    output_filepath = os.path.join(directory_to_scan, output_file)
+    repository_key = os.path.abspath(repo.working_tree_dir)
+    state = load_scan_state(state_path)
+    last_commit = state.get(repository_key, {}).get('last_commit')
+    has_report = os.path.isfile(output_filepath) and os.path.getsize(output_filepath) > 0
+
+    if last_commit == head and has_report:
+        logger.info(f"No new commits in {directory_to_scan} since {head}, reusing the report at {output_filepath}")
+        return subprocess.CompletedProcess(args=f"incremental scan of {directory_to_scan}", returncode=0)
+
+    incremental = bool(last_commit) and has_report and _is_ancestor(repo, last_commit, head)
+    log_opts = f"{last_commit}..{head}" if incremental else None
+    logger.info(f"Scanning the history of {directory_to_scan}: "
+                f"{log_opts if incremental else 'full history (no usable previous scan)'}")
+
+    with tempfile.TemporaryDirectory(prefix='gitleaks-history-') as scratch_dir:
+        report_path = os.path.join(scratch_dir, output_file)
+        process = run_gitleaks(directory_to_scan, output_file, report_path=report_path, config_path=config_path,
+                               git_history=True, log_opts=log_opts)
+        if process is None or process.returncode not in (0, 1):
+            return process  # keep the previous state, the same range is retried on the next run
+
+        findings = iter_findings_from_output_file(report_path)
+        if incremental:
+            findings = itertools.chain(iter_findings_from_output_file(output_filepath), findings)
+        merged_report_path = os.path.join(scratch_dir, 'merged.json')
+        count = write_report(deduplicate_findings(findings), merged_report_path)
+        shutil.move(merged_report_path, output_filepath)
+
+    state[repository_key] = {'last_commit': head}
+    save_scan_state(state, state_path)
+    logger.info(f"Cumulative report saved at {output_filepath} ({count} findings up to {head})")
+    return subprocess.CompletedProcess(args=f"incremental scan of {directory_to_scan}", returncode=1 if count else 0)
+
+
+class DirectoryListAction(argparse.Action):
+    """ `--dir` may be repeated: the first directory is stored in `dirname`, all of them in `dirnames` """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        dirnames = getattr(namespace, 'dirnames', None) or []
+        if not dirnames:
+            setattr(namespace, self.dest, values)
+        namespace.dirnames = dirnames + [values]
 
 
 def get_parser():
@@ -134,8 +1349,278 @@ def get_parser():
         '--dir',
         dest='dirname',
         type=str,
+        action=DirectoryListAction,
         default=default_dir,
-        help=f"Path to the directory to scan. Default: {default_dir}"
+        help=f"Path to the directory (or archive, see --archive_chunk_size) to scan, repeat the flag to scan several "
+             f"directories. Default: {default_dir}"
+    )
+    parser.set_defaults(dirnames=None)
+
+    parser.add_argument(
+        '--validate',
+        dest='validate',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Strictly validate every finding (no type coercion) when building the bonus models. Default: False"
+    )
+
+    parser.add_argument(
+        '--metrics_out', '--metrics-out',
+        dest='metrics_out',
+        type=str,
+        default=None,
+        help="Write per-stage metrics (time, CPU, bytes, findings) to this file: Prometheus text format for "
+             ".prom/.txt files, JSON otherwise. Default: None"
+    )
+
+    parser.add_argument(
+        '--profile',
+        dest='profile',
+        type=str,
+        default=None,
+        help="Run under cProfile and dump the stats to this file. Default: None"
+    )
+
+    parser.add_argument(
+        '--manifest',
+        dest='manifest',
+        type=str,
+        default=None,
+        help="Path to a file listing directories to scan, one per line. Default: None"
+    )
+
+    parser.add_argument(
+        '--jobs',
+        dest='jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of directories scanned at the same time. Default: the number of CPU cores"
+    )
+
+    parser.add_argument(
+        '--batch_size',
+        dest='batch_size',
+        type=positive_int,
+        default=1,
+        help="With many directories, scan up to this many small directories with a single Gitleaks process "
+             "(its start-up is paid once per batch), every directory still gets its own report. Default: 1"
+    )
+
+    parser.add_argument(
+        '--batch_max_bytes',
+        dest='batch_max_bytes',
+        type=file_size,
+        default=BATCH_MAX_BYTES,
+        help="Size limit of a --batch_size batch (bytes, or with a K/M/G suffix), bigger directories are scanned "
+             "on their own. Default: 64M"
+    )
+
+    parser.add_argument(
+        '--shards',
+        dest='shards',
+        type=shard_count,
+        default=1,
+        help="Split a single --dir into N shards (or 'auto') scanned by parallel Gitleaks processes. Default: 1"
+    )
+
+    parser.add_argument(
+        '--config',
+        dest='config',
+        type=str,
+        default=None,
+        help="Path to a Gitleaks config file (TOML). Default: the Gitleaks built-in rules"
+    )
+
+    parser.add_argument(
+        '--cache',
+        dest='cache',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Reuse the findings of unchanged files from the previous scan. Default: False"
+    )
+
+    parser.add_argument(
+        '--cache_path',
+        dest='cache_path',
+        type=str,
+        default=None,
+        help=f"Path of the scan cache database. Default: '{CACHE_FILENAME}' inside the scanned directory"
+    )
+
+    parser.add_argument(
+        '--git',
+        dest='git',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Scan the git history incrementally, from the last commit scanned on the previous run. Default: False"
+    )
+
+    parser.add_argument(
+        '--state_file',
+        dest='state_file',
+        type=str,
+        default=os.path.join(default_dir, STATE_FILENAME),
+        help=f"State file remembering the last scanned commit of every repository. Default: {STATE_FILENAME}"
+    )
+
+    parser.add_argument(
+        '--watch',
+        dest='watch',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Scan --dir, then keep watching it and only rescan the files that change, until interrupted (Ctrl-C). "
+             "The report and the custom output are rewritten after every pass. Default: False"
+    )
+
+    parser.add_argument(
+        '--watch_backend',
+        dest='watch_backend',
+        choices=("auto", "inotify", "poll"),
+        default="auto",
+        help="How --watch detects the changes: inotify (Linux), or polling the modification times of the files. "
+             "Default: auto (inotify when available)"
+    )
+
+    parser.add_argument(
+        '--watch_debounce',
+        dest='watch_debounce',
+        type=float,
+        default=0.1,
+        help="Seconds without a change before --watch scans a batch of changed files. Default: 0.1"
+    )
+
+    parser.add_argument(
+        '--watch_interval',
+        dest='watch_interval',
+        type=float,
+        default=0.5,
+        help="Seconds between two polls of the tree with --watch_backend poll. Default: 0.5"
+    )
+
+    parser.add_argument(
+        '--combined_output',
+        dest='combined_output',
+        type=str,
+        default=os.path.join(default_dir, COMBINED_OUTPUT_FILENAME),
+        help=f"Custom output file merging all the scanned directories. Default: {COMBINED_OUTPUT_FILENAME}"
+    )
+
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=OUTPUT_FORMATS,
+        default="json",
+        help="Format of the custom output file, written while the findings are streamed: json (indented), "
+             "ndjson (one finding per line), csv or msgpack (needs the msgpack package). Default: json"
+    )
+
+    parser.add_argument(
+        '--json_backend',
+        dest='json_backend',
+        choices=json_backends.BACKEND_CHOICES,
+        default=json_backends.BACKEND_AUTO,
+        help="JSON decoder of the Gitleaks reports: orjson, simdjson, ujson or the standard json module. "
+             "Default: auto, the fastest one installed"
+    )
+
+    parser.add_argument(
+        '--report_path', '--report-path',
+        dest='report_path',
+        type=str,
+        default=None,
+        help="Where Gitleaks writes its report instead of --output_filename inside the scanned directory. "
+             "'-' or /dev/stdout (or a named FIFO) pipes the report to the controller, which parses it while "
+             "it is written, without any file. Single directory scans only. Default: None"
+    )
+
+    parser.add_argument(
+        '--custom_output_dir',
+        dest='custom_output_dir',
+        type=str,
+        default=None,
+        help="Directory of the custom output file. Default: the scanned directory (the current directory when "
+             "the report is piped)"
+    )
+
+    parser.add_argument(
+        '--baseline',
+        dest='baseline',
+        type=str,
+        default=None,
+        help="Fingerprint index (SQLite) of the previous scans: only the findings that are new or resolved since "
+             "the last recorded scan are output, with their fingerprint and status. Default: None"
+    )
+
+    parser.add_argument(
+        '--update_baseline',
+        dest='update_baseline',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Record this scan in the --baseline index (otherwise the index is left untouched). Default: False"
+    )
+
+    parser.add_argument(
+        '--prefilter',
+        dest='prefilter',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Walk the directory first and only feed Gitleaks the files worth scanning (skips the --exclude "
+             "patterns, files bigger than --max_file_size, binary and empty files). Default: False"
+    )
+
+    parser.add_argument(
+        '--exclude',
+        dest='exclude',
+        action='append',
+        default=None,
+        help=f".gitignore-style pattern left out by --prefilter, can be repeated. "
+             f"Always excluded: {', '.join(DEFAULT_EXCLUDES)}"
+    )
+
+    parser.add_argument(
+        '--exclude_from',
+        dest='exclude_from',
+        type=str,
+        default=None,
+        help="File of .gitignore-style patterns left out by --prefilter. Default: None"
+    )
+
+    parser.add_argument(
+        '--max_file_size',
+        dest='max_file_size',
+        type=file_size,
+        default=None,
+        help="Files bigger than this (bytes, or with a K/M/G suffix) are left out by --prefilter and archive "
+             "scans. Default: no limit"
+    )
+
+    parser.add_argument(
+        '--skip_binary',
+        dest='skip_binary',
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Leave out binary files (a NUL byte in their first 8000 bytes) with --prefilter and archive scans. "
+             "Default: True"
+    )
+
+    parser.add_argument(
+        '--stage_in_tree',
+        dest='stage_in_tree',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="When $TMPDIR is on another filesystem than the scanned tree, stage the files (--prefilter, "
+             "--batch_size, --shards, --cache, --watch) in a hidden directory inside the tree, so they are hard "
+             "linked instead of copied. Writes into the scanned tree. Default: False"
+    )
+
+    parser.add_argument(
+        '--archive_chunk_size',
+        dest='archive_chunk_size',
+        type=file_size,
+        default=archives.ARCHIVE_CHUNK_SIZE,
+        help="When --dir is an archive (.tar, .tar.gz, .tgz, .tar.bz2, .tar.xz, .zip, or a `docker save` image), "
+             "its members are staged and scanned this many bytes at a time (bytes, or with a K/M/G suffix), which "
+             "bounds the scratch disk usage. Default: 64M"
     )
 
     parser.add_argument(
@@ -163,19 +1648,132 @@ def get_parser():
         help="Include the bonus section. Default: True"
     )
 
+    parser.add_argument(
+        '--page_size', '--page-size',
+        dest='page_size',
+        type=positive_int,
+        default=None,
+        help="Only print one page of this many findings (see --page), the custom output still gets all of them. "
+             "Default: print every finding"
+    )
+
+    parser.add_argument(
+        '--page',
+        dest='page',
+        type=positive_int,
+        default=1,
+        help="Page of findings printed with --page_size. Default: 1"
+    )
+
+    parser.add_argument(
+        '--summary',
+        dest='summary',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Print the number of findings per rule, directory, file extension, file and commit, and their "
+             "entropy, counted while the findings stream (combine with --no-show_result to only get the summary). "
+             "Default: False"
+    )
+
+    parser.add_argument(
+        '--top',
+        dest='top',
+        type=positive_int,
+        default=DEFAULT_TOP,
+        help=f"Entries of every --summary section. Default: {DEFAULT_TOP}"
+    )
+
+    parser.add_argument(
+        '--summary_depth',
+        dest='summary_depth',
+        type=positive_int,
+        default=DEFAULT_DEPTH,
+        help=f"Directory levels the --summary groups the findings by. Default: {DEFAULT_DEPTH}"
+    )
+
+    parser.add_argument(
+        '--triage',
+        dest='triage',
+        choices=TRIAGE_ACTIONS,
+        default=None,
+        help="Score every finding (entropy of the secret, placeholder patterns, --triage_allowlist, test files): "
+             "mark adds its triage verdict and score to the custom output, drop only keeps the likely secrets. "
+             "Default: None"
+    )
+
+    parser.add_argument(
+        '--triage_allowlist',
+        dest='triage_allowlist',
+        type=str,
+        default=None,
+        help="File of accepted secrets for --triage, as hex SHA-256 hashes (printf %%s SECRET | sha256sum), one per "
+             "line. Default: None"
+    )
+
+    parser.add_argument(
+        '--triage_min_entropy',
+        dest='triage_min_entropy',
+        type=float,
+        default=DEFAULT_MIN_ENTROPY,
+        help=f"Secrets with less Shannon entropy (bits per character) are low_entropy for --triage. "
+             f"Default: {DEFAULT_MIN_ENTROPY}"
+    )
+
+    parser.add_argument(
+        '--triage_jobs',
+        dest='triage_jobs',
+        type=int,
+        default=None,
+        help="Processes scoring the secrets of large reports with --triage. Default: number of CPU cores"
+    )
+
+    parser.add_argument(
+        '--timeout',
+        dest='timeout',
+        type=float,
+        default=None,
+        help="Wall-clock limit of every Gitleaks subprocess, in seconds. A scan running longer is killed (with "
+             "the processes it started) and the controller exits with 124. Default: no limit"
+    )
+
+    scan_limits.add_limit_arguments(parser)
+
+    add_logging_arguments(parser)
     return parser
 
 
-def show_results(custom_output, bonus):
-    if bonus:  # converting the JSONs into pydantic objects of the bonus flag is on
-        custom_output = [LeakReport(**finding_dict) for finding_dict in custom_output['findings']]
-        print("\nHere are all the pydantic models:")
-    else:
-        custom_output = custom_output['findings']
-        print("\nHere are all the JSON objects:")
+def show_results(custom_output, bonus, validate=False, page_size=None, page=1):
+    """ print the findings as they are streamed out of parse_json_output.
+    with a page size, only that page of findings is printed (and converted), the others are still drained
+    so the custom output and the summary cover all of them """
+    with metrics.stage("show_results"):
+        findings = iter(custom_output['findings'])
+        first = (page - 1) * page_size if page_size else 0
+        skipped = _drain(itertools.islice(findings, first))
+        shown = itertools.islice(findings, page_size) if page_size else findings
+        if bonus:  # converting the JSONs into pydantic objects of the bonus flag is on
+            shown = metrics.timed("bonus_models", iter_leak_reports(shown, validate=validate))
+            print("\nHere are all the pydantic models:")
+        else:
+            print("\nHere are all the JSON objects:")
+
+        count = first
+        for count, finding in enumerate(shown, start=first + 1):
+            print(f"{count}) {finding}")
+
+        if page_size:
+            total = skipped + (count - first) + _drain(findings)
+            pages = max(-(-total // page_size), 1)
+            shown_range = f"{first + 1}-{count}" if count > first else "none"
+            print(f"\nShown findings {shown_range} of {total} (page {page} of {pages}, --page_size {page_size})")
 
-    for i, finding in enumerate(custom_output):
-        print(f"{i + 1}) {finding}")
+
+def _drain(findings):
+    """ exhaust the iterator, returns how many items it had """
+    count = 0
+    for count, _ in enumerate(findings, start=1):
+        pass
+    return count
 
 
 def clean_outputfile(output_filename):
@@ -189,23 +1787,189 @@ def clean_outputfile(output_filename):
 
 
 def main(__args__):
+    recorder = metrics.enable() if __args__.metrics_out else None
+    profiler = None
+    if __args__.profile:
+        import cProfile
+        profiler = cProfile.Profile()
     try:
-        dirname = __args__.dirname
-        output_filename = __args__.output_filename
+        if profiler is not None:
+            profiler.enable()
+        _main(__args__)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(__args__.profile)
+            logger.info(f"Profile saved at {__args__.profile} (inspect it with `python -m pstats`)")
+        if recorder is not None:
+            metrics.disable()
+            recorder.write(__args__.metrics_out)
+            logger.info(f"Metrics saved at {__args__.metrics_out}")
+
+
+def _scan_and_parse(__args__, dirnames, baseline=None, summary=None, triage=None):
+    """ run the scan mode selected by the flags, returns the (lazy) custom output """
+    output_filename = __args__.output_filename
+    if len(dirnames) > 1:
+        return scan_directories(dirnames, output_filename, max(__args__.jobs, 1),
+                                __args__.combined_output, config_path=__args__.config,
+                                output_format=__args__.output_format, baseline=baseline, summary=summary,
+                                batch_size=__args__.batch_size, batch_max_bytes=__args__.batch_max_bytes,
+                                triage=triage)
+    if __args__.report_path and is_report_pipe(__args__.report_path):
+        return stream_json_output(dirnames[0], __args__.report_path, __args__.config,
+                                  output_format=__args__.output_format,
+                                  custom_output_dir=__args__.custom_output_dir, baseline=baseline, summary=summary,
+                                  triage=triage)
 
+    dirname = dirnames[0]
+    if archives.is_archive(dirname):  # the report is written next to the archive
+        report_path = os.path.abspath(__args__.report_path or os.path.join(os.path.dirname(dirname), output_filename))
+        clean_outputfile(report_path)
+        exit_if_failed(run_gitleaks_archive(dirname, report_path, __args__.archive_chunk_size,
+                                            __args__.max_file_size, __args__.skip_binary, __args__.config))
+        return parse_json_output(os.path.dirname(report_path), os.path.basename(report_path),
+                                 output_format=__args__.output_format, custom_output_dir=__args__.custom_output_dir,
+                                 baseline=baseline, summary=summary, triage=triage, root=dirname)
+
+    if __args__.report_path:  # the report is written outside the scanned directory
+        output_filename = os.path.abspath(__args__.report_path)
+    if not __args__.git:  # the git mode merges new findings into the previous (cumulative) report
         clean_outputfile(os.path.join(dirname, output_filename))
 
-        _process_ = run_gitleaks(dirname, output_filename)
+    if __args__.git:
+        _process_ = run_gitleaks_incremental(dirname, output_filename, __args__.state_file, __args__.config)
+    elif __args__.cache:
+        _process_ = run_gitleaks_cached(dirname, output_filename, __args__.cache_path, __args__.config)
+    elif __args__.shards != 1:
+        _process_ = run_gitleaks_sharded(dirname, output_filename, __args__.shards, __args__.config)
+    elif __args__.prefilter:
+        _process_ = run_gitleaks_prefiltered(dirname, output_filename, get_ignore_rules(__args__),
+                                             __args__.max_file_size, __args__.skip_binary, __args__.config)
+    else:
+        _process_ = run_gitleaks(dirname, output_filename, config_path=__args__.config)
+    if __args__.git or __args__.cache or __args__.shards != 1 or __args__.prefilter:
+        exit_if_failed(_process_)  # their report is only (re)written when the scan succeeded
+    exit_if_killed(_process_)
+
+    return parse_json_output(dirname, output_filename,  # will hold the manipulated output
+                             output_format=__args__.output_format,
+                             custom_output_dir=__args__.custom_output_dir, baseline=baseline, summary=summary,
+                             triage=triage)
 
-        custom_output = parse_json_output(dirname,
-                                          output_filename)  # will hold the manipulated output in the different format
-        if __args__.show_result:
-            show_results(custom_output, bonus=__args__.bonus)
+
+def _watch(__args__, dirname):
+    import watch  # loads ctypes, and only returns when interrupted
+
+    report_path = os.path.abspath(__args__.report_path or os.path.join(dirname, __args__.output_filename))
+    log_files = [__args__.log_file, *(f"{__args__.log_file}.{index}" for index in range(1, LOG_BACKUP_COUNT + 1))] \
+        if __args__.log_file else []
+    watch.run_watch(dirname, report_path, rules=get_ignore_rules(__args__), config_path=__args__.config,
+                    output_format=__args__.output_format, custom_output_dir=__args__.custom_output_dir,
+                    show_result=__args__.show_result, bonus=__args__.bonus, validate=__args__.validate,
+                    skip_paths=[*log_files, "error.json", *filter(None, (__args__.metrics_out, __args__.profile))],
+                    backend=__args__.watch_backend, debounce=__args__.watch_debounce, interval=__args__.watch_interval)
+
+
+def _main(__args__):
+    try:
+        dirnames = get_scan_directories(__args__)
+        scan_limits.configure(timeout=__args__.timeout, memory=__args__.max_memory, cpu_time=__args__.max_cpu_time,
+                              nice=__args__.nice, io_class=__args__.ionice)
+        staging.configure(stage_in_tree=__args__.stage_in_tree)
+        try:
+            check_format(__args__.output_format)
+        except MissingFormatDependency as e:
+            log_error_to_file(exit_code=2, error_message=str(e))
+            sys.exit(2)
+        try:
+            json_backends.select(__args__.json_backend)
+        except ImportError as e:
+            log_error_to_file(exit_code=2, error_message=f"The JSON backend {__args__.json_backend} is not "
+                                                         f"installed: {str(e)}")
+            sys.exit(2)
+
+        if len(dirnames) > 1 and (__args__.git or __args__.cache or __args__.shards != 1):
+            log_error_to_file(exit_code=2, error_message="--git, --cache and --shards only apply to a single directory "
+                                                         "scan (not to several --dir or a --manifest).")
+            sys.exit(2)
+        if __args__.report_path and (len(dirnames) > 1 or __args__.git or __args__.cache or __args__.shards != 1
+                                     or __args__.prefilter):
+            log_error_to_file(exit_code=2, error_message="--report_path only applies to a single directory scan "
+                                                         "(without --git, --cache, --shards or --prefilter).")
+            sys.exit(2)
+        if __args__.prefilter and (len(dirnames) > 1 or __args__.git or __args__.cache or __args__.shards != 1):
+            log_error_to_file(exit_code=2, error_message="--prefilter only applies to a single directory scan "
+                                                         "(without --git, --cache or --shards).")
+            sys.exit(2)
+        if any(archives.is_archive(dirname) for dirname in dirnames) and (
+                len(dirnames) > 1 or __args__.git or __args__.cache or __args__.shards != 1 or __args__.prefilter
+                or (__args__.report_path and is_report_pipe(__args__.report_path))):
+            log_error_to_file(exit_code=2, error_message="An archive is scanned on its own (a single --dir, without "
+                                                         "--git, --cache, --shards, --prefilter or a piped report).")
+            sys.exit(2)
+        if __args__.watch and (len(dirnames) > 1 or __args__.git or __args__.cache or __args__.shards != 1
+                               or __args__.prefilter or __args__.baseline or __args__.summary or __args__.triage
+                               or archives.is_archive(dirnames[0])
+                               or (__args__.report_path and is_report_pipe(__args__.report_path))):
+            log_error_to_file(exit_code=2, error_message="--watch only applies to a single directory (without --git, "
+                                                         "--cache, --shards, --prefilter, --baseline, --summary, "
+                                                         "--triage or a piped report).")
+            sys.exit(2)
+        if __args__.watch:
+            _watch(__args__, dirnames[0])
+            return
+
+        baseline = None
+        if __args__.baseline:
+            import sqlite3
+
+            try:
+                baseline = Baseline(__args__.baseline, update=__args__.update_baseline)
+            except sqlite3.Error as e:
+                log_error_to_file(exit_code=2, error_message=f"Failed to open the baseline {__args__.baseline}: {str(e)}")
+                sys.exit(2)
+        summary = Summary(depth=__args__.summary_depth) if __args__.summary else None
+        triage = get_triage(__args__)
+        try:
+            custom_output = _scan_and_parse(__args__, dirnames, baseline, summary, triage)
+            if __args__.show_result:
+                show_results(custom_output, bonus=__args__.bonus, validate=__args__.validate,
+                             page_size=__args__.page_size, page=__args__.page)
+            else:
+                consume_findings(custom_output)
+            if summary is not None:
+                print(f"\n{summary.render(__args__.top)}")
+            if triage is not None:
+                logger.info(triage.render())
+        finally:
+            if triage is not None:
+                triage.close()
+            if baseline is not None:
+                logger.info(f"Baseline {__args__.baseline}: {baseline.new} new and {baseline.resolved} resolved findings"
+                            + (" (baseline updated)" if __args__.update_baseline else ""))
+                baseline.close()
     except Exception as e:
         log_error_to_file(exit_code=2, error_message=str(e))
         sys.exit(2)
 
 
 if __name__ == '__main__':
-    args = get_parser().parse_args()
-    main(args)
+    if sys.argv[1:2] == ['serve']:  # long-running daemon mode
+        import server
+
+        args = server.get_parser().parse_args(sys.argv[2:])
+        entry_point = server.main
+    elif sys.argv[1:2] in (['coordinate'], ['worker']):  # distributed scans over a shared work queue
+        import work_queue
+
+        args = work_queue.get_parser(sys.argv[1]).parse_args(sys.argv[2:])
+        entry_point = work_queue.main
+    else:
+        args = get_parser().parse_args()
+        entry_point = main
+    logging_pipeline = configure_logging(args.log_level, args.log_file, max_bytes=args.log_max_bytes)
+    try:
+        entry_point(args)
+    finally:
+        logging_pipeline.stop()
@@ -0,0 +1,167 @@
+import array
+import operator
+import sys
+
+from output_formats import open_output
+
+# unsigned 32 bit columns: line numbers and ids in the string table
+COLUMN_TYPECODE = 'I'
+
+
+class Finding:
+    """ one finding of a FindingsStore: the fields of the custom output, with the line range as two ints """
+    __slots__ = ('filename', 'start_line', 'end_line', 'description')
+
+    def __init__(self, filename, start_line, end_line, description):
+        self.filename = filename
+        self.start_line = start_line
+        self.end_line = end_line
+        self.description = description
+
+    @property
+    def line_range(self):
+        return f"{self.start_line}-{self.end_line}"
+
+    def to_dict(self):
+        """ the finding in the custom output format """
+        return {"filename": self.filename, "line_range": self.line_range, "description": self.description}
+
+    def __eq__(self, other):
+        if not isinstance(other, Finding):
+            return NotImplemented
+        return (self.filename, self.start_line, self.end_line, self.description) == (
+            other.filename, other.start_line, other.end_line, other.description)
+
+    def __repr__(self):
+        return (f"Finding(filename={self.filename!r}, line_range={self.line_range!r}, "
+                f"description={self.description!r})")
+
+
+def parse_line_range(line_range):
+    """ "12-14" -> (12, 14) """
+    start_line, _, end_line = line_range.partition('-')
+    return int(start_line), int(end_line or start_line)
+
+
+class FindingsStore:
+    """ compact in-memory container of custom findings, for the places that hold all of them at once (the scan
+    daemon, library callers). the findings are stored as columns (struct of arrays): the line ranges as two arrays
+    of ints, the filenames and descriptions as ids in a table of interned strings, as they repeat a lot. that is
+    16 bytes per finding plus every distinct string once, instead of a dict and three strings per finding.
+    iterating yields Finding records built on the fly, iter_dicts() yields the custom output format """
+    __slots__ = ('_strings', '_string_ids', '_filenames', '_start_lines', '_end_lines', '_descriptions')
+
+    def __init__(self, findings=(), _strings=None, _string_ids=None):
+        # the string table is append-only, so the stores returned by filter() share it
+        self._strings = [] if _strings is None else _strings
+        self._string_ids = {} if _string_ids is None else _string_ids
+        self._filenames = array.array(COLUMN_TYPECODE)
+        self._start_lines = array.array(COLUMN_TYPECODE)
+        self._end_lines = array.array(COLUMN_TYPECODE)
+        self._descriptions = array.array(COLUMN_TYPECODE)
+        self.extend(findings)
+
+    @classmethod
+    def from_report(cls, findings):
+        """ build the store straight from raw Gitleaks findings, without the custom dicts in between """
+        store = cls()
+        get_fields = operator.itemgetter('File', 'StartLine', 'EndLine', 'Description')
+        for finding in findings:
+            store.add(*get_fields(finding))
+        return store
+
+    def _intern(self, string):
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = self._string_ids[string] = len(self._strings)
+            self._strings.append(string)
+        return string_id
+
+    def add(self, filename, start_line, end_line, description):
+        self._filenames.append(self._intern(filename))
+        self._start_lines.append(start_line)
+        self._end_lines.append(end_line)
+        self._descriptions.append(self._intern(description))
+
+    def extend(self, findings):
+        """ add custom findings (dicts with filename, line_range and description) or Finding records.
+        other keys of the dicts (e.g. the baseline fingerprint) are not kept """
+        for finding in findings:
+            if isinstance(finding, Finding):
+                self.add(finding.filename, finding.start_line, finding.end_line, finding.description)
+            else:
+                self.add(finding["filename"], *parse_line_range(finding["line_range"]), finding["description"])
+
+    def __len__(self):
+        return len(self._filenames)
+
+    def __bool__(self):
+        return len(self._filenames) > 0
+
+    def __getitem__(self, index):
+        strings = self._strings
+        return Finding(strings[self._filenames[index]], self._start_lines[index], self._end_lines[index],
+                       strings[self._descriptions[index]])
+
+    def __iter__(self):
+        strings = self._strings
+        for filename, start_line, end_line, description in zip(self._filenames, self._start_lines,
+                                                                 self._end_lines, self._descriptions):
+            yield Finding(strings[filename], start_line, end_line, strings[description])
+
+    def iter_dicts(self):
+        """ the findings in the custom output format, e.g. for output_formats or show_results """
+        strings = self._strings
+        for filename, start_line, end_line, description in zip(self._filenames, self._start_lines,
+                                                                 self._end_lines, self._descriptions):
+            yield {"filename": strings[filename], "line_range": f"{start_line}-{end_line}",
+                   "description": strings[description]}
+
+    def to_list(self):
+        return list(self.iter_dicts())
+
+    def filenames(self):
+        """ the distinct filenames, in the order they were first seen """
+        return [self._strings[string_id] for string_id in dict.fromkeys(self._filenames)]
+
+    def filter(self, filename=None, directory=None, description=None, predicate=None):
+        """ a new store with the findings matching every given criterion: an exact filename, the files under a
+        directory, an exact description, or a predicate called with each Finding record """
+        columns = (self._filenames, self._start_lines, self._end_lines, self._descriptions)
+        selected = range(len(self))
+        if filename is not None:
+            selected = self._select(self._filenames, {self._string_ids.get(filename)}, selected)
+        if directory is not None:
+            prefix = directory.rstrip('/') + '/'
+            selected = self._select(self._filenames, {string_id for string_id in set(self._filenames)
+                                                      if self._strings[string_id].startswith(prefix)}, selected)
+        if description is not None:
+            selected = self._select(self._descriptions, {self._string_ids.get(description)}, selected)
+        if predicate is not None:
+            selected = [index for index in selected if predicate(self[index])]
+
+        store = FindingsStore(_strings=self._strings, _string_ids=self._string_ids)
+        for column, filtered in zip(columns, (store._filenames, store._start_lines, store._end_lines,
+                                              store._descriptions)):
+            filtered.extend(column[index] for index in selected)
+        return store
+
+    @staticmethod
+    def _select(column, string_ids, selected):
+        return [index for index in selected if column[index] in string_ids]
+
+    def write(self, path, output_format="json"):
+        """ export the findings to a custom output file in any of the --format formats, returns their count """
+        writer, f = open_output(path, output_format)
+        count = 0
+        with f:
+            for count, _ in enumerate(writer(self.iter_dicts(), f), start=1):
+                pass
+        return count
+
+    def nbytes(self):
+        """ approximate memory held by the store: the columns and the string table (not shared objects) """
+        columns = sum(column.buffer_info()[1] * column.itemsize for column in (
+            self._filenames, self._start_lines, self._end_lines, self._descriptions))
+        strings = sum(sys.getsizeof(string) for string in self._strings)
+        return columns + strings + sys.getsizeof(self._strings) + sys.getsizeof(self._string_ids)
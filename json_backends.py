@@ -0,0 +1,87 @@
+import importlib.util
+import json
+import threading
+
+BACKEND_AUTO = "auto"
+BACKEND_PREFERENCE = ("orjson", "simdjson", "ujson", "json")  # fastest first, json is always available
+
+
+class JsonBackend:
+    """ a JSON decoder able to parse a whole in-memory report (a bytes-like buffer, e.g. a mmap) at once.
+    `errors` are the exceptions the decoder raises on invalid JSON. only orjson parses the mapped buffer in place:
+    json and ujson need the report as one str (decoded straight from the buffer), simdjson a padded copy.
+    every backend can be called from several threads at once (reports of shards and batches) """
+
+    def __init__(self, name, loads, errors):
+        self.name = name
+        self.loads = loads
+        self.errors = errors
+
+
+def _load_orjson():
+    import orjson
+    return JsonBackend("orjson", lambda buffer: orjson.loads(memoryview(buffer)), (orjson.JSONDecodeError,))
+
+
+def _load_simdjson():
+    import simdjson
+    parsers = threading.local()  # a simdjson Parser is not thread-safe, and reuses its buffers between calls
+
+    def loads(buffer):
+        parser = getattr(parsers, 'parser', None)
+        if parser is None:
+            parser = parsers.parser = simdjson.Parser()
+        return parser.parse(bytes(buffer), recursive=True)
+
+    return JsonBackend("simdjson", loads, (ValueError,))
+
+
+def _decode(buffer):
+    """ the report as a str, decoded from the buffer without an intermediate bytes copy """
+    return str(memoryview(buffer), 'utf-8')
+
+
+def _load_ujson():
+    import ujson
+    return JsonBackend("ujson", lambda buffer: ujson.loads(_decode(buffer)), (ValueError,))
+
+
+def _load_json():
+    return JsonBackend("json", lambda buffer: json.loads(_decode(buffer)), (json.JSONDecodeError, UnicodeDecodeError))
+
+
+LOADERS = {
+    "orjson": _load_orjson,
+    "simdjson": _load_simdjson,
+    "ujson": _load_ujson,
+    "json": _load_json,
+}
+BACKEND_CHOICES = (BACKEND_AUTO, *LOADERS)
+
+
+def load_backend(name):
+    """ the backend of the given name, raises ImportError when its package is not installed """
+    return LOADERS[name]()
+
+
+def available_backends():
+    """ names of the installed backends, fastest first """
+    return [name for name in BACKEND_PREFERENCE if name == "json" or importlib.util.find_spec(name) is not None]
+
+
+_current = None
+
+
+def select(name=BACKEND_AUTO):
+    """ pick the backend used to decode the reports, 'auto' takes the fastest one installed """
+    global _current
+    if name == BACKEND_AUTO:
+        name = available_backends()[0]
+    _current = load_backend(name)
+    return _current
+
+
+def get_backend():
+    if _current is None:
+        return select()
+    return _current
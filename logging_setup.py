@@ -0,0 +1,96 @@
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FILE = "runtime_logs.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+LOG_QUEUE_SIZE = 10000  # records waiting for the handlers, the next ones are dropped
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler that never blocks the caller: when the queue is full the record is dropped and counted """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    """ the asynchronous logging of a CLI run: the callers only enqueue records, a QueueListener thread
+    formats them and does the (slow) console and disk I/O """
+
+    def __init__(self, queue_handler, listener):
+        self.queue_handler = queue_handler
+        self.listener = listener
+
+    def stop(self):
+        """ flush the pending records and detach the pipeline from the root logger """
+        self.listener.stop()
+        root = logging.getLogger()
+        root.removeHandler(self.queue_handler)
+        for handler in self.listener.handlers:
+            handler.close()
+        if self.queue_handler.dropped:
+            print(f"Logging queue was full, {self.queue_handler.dropped} log records were dropped", file=sys.stderr)
+
+
+def configure_logging(level="INFO", log_file=LOG_FILE, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT,
+                      queue_size=LOG_QUEUE_SIZE):
+    """ set up the logging of a CLI run (never done at import time, so library users keep their own config).
+    records go through a bounded queue to a listener thread writing to stdout and to a rotating log file.
+    every run starts a fresh log file, the previous runs are kept as numbered backups """
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+        if os.path.getsize(log_file) > 0:
+            file_handler.doRollover()
+        handlers.append(file_handler)
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    listener.start()
+    return LoggingPipeline(queue_handler, listener)
+
+
+def add_logging_arguments(parser):
+    """ the logging flags shared by every entry point """
+    parser.add_argument(
+        '--log_level', '--log-level',
+        dest='log_level',
+        type=str.upper,
+        choices=LOG_LEVELS,
+        default="INFO",
+        help="Logging level (DEBUG logs the Gitleaks output line by line). Default: INFO"
+    )
+    parser.add_argument(
+        '--log_file',
+        dest='log_file',
+        type=str,
+        default=LOG_FILE,
+        help=f"Rotating log file, an empty value disables it. Default: {LOG_FILE}"
+    )
+    parser.add_argument(
+        '--log_max_bytes',
+        dest='log_max_bytes',
+        type=int,
+        default=LOG_MAX_BYTES,
+        help=f"Size at which the log file is rotated. Default: {LOG_MAX_BYTES}"
+    )
+    return parser
@@ -0,0 +1,166 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+METRIC_FIELDS = {
+    "wall_seconds": "Wall-clock time spent in the stage (its own time, without the upstream stages it pulls from)",
+    "cpu_seconds": "CPU time of the controller process spent in the stage (only accurate when the stages run one "
+                   "at a time)",
+    "child_cpu_seconds": "CPU time of the subprocesses (Gitleaks) that finished during the stage (only accurate "
+                         "when the stages run one at a time)",
+    "bytes_read": "Bytes read by the stage",
+    "bytes_written": "Bytes written by the stage",
+    "findings": "Findings that went through the stage",
+    "calls": "Number of times the stage was entered",
+}
+
+
+def _children_cpu():
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class Metrics:
+    """ per-stage instrumentation of a controller run.
+    the pipeline is streamed, so the stages run interleaved (reading the report, converting, writing and printing
+    all happen in one pass). every timed section keeps track of the time spent in the sections it calls, so each
+    stage only reports its own time. the bookkeeping is per thread, parallel scans are summed (under a lock).
+    the cpu times are process-wide (process_time, and the totals of the finished children from os.times), so
+    stages running at the same time on several threads (--jobs, --shards) each count the CPU time of the others:
+    cpu_seconds and child_cpu_seconds are only accurate for sequential stages """
+
+    def __init__(self):
+        self.stages = {}
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _record(self, name):
+        with self._lock:
+            return self.stages.setdefault(name, dict.fromkeys(METRIC_FIELDS, 0))
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _enter(self):
+        stack = self._stack()
+        stack.append([0.0, 0.0])  # wall and cpu time of the nested sections
+        return time.perf_counter(), time.process_time(), _children_cpu()
+
+    def _leave(self, record, start):
+        wall, cpu, children_cpu = time.perf_counter() - start[0], time.process_time() - start[1], \
+            _children_cpu() - start[2]
+        stack = self._stack()
+        nested_wall, nested_cpu = stack.pop()
+        if stack:
+            stack[-1][0] += wall
+            stack[-1][1] += cpu
+        with self._lock:
+            record["wall_seconds"] += wall - nested_wall
+            record["cpu_seconds"] += cpu - nested_cpu
+            record["child_cpu_seconds"] += children_cpu
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = self._record(name)
+        self.add(name, calls=1)
+        start = self._enter()
+        try:
+            yield record
+        finally:
+            self._leave(record, start)
+
+    def timed(self, name, iterable):
+        """ wrap a (lazy) stream, the time spent producing every item is accounted to the stage """
+        record = self._record(name)
+        self.add(name, calls=1)
+        iterator = iter(iterable)
+        findings = 0
+        try:
+            while True:
+                start = self._enter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self._leave(record, start)
+                findings += 1
+                yield item
+        finally:  # counted once, also when the consumer stops early
+            self.add(name, findings=findings)
+
+    def add(self, name, **counters):
+        record = self._record(name)
+        with self._lock:
+            for counter, value in counters.items():
+                record[counter] += value
+
+    def to_dict(self):
+        return {
+            "total_wall_seconds": time.perf_counter() - self.started_at,
+            "stages": self.stages,
+        }
+
+    def to_prometheus(self):
+        lines = ["# HELP gitleaks_controller_total_wall_seconds Wall-clock time of the whole run",
+                 "# TYPE gitleaks_controller_total_wall_seconds gauge",
+                 f"gitleaks_controller_total_wall_seconds {time.perf_counter() - self.started_at}"]
+        for field, description in METRIC_FIELDS.items():
+            metric = f"gitleaks_controller_stage_{field}"
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f'{metric}{{stage="{name}"}} {record[field]}' for name, record in self.stages.items())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, metrics_path):
+        """ Prometheus text format for .prom/.txt files, a JSON blob otherwise """
+        with open(metrics_path, 'w') as metrics_file:
+            if metrics_path.endswith(('.prom', '.txt')):
+                metrics_file.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), metrics_file, indent=4)
+
+
+class NullMetrics:
+    """ the disabled instrumentation: no bookkeeping at all on the hot paths """
+
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+    def timed(self, name, iterable):
+        return iterable
+
+    def add(self, name, **counters):
+        pass
+
+
+_current = NullMetrics()
+
+
+def enable():
+    """ start recording the metrics of this run """
+    global _current
+    _current = Metrics()
+    return _current
+
+
+def disable():
+    global _current
+    _current = NullMetrics()
+
+
+def stage(name):
+    return _current.stage(name)
+
+
+def timed(name, iterable):
+    return _current.timed(name, iterable)
+
+
+def add(name, **counters):
+    _current.add(name, **counters)
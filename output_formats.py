@@ -0,0 +1,93 @@
+import itertools
+import json
+import os
+import textwrap
+
+OUTPUT_FORMATS = ("json", "ndjson", "csv", "msgpack")
+FORMAT_EXTENSIONS = {"json": ".json", "ndjson": ".ndjson", "csv": ".csv", "msgpack": ".msgpack"}
+CSV_FIELDS = ("filename", "line_range", "description")
+
+
+class MissingFormatDependency(Exception):
+    """ the output format needs a package that is not installed """
+
+
+def with_format_extension(path, output_format):
+    """ swap the .json extension of a default output path for the one of the selected format """
+    root, extension = os.path.splitext(path)
+    if extension == '.json':
+        return root + FORMAT_EXTENSIONS[output_format]
+    return path
+
+
+def check_format(output_format):
+    """ fail before scanning when the selected format cannot be written """
+    if output_format == 'msgpack':
+        _import_msgpack()
+
+
+def _import_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise MissingFormatDependency("The msgpack output format needs the msgpack package (pip install msgpack).")
+    return msgpack
+
+
+def write_json(findings, f):
+    """ same layout as json.dump({'findings': [...]}, f, indent=4) """
+    f.write('{\n    "findings": [')
+    separator = '\n'
+    for finding in findings:
+        f.write(separator)
+        f.write(textwrap.indent(json.dumps(finding, indent=4), ' ' * 8))
+        separator = ',\n'
+        yield finding
+    f.write('\n    ]\n}' if separator != '\n' else ']\n}')
+
+
+def write_ndjson(findings, f):
+    """ one compact JSON object per line, the file can be tailed while it is written """
+    for finding in findings:
+        f.write(json.dumps(finding, separators=(',', ':')))
+        f.write('\n')
+        yield finding
+
+
+def write_csv(findings, f):
+    """ the CSV_FIELDS columns, then the ones the enabled stages add (e.g. the baseline fingerprint and status),
+    taken from the first finding: every finding of a run has the same keys """
+    import csv
+
+    findings = iter(findings)
+    first = next(findings, None)
+    fieldnames = [*CSV_FIELDS, *(key for key in first or () if key not in CSV_FIELDS)]
+    writer = csv.DictWriter(f, fieldnames=fieldnames, restval='', extrasaction='ignore')
+    writer.writeheader()
+    if first is None:
+        return
+    for finding in itertools.chain((first,), findings):
+        writer.writerow(finding)
+        yield finding
+
+
+def write_msgpack(findings, f):
+    """ a stream of msgpack maps, one per finding (read it back with msgpack.Unpacker) """
+    packer = _import_msgpack().Packer()
+    for finding in findings:
+        f.write(packer.pack(finding))
+        yield finding
+
+
+WRITERS = {
+    "json": (write_json, 'w'),
+    "ndjson": (write_ndjson, 'w'),
+    "csv": (write_csv, 'w'),
+    "msgpack": (write_msgpack, 'wb'),
+}
+
+
+def open_output(path, output_format):
+    """ returns the writer of the format and the file opened in the mode it needs """
+    writer, mode = WRITERS[output_format]
+    return writer, open(path, mode, newline='' if output_format == 'csv' else None)
@@ -0,0 +1,160 @@
+import concurrent.futures
+import os
+import re
+
+DEFAULT_EXCLUDES = ("node_modules/",)
+SNIFF_SIZE = 8000  # same heuristic as git: a NUL byte in the first 8000 bytes means binary
+SKIP_REASONS = ("ignored", "too_large", "binary", "empty")
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def _translate(pattern):
+    """ regex of a .gitignore glob (matched against a slash separated relative path) """
+    regex, i = '', 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex, i = regex + '(?:.*/)?', i + 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex, i = regex + '/.*', i + 3
+        elif pattern[i] == '*':
+            regex, i = regex + '[^/]*', i + 1
+        elif pattern[i] == '?':
+            regex, i = regex + '[^/]', i + 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            regex, i = regex + '[' + pattern[i + 1:end].replace('!', '^', 1).replace('\\', '\\\\') + ']', end + 1
+        else:
+            regex, i = regex + re.escape(pattern[i]), i + 1
+    return re.compile(regex + r'\Z')
+
+
+class IgnoreRules:
+    """ .gitignore-style exclusion patterns: `*`, `?`, `**`, `[...]`, a leading or inner `/` anchors the pattern
+    to the scanned root, a trailing `/` only matches directories, `!` re-includes. the last match wins """
+
+    def __init__(self, patterns):
+        self.rules = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            negated = pattern.startswith('!')
+            pattern = pattern[1:] if negated else pattern
+            dir_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            anchored = '/' in pattern
+            self.rules.append((_translate(pattern.lstrip('/')), negated, dir_only, anchored))
+
+    @classmethod
+    def from_file(cls, ignore_path, extra_patterns=()):
+        with open(ignore_path, 'r') as ignore_file:
+            return cls([*ignore_file, *extra_patterns])
+
+    def ignored(self, relative_path, is_dir=False):
+        name = relative_path.rsplit('/', 1)[-1]
+        ignored = False
+        for regex, negated, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path if anchored else name):
+                ignored = not negated
+        return ignored
+
+
+class PrefilterResult:
+    """ the files kept for the scan, and what was skipped (files and bytes per reason, pruned directories) """
+
+    def __init__(self):
+        self.files = []
+        self.kept_bytes = 0
+        self.skipped = {reason: [0, 0] for reason in SKIP_REASONS}
+        self.pruned_dirs = 0
+
+    @property
+    def skipped_files(self):
+        return sum(files for files, _ in self.skipped.values())
+
+    @property
+    def skipped_bytes(self):
+        return sum(size for _, size in self.skipped.values())
+
+    def summary(self):
+        details = ', '.join(f"{reason.replace('_', ' ')} {files} ({size} bytes)"
+                            for reason, (files, size) in self.skipped.items() if files)
+        return (f"kept {len(self.files)} files ({self.kept_bytes} bytes), skipped {self.skipped_files} files "
+                f"({self.skipped_bytes} bytes){': ' + details if details else ''}, "
+                f"{self.pruned_dirs} directories pruned")
+
+
+def is_binary(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return b'\0' in f.read(SNIFF_SIZE)
+    except OSError:
+        return False  # let Gitleaks report the unreadable file
+
+
+def _scan_directory(path, relative_dir, rules, max_file_size, skip_binary, skip_paths):
+    """ one step of the parallel walk: returns (kept files, skipped files, subdirectories, pruned directories) """
+    kept, skipped, subdirs, pruned = [], [], [], 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.path in skip_paths:
+                continue
+            relative_path = f"{relative_dir}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                if rules.ignored(relative_path, is_dir=True):
+                    pruned += 1
+                else:
+                    subdirs.append((entry.path, f"{relative_path}/"))
+                continue
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+            if rules.ignored(relative_path):
+                skipped.append(("ignored", size))
+            elif size == 0:
+                skipped.append(("empty", size))
+            elif max_file_size is not None and size > max_file_size:
+                skipped.append(("too_large", size))
+            elif skip_binary and is_binary(entry.path):
+                skipped.append(("binary", size))
+            else:
+                kept.append((entry.path, size))
+    return kept, skipped, subdirs, pruned
+
+
+def prefilter_tree(directory, rules=None, max_file_size=None, skip_binary=True, jobs=None, skip_paths=()):
+    """ walk `directory` on a pool of threads (one os.scandir per directory) and return the files worth
+    scanning. ignored directories are pruned without being walked """
+    rules = rules if rules is not None else IgnoreRules(DEFAULT_EXCLUDES)
+    skip_paths = {os.path.abspath(path) for path in skip_paths}
+    directory = os.path.abspath(directory)
+    result = PrefilterResult()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        def submit(path, relative_dir):
+            return executor.submit(_scan_directory, path, relative_dir, rules, max_file_size, skip_binary, skip_paths)
+
+        pending = {submit(directory, '')}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                kept, skipped, subdirs, pruned = future.result()
+                for file_path, size in kept:
+                    result.files.append(file_path)
+                    result.kept_bytes += size
+                for reason, size in skipped:
+                    result.skipped[reason][0] += 1
+                    result.skipped[reason][1] += size
+                result.pruned_dirs += pruned
+                pending.update(submit(path, relative_dir) for path, relative_dir in subdirs)
+    result.files.sort()
+    return result
+
+
+def file_size(value):
+    """ argparse type of the size flags: a number of bytes, optionally followed by K, M or G """
+    match = re.fullmatch(r'(\d+)\s*([KMG]?)i?B?', value.strip(), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"invalid size: {value!r}")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
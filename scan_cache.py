@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+
+CACHE_FILENAME = ".gitleaks_cache.sqlite"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path):
+    """ content hash of a file, read in chunks so big files are never fully loaded """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_config(config_path):
+    """ hash of the Gitleaks config file (None when the default config is used) """
+    return hash_file(config_path) if config_path else None
+
+
+class ScanCache:
+    """ persistent cache mapping every scanned file (relative path, size, mtime and content hash) to the
+    findings Gitleaks reported for it on the last scan. the whole cache is dropped when the scanner
+    (Gitleaks version or config) changes, since old findings may not match what the new rules would report """
+
+    def __init__(self, cache_path, scanner_key):
+        import sqlite3  # only imported with --cache, see tests/test_startup.py
+
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                findings TEXT NOT NULL
+            );
+        ''')
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'scanner'").fetchone()
+        if row is None or row[0] != scanner_key:
+            self.invalidate(scanner_key)
+
+    def invalidate(self, scanner_key):
+        with self.connection:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scanner', ?)", (scanner_key,))
+
+    def lookup(self, relative_path, file_path, size, mtime_ns):
+        """ returns (findings, digest): the cached findings of an unchanged file (None when it changed) and
+        its content hash. the file is only hashed when its size or mtime differ from the cached entry """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, digest, findings FROM files WHERE path = ?", (relative_path,)
+        ).fetchone()
+        if row is not None and row[0] == size and row[1] == mtime_ns:
+            self.hits += 1
+            return json.loads(row[3]), row[2]
+
+        digest = hash_file(file_path)
+        if row is not None and row[2] == digest:  # touched but not modified
+            self.hits += 1
+            with self.connection:
+                self.connection.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                                        (size, mtime_ns, relative_path))
+            return json.loads(row[3]), digest
+
+        self.misses += 1
+        return None, digest
+
+    def store(self, entries):
+        """ save the fresh scan result of changed files, entries are (relative path, size, mtime, digest, findings) """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, digest, findings) VALUES (?, ?, ?, ?, ?)",
+                ((path, size, mtime_ns, digest, json.dumps(findings))
+                 for path, size, mtime_ns, digest, findings in entries)
+            )
+
+    def prune(self, seen_paths):
+        """ forget the files that were deleted since the last scan """
+        stale = [(path,) for (path,) in self.connection.execute("SELECT path FROM files") if path not in seen_paths]
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", stale)
+        return len(stale)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        self.connection.close()
+
+
+def iter_files(directory, skip_paths=()):
+    """ yields (path, stat result) for every regular file below directory, skipping the given paths """
+    skip_paths = {os.path.abspath(path) for path in skip_paths}
+    pending = [directory]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if os.path.abspath(entry.path) in skip_paths:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.stat(follow_symlinks=False)
@@ -0,0 +1,137 @@
+import logging
+import resource
+import shutil
+import signal
+
+from prefilter import file_size
+
+TIMEOUT_EXIT_CODE = 124  # same convention as coreutils `timeout`
+SIGNAL_EXIT_CODE_BASE = 128  # a scan killed by signal N exits with 128 + N, like in a shell
+KILLED_EXIT_CODES = range(SIGNAL_EXIT_CODE_BASE + 1, SIGNAL_EXIT_CODE_BASE + signal.NSIG)
+IO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}  # the `ionice -c` classes
+
+logger = logging.getLogger(__name__)
+
+
+class ScanLimits:
+    """ the limits applied to every Gitleaks subprocess: a wall-clock timeout, memory (address space) and CPU time
+    rlimits, a nice increment and an I/O scheduling class. nothing runs between fork and exec (a Python hook there
+    is unsafe with threads): the priorities are set by running Gitleaks through `nice` and `ionice`, so that every
+    thread it starts inherits them, and the rlimits are set on the child right after it was spawned (prlimit).
+    none of them ever affects the controller itself """
+
+    def __init__(self, timeout=None, memory=None, cpu_time=None, nice=None, io_class=None):
+        self.timeout = timeout
+        self.memory = memory
+        self.cpu_time = cpu_time
+        self.nice = nice
+        self.io_class = io_class
+        self._prefix = []
+        if nice is not None:
+            self._prefix += _tool_prefix('nice', '-n', str(nice))
+        if io_class is not None:
+            self._prefix += _tool_prefix('ionice', '-c', str(IO_CLASSES[io_class]))
+
+    def wrap(self, command):
+        """ the command actually run for a Gitleaks command (a list): prefixed with nice/ionice when needed """
+        return [*self._prefix, *command]
+
+    def apply(self, pid):
+        """ set the rlimits of the child `pid`, just spawned. they are kept across the exec of nice and ionice """
+        try:
+            if self.memory is not None:
+                resource.prlimit(pid, resource.RLIMIT_AS, (self.memory, self.memory))
+            if self.cpu_time is not None:
+                resource.prlimit(pid, resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time + 1))
+        except ProcessLookupError:
+            pass  # already gone, its return code tells why
+
+
+def _tool_prefix(tool, *arguments):
+    path = shutil.which(tool)
+    if path is None:
+        logger.warning(f"{tool} is not installed, the Gitleaks subprocesses run without it")
+        return []
+    return [path, *arguments]
+
+
+def exit_code(returncode, timed_out=False, stderr='', limits=None):
+    """ the exit code reported for a finished scan: 124 when it timed out, 128 + N when it was killed by signal N.
+    a Go program hitting the memory rlimit aborts by itself ("out of memory"), that is reported as a SIGKILL (137) """
+    if timed_out:
+        return TIMEOUT_EXIT_CODE
+    if returncode < 0:
+        return SIGNAL_EXIT_CODE_BASE - returncode
+    if returncode not in (0, 1) and limits is not None and limits.memory is not None \
+            and 'out of memory' in stderr.lower():
+        return SIGNAL_EXIT_CODE_BASE + signal.SIGKILL
+    return returncode
+
+
+def is_killed(returncode):
+    return returncode == TIMEOUT_EXIT_CODE or returncode in KILLED_EXIT_CODES
+
+
+def describe_kill(returncode, limits):
+    """ the error message of a killed scan """
+    if returncode == TIMEOUT_EXIT_CODE:
+        return f"Gitleaks timed out after {limits.timeout} seconds and was killed"
+    signal_number = returncode - SIGNAL_EXIT_CODE_BASE
+    try:
+        name = signal.Signals(signal_number).name
+    except ValueError:
+        name = f"signal {signal_number}"
+    reason = {signal.SIGXCPU: " (CPU time limit reached)", signal.SIGKILL: " (out of memory?)"}.get(signal_number, "")
+    return f"Gitleaks was killed by {name}{reason}"
+
+
+def add_limit_arguments(parser):
+    """ the resource limit flags shared by the CLI and the scan daemon (their timeouts differ) """
+    parser.add_argument(
+        '--max_memory',
+        dest='max_memory',
+        type=file_size,
+        default=None,
+        help="Address space limit of every Gitleaks subprocess (bytes, or with a K/M/G suffix). A scan running "
+             "out of memory exits with 137. Default: no limit"
+    )
+
+    parser.add_argument(
+        '--max_cpu_time',
+        dest='max_cpu_time',
+        type=int,
+        default=None,
+        help="CPU time limit of every Gitleaks subprocess, in seconds. A scan reaching it exits with 152 "
+             "(SIGXCPU). Default: no limit"
+    )
+
+    parser.add_argument(
+        '--nice',
+        dest='nice',
+        type=int,
+        default=None,
+        help="Niceness increment of the Gitleaks subprocesses (e.g. 10 to leave the CPU to interactive work). "
+             "Default: None"
+    )
+
+    parser.add_argument(
+        '--ionice',
+        dest='ionice',
+        choices=IO_CLASSES,
+        default=None,
+        help="I/O scheduling class of the Gitleaks subprocesses (Linux only). Default: None"
+    )
+
+
+_current = ScanLimits()
+
+
+def configure(**limits):
+    """ set the limits of the Gitleaks subprocesses started from now on """
+    global _current
+    _current = ScanLimits(**limits)
+    return _current
+
+
+def get_limits():
+    return _current
@@ -0,0 +1,234 @@
+import asyncio
+import collections
+import http.server
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+import uuid
+
+import controller
+import scan_limits
+from bonus import log_error_to_file
+from logging_setup import add_logging_arguments
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_SIZE = 1024 * 1024
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED = "queued", "running", "done", "failed"
+
+
+class ScanJob:
+    """ one scan request handled by the daemon """
+
+    def __init__(self, directory, config_path=None, timeout=None):
+        self.id = uuid.uuid4().hex
+        self.directory = directory
+        self.config_path = config_path
+        self.timeout = timeout
+        self.status = JOB_QUEUED
+        self.findings = None
+        self.error = None
+        self.exit_code = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "dir": self.directory,
+            "status": self.status,
+            "findings_count": len(self.findings) if self.findings is not None else None,
+            "exit_code": self.exit_code,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ScanQueue:
+    """ job queue of the daemon: the scans run on a dedicated event loop thread through controller.scan,
+    at most `jobs` of them at the same time. only the last `max_jobs` jobs are remembered """
+
+    def __init__(self, jobs, max_jobs=1000, default_timeout=None):
+        self.jobs = jobs
+        self.default_timeout = default_timeout
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._max_jobs = max_jobs
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._thread = threading.Thread(target=self._run_loop, name="scan-loop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.jobs)
+        self._loop.run_forever()
+
+    def submit(self, directory, config_path=None, timeout=None):
+        job = ScanJob(directory, config_path=config_path, timeout=timeout or self.default_timeout)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._max_jobs:  # forget the oldest finished jobs
+                oldest = next((job_id for job_id, old in self._jobs.items()
+                               if old.status in (JOB_DONE, JOB_FAILED)), None)
+                if oldest is None:
+                    break
+                del self._jobs[oldest]
+        asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+        return job
+
+    async def _run(self, job):
+        async with self._semaphore:
+            job.status, job.started_at = JOB_RUNNING, time.time()
+            try:
+                job.findings = await controller.scan(job.directory, config_path=job.config_path,
+                                                     timeout=job.timeout, compact=True)
+                job.status, job.exit_code = JOB_DONE, 1 if job.findings else 0
+            except controller.ScanError as e:
+                job.status, job.exit_code, job.error = JOB_FAILED, e.exit_code, str(e)
+            except Exception as e:
+                job.status, job.exit_code, job.error = JOB_FAILED, 2, str(e)
+            finally:
+                job.finished_at = time.time()
+        logger.info(f"Scan job {job.id} ({job.directory}) {job.status} "
+                    f"in {job.finished_at - job.started_at:.3f}s")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            statuses = collections.Counter(job.status for job in self._jobs.values())
+        return {status: statuses.get(status, 0) for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class ScanRequestHandler(http.server.BaseHTTPRequestHandler):
+    """ HTTP API of the daemon:
+        POST /scans                {"dir": ..., "config": ..., "timeout": ...} -> 202, the queued job
+        GET  /scans/<id>           job status
+        GET  /scans/<id>/result    {"findings": [...]}, the same custom output as parse_json_output
+        GET  /health               queue statistics """
+
+    queue = None  # set by make_server
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if parts == ['health']:
+            return self._send(200, {"status": "ok", "jobs": self.queue.stats()})
+        if len(parts) in (2, 3) and parts[0] == 'scans':
+            job = self.queue.get(parts[1])
+            if job is None:
+                return self._send(404, {"error": f"Unknown scan job: {parts[1]}"})
+            if len(parts) == 2:
+                return self._send(200, job.to_dict())
+            if parts[2] == 'result':
+                if job.status == JOB_DONE:
+                    return self._send(200, {"findings": job.findings.to_list()})
+                if job.status == JOB_FAILED:
+                    return self._send(500, {"error": job.error, "exit_code": job.exit_code})
+                return self._send(409, {"error": f"Scan job {job.id} is still {job.status}"})
+        self._send(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/scans':
+            return self._send(404, {"error": f"Not found: {self.path}"})
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_SIZE:
+            return self._send(413, {"error": "Request too large"})
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+            directory = body['dir']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return self._send(400, {"error": 'Expected a JSON body like {"dir": "/path/to/scan"}'})
+        if not isinstance(directory, str) or not os.path.isdir(directory):
+            return self._send(400, {"error": f"The directory {directory} does not exist."})
+
+        job = self.queue.submit(directory, config_path=body.get('config'), timeout=body.get('timeout'))
+        self._send(202, job.to_dict())
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix-socket'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(queue, host="127.0.0.1", port=8080, socket_path=None):
+    """ HTTP server bound to a TCP address, or to a Unix socket when `socket_path` is given """
+    handler = type('BoundScanRequestHandler', (ScanRequestHandler,), {'queue': queue})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # left over by a previous daemon
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return http.server.ThreadingHTTPServer((host, port), handler)
+
+
+def get_parser():
+    """ returns an argument parser for `controller.py serve` """
+    parser = controller.MyCustomArgumentParser(
+        prog='controller.py serve',
+        description='Run the Gitleaks controller as a long-running scan daemon.'
+    )
+    parser.add_argument('--host', dest='host', type=str, default="127.0.0.1",
+                        help="Address to listen on. Default: 127.0.0.1")
+    parser.add_argument('--port', dest='port', type=int, default=8080,
+                        help="TCP port to listen on. Default: 8080")
+    parser.add_argument('--socket', dest='socket_path', type=str, default=None,
+                        help="Listen on this Unix socket instead of TCP. Default: None")
+    parser.add_argument('--jobs', dest='jobs', type=int, default=os.cpu_count() or 1,
+                        help="Number of scans running at the same time. Default: the number of CPU cores")
+    parser.add_argument('--timeout', dest='timeout', type=float, default=None,
+                        help="Default timeout of a scan, in seconds. Default: None")
+    parser.add_argument('--max_jobs', dest='max_jobs', type=int, default=1000,
+                        help="Number of jobs (and results) remembered by the daemon. Default: 1000")
+    scan_limits.add_limit_arguments(parser)
+    add_logging_arguments(parser)
+    return parser
+
+
+def main(__args__):
+    scan_limits.configure(memory=__args__.max_memory, cpu_time=__args__.max_cpu_time, nice=__args__.nice,
+                          io_class=__args__.ionice)
+    queue = ScanQueue(max(__args__.jobs, 1), max_jobs=__args__.max_jobs, default_timeout=__args__.timeout)
+    try:
+        httpd = make_server(queue, __args__.host, __args__.port, __args__.socket_path)
+    except OSError as e:
+        log_error_to_file(exit_code=2, error_message=f"Failed to start the scan daemon: {str(e)}")
+        sys.exit(2)
+
+    address = __args__.socket_path or f"http://{__args__.host}:{__args__.port}"
+    logger.info(f"Scan daemon listening on {address} with {queue.jobs} concurrent scans")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Scan daemon stopped")
+    finally:
+        httpd.server_close()
+        queue.close()
+        if __args__.socket_path and os.path.exists(__args__.socket_path):
+            os.remove(__args__.socket_path)
@@ -0,0 +1,79 @@
+import logging
+import os
+import shutil
+import tempfile
+
+SCRATCH_PREFIX = '.gitleaks-scratch-'  # scratch directories created inside a scanned tree
+
+logger = logging.getLogger(__name__)
+
+
+def same_device(path, other_path):
+    """ whether the two paths are on the same filesystem, i.e. files can be hard linked from one to the other """
+    try:
+        return os.stat(path).st_dev == os.stat(other_path).st_dev
+    except OSError:
+        return False
+
+
+_stage_in_tree = False
+
+
+def configure(stage_in_tree=False):
+    """ allow (--stage_in_tree) the scratch directories inside the scanned trees, see scratch_directory """
+    global _stage_in_tree
+    _stage_in_tree = stage_in_tree
+
+
+def scratch_directory(tree, prefix):
+    """ a TemporaryDirectory to stage the files of `tree` into, in the system temp directory ($TMPDIR): the
+    files are hard linked when it is on the tree's filesystem, copied otherwise. only with --stage_in_tree, and
+    when $TMPDIR is on another filesystem (a docker volume...), it is a hidden directory at the root of the tree
+    instead (when writable), so that the files are still hard linked. the caller must not scan the tree itself
+    while the directory exists, only subdirectories or the staged files """
+    if _stage_in_tree and not same_device(tempfile.gettempdir(), tree) and os.access(tree, os.W_OK | os.X_OK):
+        return tempfile.TemporaryDirectory(prefix=SCRATCH_PREFIX + prefix, dir=tree)
+    return tempfile.TemporaryDirectory(prefix=prefix)
+
+
+def stage_file(source_path, staged_path):
+    """ expose one file inside a staging directory: hard link it when possible (no extra disk usage),
+    otherwise (another device, unsupported filesystem) fall back to a copy. returns whether it was copied """
+    os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+    try:
+        os.link(source_path, staged_path)
+        return False
+    except OSError:
+        shutil.copy2(source_path, staged_path)
+        return True
+
+
+def stage_files(file_paths, root, staging_dir):
+    """ mirror the given files (all located below `root`) into `staging_dir`, keeping their relative layout """
+    copied = copied_bytes = 0
+    for file_path in file_paths:
+        if stage_file(file_path, os.path.join(staging_dir, os.path.relpath(file_path, root))):
+            copied += 1
+            copied_bytes += os.path.getsize(file_path)
+    if copied:
+        logger.warning(f"{copied} files ({copied_bytes} bytes) of {root} were copied to {staging_dir}, they cannot "
+                       f"be hard linked there (another filesystem?), set TMPDIR to a directory on the same "
+                       f"filesystem as the scanned tree, or use --stage_in_tree")
+    return copied
+
+
+def restore_path(path, staging_dir, root):
+    """ map a path reported inside the staging directory back to the original tree """
+    relative_path = os.path.relpath(path, staging_dir)
+    if relative_path == os.curdir:
+        return root
+    if relative_path.startswith(os.pardir):
+        return path  # not a staged file, leave it untouched
+    return os.path.join(root, relative_path)
+
+
+def restore_findings(findings, staging_dir, root):
+    """ lazily rewrite the 'File' of raw Gitleaks findings from the staging directory to the original tree """
+    for finding in findings:
+        finding['File'] = restore_path(finding['File'], staging_dir, root)
+        yield finding
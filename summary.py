@@ -0,0 +1,104 @@
+import collections
+import math
+
+from baseline import relative_path
+
+DEFAULT_TOP = 10
+DEFAULT_DEPTH = 2
+NO_EXTENSION = "(none)"
+ROOT_DIRECTORY = "."
+
+
+class Summary:
+    """ counts of the raw Gitleaks findings per rule, directory prefix, file extension, file and commit, plus the
+    distribution of their entropy. everything is updated in a single pass, while the findings stream through the
+    pipeline (see observe), so summarising never holds the findings in memory: only the counters """
+
+    def __init__(self, depth=DEFAULT_DEPTH):
+        self.depth = depth
+        self.total = 0
+        self.rules = collections.Counter()  # (RuleID, Description) -> findings
+        self.directories = collections.Counter()
+        self.extensions = collections.Counter()
+        self.files = collections.Counter()
+        self.commits = collections.Counter()
+        self.entropy_buckets = collections.Counter()  # floor(entropy) -> findings
+        self.entropy_sum = 0.0
+        self.entropy_max = None
+
+    def observe(self, findings, root=None):
+        """ pass the raw findings through, counting them on the way. paths are counted relative to `root`
+        (the scanned directory or archive) when they are inside it """
+        for finding in findings:
+            self.add(finding, root)
+            yield finding
+
+    def add(self, finding, root=None):
+        self.total += 1
+        self.rules[finding.get('RuleID', ''), finding.get('Description', '')] += 1
+
+        path = relative_path(finding['File'], root)
+        self.files[path] += 1
+        directory, _, name = path.rpartition('/')
+        self.directories['/'.join(directory.split('/')[:self.depth]) if directory else ROOT_DIRECTORY] += 1
+        _, dot, extension = name[1:].rpartition('.')  # [1:]: a dotfile (.env) has no extension
+        self.extensions[f".{extension.lower()}" if dot else NO_EXTENSION] += 1
+
+        commit = finding.get('Commit')
+        if commit:
+            self.commits[commit] += 1
+        entropy = finding.get('Entropy')
+        if entropy is not None:
+            self.entropy_sum += entropy
+            self.entropy_buckets[math.floor(entropy)] += 1
+            if self.entropy_max is None or entropy > self.entropy_max:
+                self.entropy_max = entropy
+
+    def to_dict(self, top=DEFAULT_TOP):
+        """ the top `top` entries of every counter (most findings first) """
+        entropy_count = sum(self.entropy_buckets.values())
+        return {
+            "findings": self.total,
+            "files": len(self.files),
+            "commits": len(self.commits),
+            "rules": [{"name": rule_id, "description": description, "findings": count}
+                      for (rule_id, description), count in self.rules.most_common(top)],
+            "directories": _top(self.directories, top),
+            "extensions": _top(self.extensions, top),
+            "files_with_most_findings": _top(self.files, top),
+            "top_commits": _top(self.commits, top),
+            "entropy": {
+                "mean": round(self.entropy_sum / entropy_count, 3) if entropy_count else None,
+                "max": self.entropy_max,
+                "histogram": {f"{bucket}-{bucket + 1}": self.entropy_buckets[bucket]
+                              for bucket in sorted(self.entropy_buckets)},
+            },
+        }
+
+    def render(self, top=DEFAULT_TOP):
+        """ the summary as printed by --summary """
+        summary = self.to_dict(top)
+        lines = [f"Summary: {summary['findings']} findings in {summary['files']} files"
+                 + (f" and {summary['commits']} commits" if summary['commits'] else "")]
+        for rule in summary['rules']:
+            rule['name'] = f"{rule['name']} ({rule['description']})"
+        sections = [
+            ("Top rules", summary['rules']),
+            (f"Top directories (depth {self.depth})", summary['directories']),
+            ("Top extensions", summary['extensions']),
+            ("Files with the most findings", summary['files_with_most_findings']),
+            ("Commits with the most findings", summary['top_commits']),
+        ]
+        for title, rows in sections:
+            if rows:
+                lines.append(f"\n{title}:")
+                lines.extend(f"{row['findings']:>10}  {row['name']}" for row in rows)
+        entropy = summary['entropy']
+        if entropy['histogram']:
+            lines.append(f"\nEntropy: mean {entropy['mean']}, max {entropy['max']}")
+            lines.extend(f"{count:>10}  {bucket}" for bucket, count in entropy['histogram'].items())
+        return '\n'.join(lines)
+
+
+def _top(counter, top):
+    return [{"name": name, "findings": count} for name, count in counter.most_common(top)]
@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def gitleaks_bin(tmp_path, monkeypatch):
+    """ a directory put first on the PATH, holding the `gitleaks` executable of the test
+    (see utils_tests.install_gitleaks_script) """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return bin_dir
@@ -0,0 +1,168 @@
+import io
+import json
+import os
+import sys
+import tarfile
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import archives
+import controller
+
+MEMBERS = {
+    "app/settings.py": b"token = SECRET\n",
+    "app/empty.txt": b"",
+    "app/big.log": b"x" * 5000,
+    "bin/tool": b"\x7fELF\0\0SECRET",
+    "../../outside.txt": b"SECRET\n",
+}
+
+
+def _tar_bytes(members, mode='w'):
+    """ a tarball of the members, {name: data} or [(name, data)] (a tar can hold a name several times) """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tar:
+        for name, data in members.items() if isinstance(members, dict) else members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _write_archive(path, members):
+    if str(path).endswith('.zip'):
+        with zipfile.ZipFile(path, 'w') as zip_archive:
+            for name, data in members.items():
+                zip_archive.writestr(name, data)
+    else:
+        mode = {'.gz': 'w:gz', '.bz2': 'w:bz2', '.xz': 'w:xz'}.get(os.path.splitext(str(path))[1], 'w')
+        with open(path, 'wb') as f:
+            f.write(_tar_bytes(members, mode))
+    return str(path)
+
+
+def _stage_all(stager):
+    """ run the stager, returns the members of every chunk and the bytes on disk when each chunk was staged """
+    chunks, staged_bytes = [], []
+    for members in stager.iter_chunks():
+        chunks.append(dict(members))
+        staged_bytes.append(sum(os.path.getsize(os.path.join(d, f))
+                                for d, _, files in os.walk(stager.staging_dir) for f in files))
+    return chunks, staged_bytes
+
+
+@pytest.mark.parametrize("name", ["image.tar", "image.tar.gz", "image.tgz", "image.tar.bz2", "image.tar.xz",
+                                  "image.zip"])
+def test_archive_stager(tmp_path, name):
+    archive_path = _write_archive(tmp_path / name, MEMBERS)
+    stager = archives.ArchiveStager(archive_path, str(tmp_path / "staging"), max_file_size=1000)
+    chunks, _ = _stage_all(stager)
+
+    assert chunks == [{"app/settings.py": "app/settings.py", "outside.txt": "../../outside.txt"}]
+    assert not (tmp_path / "outside.txt").exists()  # the .. of the member name was dropped
+    assert stager.skipped == {"too_large": [1, 5000], "binary": [1, 12], "empty": [1, 0], "unsafe": [0, 0]}
+    assert stager.summary().startswith("scanned 2 members (22 bytes) in 1 chunks, skipped 3 members")
+
+
+def test_archive_stager_chunks_are_bounded(tmp_path):
+    members = {f"src/file{i}.py": f"SECRET {i}\n".encode() * 10 for i in range(20)}  # 90 bytes each
+    archive_path = _write_archive(tmp_path / "repo.tar.gz", members)
+    stager = archives.ArchiveStager(archive_path, str(tmp_path / "staging"), chunk_size=200)
+    chunks, staged_bytes = _stage_all(stager)
+
+    assert len(chunks) == 10 and stager.chunks == 10
+    assert max(staged_bytes) <= 200
+    assert sorted(member for chunk in chunks for member in chunk.values()) == sorted(members)
+
+
+def test_archive_stager_same_path_twice(tmp_path):
+    """ a tar can hold a path several times (like the layers of an image), and a file where a later member
+    needs a directory: both end up in different chunks """
+    archive_path = tmp_path / "layers.tar"
+    archive_path.write_bytes(_tar_bytes([("etc/key", b"SECRET 1\n"), ("etc/key/x", b"SECRET 2\n"),
+                                         ("etc/key", b"SECRET 3\n")]))
+    chunks, _ = _stage_all(archives.ArchiveStager(str(archive_path), str(tmp_path / "staging")))
+    assert chunks == [{"etc/key": "etc/key"}, {"etc/key/x": "etc/key/x"}, {"etc/key": "etc/key"}]
+
+
+def test_archive_stager_nested_archives(tmp_path):
+    """ an image saved with `docker save` is a tar of layer tarballs """
+    layer = _tar_bytes({"etc/app/.env": b"API_KEY=SECRET\n"})
+    zipped = io.BytesIO()
+    with zipfile.ZipFile(zipped, 'w') as zip_archive:
+        zip_archive.writestr("config.json", b'{"key": "SECRET"}')
+    archive_path = _write_archive(tmp_path / "image.tar", {"manifest.json": b"[]", "abc/layer.tar": layer,
+                                                           "abc/app.jar.zip": zipped.getvalue()})
+    chunks, _ = _stage_all(archives.ArchiveStager(archive_path, str(tmp_path / "staging")))
+    assert chunks == [{"manifest.json": "manifest.json",
+                       "abc/layer.tar!etc/app/.env": "abc/layer.tar!etc/app/.env",
+                       "abc/app.jar.zip!config.json": "abc/app.jar.zip!config.json"}]
+
+
+def test_run_gitleaks_archive(tmp_path):
+    archive_path = _write_archive(tmp_path / "repo.tar.gz", {"a.py": b"SECRET\n", "b/c.py": b"x = 1\nSECRET\n"})
+    report_path = str(tmp_path / "report.json")
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks) as mock_run:
+        process = controller.run_gitleaks_archive(archive_path, report_path, chunk_size=14)
+
+    assert process.returncode == 1
+    assert mock_run.call_count == 2  # one Gitleaks run per chunk
+    with open(report_path, 'r') as f:
+        report = json.load(f)
+    assert [(finding["File"], finding["StartLine"]) for finding in report] == [
+        (f"{archive_path}!a.py", 1), (f"{archive_path}!b/c.py", 2)]
+
+
+def test_run_gitleaks_archive_failure(tmp_path):
+    archive_path = _write_archive(tmp_path / "repo.tar", {"a.py": b"SECRET\n", "b.py": b"SECRET\n"})
+    failed = tests_utils.mock_process(returncode=2, stderr="boom")
+    with patch("controller.run_gitleaks", return_value=failed) as mock_run:
+        process = controller.run_gitleaks_archive(archive_path, str(tmp_path / "report.json"), chunk_size=7)
+    assert process is failed
+    assert mock_run.call_count == 1  # the remaining chunks are not scanned
+    assert not os.path.exists(tmp_path / "report.json")  # no partial report
+
+
+def test_main_with_archive_failure(tmp_path):
+    archive_path = _write_archive(tmp_path / "repo.tar.gz", {"a.py": b"SECRET\n"})
+    args = controller.get_parser().parse_args(['--dir', archive_path, '--custom_output_dir', str(tmp_path)])
+    with patch("controller.run_gitleaks", return_value=tests_utils.mock_process(returncode=2, stderr="boom")), \
+            patch("controller.parse_json_output") as mock_parse, pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
+    mock_parse.assert_not_called()
+
+
+def test_corrupted_archive(tmp_path):
+    archive_path = tmp_path / "broken.tar.gz"
+    archive_path.write_bytes(b"not a tarball")
+    with patch("controller.log_error_to_file") as mock_log_error, pytest.raises(SystemExit) as excinfo:
+        controller.run_gitleaks_archive(str(archive_path), str(tmp_path / "report.json"))
+    assert excinfo.value.code == 2
+    assert "Failed to read the archive" in mock_log_error.call_args.kwargs['error_message']
+
+
+def test_main_with_archive(tmp_path, capsys):
+    archive_path = _write_archive(tmp_path / "repo.zip", {"src/app.py": b"token = SECRET\n"})
+    args = controller.get_parser().parse_args(['--dir', archive_path, '--output_filename', 'report.json',
+                                               '--custom_output_dir', str(tmp_path), '--archive_chunk_size', '1K'])
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks):
+        controller.main(args)
+
+    assert f"filename='{archive_path}!src/app.py'" in capsys.readouterr().out
+    with open(tmp_path / "report.json", 'r') as f:
+        assert json.load(f)[0]["File"] == f"{archive_path}!src/app.py"
+
+
+def test_archive_rejects_other_modes(tmp_path):
+    archive_path = _write_archive(tmp_path / "repo.tar", {"a.py": b"SECRET\n"})
+    args = controller.get_parser().parse_args(['--dir', archive_path, '--dir', str(tmp_path)])
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import scan_limits
+
+PYTHON = shlex.quote(sys.executable)
+
+
+def test_execute_command_async_streams_output():
+    """ every line is logged as it arrives, the returned process keeps the output tail """
+    command = f"{PYTHON} -c \"import sys; print('a'); print('b'); print('err', file=sys.stderr); sys.exit(1)\""
+    with patch.object(controller.logger, "isEnabledFor", return_value=True), \
+            patch("controller.logger.debug") as mock_debug:
+        process = asyncio.run(controller.execute_command_async(command))
+
+    assert process.returncode == 1
+    assert process.stdout == "a\nb"
+    assert process.stderr == "err"
+    mock_debug.assert_any_call("stdout: a")
+    mock_debug.assert_any_call("stderr: err")
+
+
+def test_execute_command_async_tail_is_bounded():
+    command = f"{PYTHON} -c \"[print(i) for i in range(50)]\""
+    process = asyncio.run(controller.execute_command_async(command, tail_size=3))
+    assert process.stdout == "47\n48\n49"
+
+
+def test_execute_command_async_timeout_kills_the_process():
+    command = f"{PYTHON} -c \"import time; time.sleep(30)\""
+    start = time.monotonic()
+    with pytest.raises(controller.ScanTimeoutError) as excinfo:
+        asyncio.run(controller.execute_command_async(command, timeout=0.5))
+    assert time.monotonic() - start < 10
+    assert excinfo.value.exit_code == scan_limits.TIMEOUT_EXIT_CODE
+
+
+def test_execute_command_async_applies_the_scan_limits():
+    """ the library and the daemon run Gitleaks under the same limits as the CLI """
+    probe = ("import os, resource; "
+             "print(resource.getrlimit(resource.RLIMIT_AS)[0], resource.getrlimit(resource.RLIMIT_CPU)[0], os.nice(0))")
+    limits = scan_limits.configure(memory=2 * 1024 ** 3, cpu_time=60, nice=5, timeout=0.5)
+    try:
+        process = asyncio.run(controller.execute_command_async(f'{PYTHON} -c "{probe}"', timeout=30))
+        with pytest.raises(controller.ScanTimeoutError):  # the configured timeout by default
+            asyncio.run(controller.execute_command_async(f'{PYTHON} -c "import time; time.sleep(30)"'))
+    finally:
+        scan_limits.configure()
+
+    memory, cpu_time, niceness = process.stdout.split()
+    assert (int(memory), int(cpu_time)) == (limits.memory, limits.cpu_time)
+    assert int(niceness) >= os.nice(0) + 5
+
+
+def test_execute_command_async_killed_by_a_signal():
+    command = f"{PYTHON} -c \"import os, signal; os.kill(os.getpid(), signal.SIGXCPU)\""
+    process = asyncio.run(controller.execute_command_async(command))
+    assert process.returncode == scan_limits.SIGNAL_EXIT_CODE_BASE + signal.SIGXCPU
+
+
+def test_execute_command_async_cancellation():
+    command = f"{PYTHON} -c \"import time; time.sleep(30)\""
+
+    async def cancel_scan():
+        task = asyncio.create_task(controller.execute_command_async(command))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.monotonic()
+    asyncio.run(cancel_scan())
+    assert time.monotonic() - start < 10
+
+
+def _fake_execute(report):
+    async def execute(command, timeout=None):
+        report_path = shlex.split(command)[shlex.split(command).index('--report-path') + 1]
+        with open(report_path, 'w') as f:
+            json.dump(report, f)
+        return subprocess.CompletedProcess(args=command, returncode=1, stdout="", stderr="")
+    return execute
+
+
+def test_scan_returns_custom_findings(tmp_path):
+    with open(os.path.join(os.getcwd(), 'tests', 'output_test.json'), 'r') as f:
+        report = json.load(f)
+
+    with patch("controller.execute_command_async", side_effect=_fake_execute(report)):
+        findings = asyncio.run(controller.scan(str(tmp_path)))
+
+    assert findings == list(controller.transform_findings(report))
+    assert os.listdir(tmp_path) == []  # nothing written into the scanned directory
+
+
+def test_scan_compact(tmp_path):
+    finding = {"File": "x", "StartLine": 1, "EndLine": 2, "Description": "d"}
+    with patch("controller.execute_command_async", side_effect=_fake_execute([finding])):
+        findings = asyncio.run(controller.scan(str(tmp_path), compact=True))
+
+    assert len(findings) == 1 and findings.to_list() == [{"filename": "x", "line_range": "1-2", "description": "d"}]
+
+
+def test_scan_many_keeps_the_order(tmp_path):
+    directories = []
+    for name in ("a", "b", "c"):
+        os.mkdir(tmp_path / name)
+        directories.append(str(tmp_path / name))
+    finding = {"File": "x", "StartLine": 1, "EndLine": 2, "Description": "d"}
+
+    with patch("controller.execute_command_async", side_effect=_fake_execute([finding])):
+        results = asyncio.run(controller.scan_many(directories + ["/non/existent"], jobs=2, return_exceptions=True))
+
+    assert results[:3] == [[{"filename": "x", "line_range": "1-2", "description": "d"}]] * 3
+    assert isinstance(results[3], controller.ScanError) and results[3].exit_code == 2
+
+
+def test_scan_gitleaks_failure(tmp_path):
+    async def execute(command, timeout=None):
+        return subprocess.CompletedProcess(args=command, returncode=126, stdout="", stderr="bad config")
+
+    with patch("controller.execute_command_async", side_effect=execute), \
+            pytest.raises(controller.ScanError) as excinfo:
+        asyncio.run(controller.scan(str(tmp_path)))
+    assert excinfo.value.exit_code == 126
+    assert str(excinfo.value) == "bad config"
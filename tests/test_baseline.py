@@ -0,0 +1,126 @@
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import baseline
+import controller
+import synthetic
+
+
+def _make_finding(index):
+    return synthetic.make_finding(index, random.Random(index))  # the same secret on every scan
+
+
+def _findings(indexes):
+    return list(controller.transform_findings((_make_finding(index) for index in indexes), fingerprints=True))
+
+
+def _diff(baseline_path, indexes, update=True):
+    index = baseline.Baseline(str(baseline_path), update=update)
+    try:
+        return [(finding['filename'], finding['status']) for finding in index.diff(_findings(indexes))]
+    finally:
+        index.close()
+
+
+def _names(indexes, status):
+    return [(_make_finding(index)['File'], status) for index in indexes]
+
+
+def test_fingerprint():
+    finding = _make_finding(0)
+    assert baseline.fingerprint(finding) == baseline.fingerprint(dict(finding))
+    for field, value in (('StartLine', 9999), ('Secret', 'other'), ('RuleID', 'other'), ('File', 'other.py')):
+        assert baseline.fingerprint(finding) != baseline.fingerprint(dict(finding, **{field: value}))
+    assert len(baseline.format_fingerprint(baseline.fingerprint(finding))) == 16
+
+
+def test_fingerprint_is_relative_to_the_scanned_root():
+    """ the same tree scanned as --dir tree/c and as --dir /tmp/rv/tree/c, or an archive moved elsewhere """
+    finding = _make_finding(0)
+    relative = dict(finding, File="tree/c/app/config.py")
+    absolute = dict(finding, File="/tmp/rv/tree/c/app/config.py")
+    assert baseline.fingerprint(relative, "tree/c") == baseline.fingerprint(absolute, "/tmp/rv/tree/c/")
+    assert baseline.fingerprint(relative, "tree/c") != baseline.fingerprint(relative)
+
+    member = dict(finding, File="/srv/images/app.tar!layer.tar!app/config.py")
+    moved = dict(finding, File="images/app.tar!layer.tar!app/config.py")
+    assert baseline.fingerprint(member, "/srv/images/app.tar") == baseline.fingerprint(moved, "images/app.tar")
+    assert baseline.relative_path(member["File"], "/srv/images/app.tar") == "layer.tar!app/config.py"
+    assert baseline.relative_path("/elsewhere/config.py", "/tmp/rv/tree/c") == "/elsewhere/config.py"
+
+    findings = [relative, absolute]
+    custom = [list(controller.transform_findings([finding], fingerprints=True, root=root))[0]
+              for finding, root in zip(findings, ("tree/c", "/tmp/rv/tree/c"))]
+    assert custom[0]["fingerprint"] == custom[1]["fingerprint"]
+    assert custom[0]["filename"] != custom[1]["filename"]  # the output keeps the reported paths
+
+
+def test_first_scan_is_all_new_and_dry_runs_are_not_recorded(tmp_path):
+    baseline_path = tmp_path / "baseline.sqlite"
+    assert _diff(baseline_path, range(3), update=False) == _names(range(3), "new")
+    assert _diff(baseline_path, range(3), update=False) == _names(range(3), "new")
+
+
+def test_new_and_resolved_findings(tmp_path):
+    baseline_path = tmp_path / "baseline.sqlite"
+    _diff(baseline_path, range(5))
+
+    assert _diff(baseline_path, [0, 1, 2, 3, 5]) == _names([5], "new") + _names([4], "resolved")
+    assert _diff(baseline_path, [0, 1, 2, 3, 5]) == []
+    assert _diff(baseline_path, [0, 1, 2, 3, 4, 5]) == _names([4], "new")  # came back after being resolved
+
+
+def test_duplicates_are_dropped(tmp_path):
+    assert _diff(tmp_path / "baseline.sqlite", [0, 0, 1]) == _names([0, 1], "new")
+
+
+def test_secrets_are_not_stored(tmp_path):
+    baseline_path = tmp_path / "baseline.sqlite"
+    _diff(baseline_path, range(3))
+    content = (baseline_path).read_bytes()
+    assert not any(_make_finding(index)['Secret'].encode() in content for index in range(3))
+
+
+def test_diff_does_not_depend_on_the_history_size(tmp_path):
+    """ the resolved findings come from the last_seen index, not from a scan of every known fingerprint """
+    baseline_path = tmp_path / "baseline.sqlite"
+    _diff(baseline_path, range(100))
+    connection = sqlite3.connect(baseline_path)
+    with connection:  # 200k fingerprints from older scans, all resolved long ago
+        connection.executemany("INSERT INTO findings VALUES (?, 'old.py', '1-1', 'old', 0, 0)",
+                               ((value,) for value in range(-200_000, 0)))
+    connection.close()
+
+    start = time.perf_counter()
+    assert _diff(baseline_path, range(1, 101)) == _names([100], "new") + _names([0], "resolved")
+    assert time.perf_counter() - start < 1
+
+
+def test_main_with_baseline(tmp_path):
+    with open(os.path.join(os.getcwd(), 'tests', 'output_test.json'), 'r') as f:
+        raw = f.read()
+    baseline_path = str(tmp_path / "baseline.sqlite")
+
+    def fake_run_gitleaks(directory_to_scan, output_file, **kwargs):
+        (tmp_path / output_file).write_text(raw)
+
+    def run(*extra_args):
+        args = controller.get_parser().parse_args(['--dir', str(tmp_path), '--baseline', baseline_path,
+                                                   '--no-show_result', *extra_args])
+        with patch("controller.run_gitleaks", side_effect=fake_run_gitleaks):
+            controller.main(args)
+        with open(tmp_path / controller.CUSTOM_OUTPUT_FILENAME, 'r') as f:
+            return json.load(f)["findings"]
+
+    findings = run('--update_baseline')
+    assert len(findings) == len(json.loads(raw))
+    assert all(finding["status"] == "new" and len(finding["fingerprint"]) == 16 for finding in findings)
+    assert run() == []
@@ -0,0 +1,136 @@
+import json
+import os
+import subprocess
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import bench_pipeline
+import fake_gitleaks
+
+
+def test_fake_gitleaks_writes_synthetic_report(tmp_path, monkeypatch):
+    report_path = str(tmp_path / "report.json")
+    monkeypatch.setenv("FAKE_GITLEAKS_FINDINGS", "25")
+
+    assert fake_gitleaks.main(["detect", "--no-git", "--report-path", report_path, "--source", str(tmp_path)]) == 1
+    with open(report_path, 'r') as f:
+        findings = json.load(f)
+    assert len(findings) == 25
+    assert {"File", "StartLine", "EndLine", "Description", "RuleID", "Secret"} <= set(findings[0])
+
+
+def test_fake_gitleaks_through_path(tmp_path):
+    """ the installed wrapper is picked up as `gitleaks` """
+    bench_pipeline.install_fake_gitleaks(str(tmp_path))
+    env = dict(os.environ, PATH=f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    process = subprocess.run(["gitleaks", "version"], env=env, capture_output=True, text=True)
+    assert process.stdout.strip() == fake_gitleaks.FAKE_VERSION
+
+
+def test_bench_pipeline_run_size():
+    run = bench_pipeline.run_size(10)
+    assert run["findings"] == 10
+    assert [stage["stage"] for stage in run["stages"]] == [
+        "execute_command", "get_findings_from_output_file", "parse_json_output", "custom_output", "show_results"
+    ]
+    assert all(stage["peak_rss_kb"] > 0 for stage in run["stages"])
+
+
+def test_bench_pipeline_compare():
+    baseline = {"runs": [{"findings": 10, "stages": [{"stage": "show_results", "self_seconds": 1.0}]}]}
+    slower = {"runs": [{"findings": 10, "stages": [{"stage": "show_results", "self_seconds": 2.0}]}]}
+    assert bench_pipeline.compare(baseline, baseline, 0.25) == []
+    assert len(bench_pipeline.compare(slower, baseline, 0.25)) == 1
+
+
+def test_bench_output_formats_run_size():
+    import bench_output_formats
+
+    results = bench_output_formats.run_size(20, ("json", "ndjson", "csv"))
+    assert set(results) == {"json", "ndjson", "csv"}
+    assert results["ndjson"][1] < results["json"][1]
+
+
+def test_bench_json_backends_run_size(tmp_path):
+    import bench_json_backends
+    import synthetic
+
+    report_path = synthetic.write_report(str(tmp_path / "report.json"), 20)
+    results = bench_json_backends.run_size(report_path)
+    assert {"streaming", "mmap+json"} <= set(results)
+
+
+def test_bench_baseline(tmp_path):
+    import bench_baseline
+
+    baseline_path = str(tmp_path / "baseline.sqlite")
+    bench_baseline.build_index(baseline_path, history=1000, findings=50)
+    _, new, resolved = bench_baseline.measure_diff(baseline_path, findings=50, changed=5)
+    assert (new, resolved) == (5, 5)
+
+
+def test_bench_prefilter(tmp_path):
+    import bench_prefilter
+    from prefilter import IgnoreRules
+
+    bench_prefilter.make_project(str(tmp_path), 40)
+    _, result = bench_prefilter.measure(str(tmp_path), 2, IgnoreRules(["node_modules/", "build/"]))
+    assert len(result.files) == 4 and result.skipped["binary"][0] == 4 and result.pruned_dirs == 2
+
+
+def test_bench_summary():
+    import bench_summary
+
+    results = bench_summary.run_size(120)
+    assert results["page"][1] < results["all"][1]
+    assert all(seconds >= 0 for seconds, _ in results.values())
+
+
+def test_bench_batch(monkeypatch):
+    import bench_batch
+
+    monkeypatch.setenv("PATH", os.environ["PATH"])  # restored after the benchmark put its fake Gitleaks first
+    monkeypatch.setenv("FAKE_GITLEAKS_MARKER", "")
+    monkeypatch.setenv("FAKE_GITLEAKS_STARTUP", "0")
+    results = bench_batch.run(6, (1, 3), jobs=2, startup=0)
+    assert results[1][1] == results[3][1] and len(results[1][1]) == 12  # 2 leaking files per target
+
+
+def test_bench_archives(monkeypatch):
+    import bench_archives
+
+    monkeypatch.setenv("PATH", os.environ["PATH"])
+    monkeypatch.setenv("FAKE_GITLEAKS_MARKER", "")
+    monkeypatch.setenv("FAKE_GITLEAKS_STARTUP", "0")
+    results = bench_archives.run(60, 512, (4096,))
+    extract, chunked = results["extract"], results["chunk 4096"]
+    assert chunked[2] == extract[2] and len(extract[2]) == 6 * 30  # 6 leaking files of 30 leaking lines
+    assert chunked[1] <= 4096 < extract[1]
+
+
+def test_bench_watch(monkeypatch):
+    import bench_watch
+
+    monkeypatch.setenv("PATH", os.environ["PATH"])
+    monkeypatch.setenv("FAKE_GITLEAKS_MARKER", "")
+    monkeypatch.setenv("FAKE_GITLEAKS_STARTUP", "0")
+    results = bench_watch.run(300, 2, ["inotify", "poll"], interval=0.05)
+    assert len(results["inotify"]) == len(results["poll"]) == 2
+    assert max(results["inotify"]) < 1.0
+
+
+def test_bench_findings_store():
+    import bench_findings_store
+
+    results = bench_findings_store.run_size(500)
+    assert set(results) == set(bench_findings_store.REPRESENTATIONS)
+    assert results["store"][0] * 3 < results["custom"][0] < results["raw"][0]
+
+
+def test_bench_triage():
+    import bench_triage
+
+    results = bench_triage.run_size(300, jobs=2)
+    assert results["memoised"][1] == results["pool"][1] == 240  # the placeholders and test fixtures are dropped
+    assert results["every finding"][1] is None
@@ -21,8 +21,9 @@ def test_show_results_with_bonus():
     tests_dirpath = os.path.join(os.getcwd(), 'tests')
     real_output_filename = 'output_test.json'
 
+    expected_output = [bonus.LeakReport(**finding_dict) for finding_dict in
+                       controller.parse_json_output(tests_dirpath, real_output_filename)['findings']]
     custom_output = controller.parse_json_output(tests_dirpath, real_output_filename)
-    expected_output = [bonus.LeakReport(**finding_dict) for finding_dict in custom_output['findings']]
 
     with patch('builtins.print') as mock_print:
         controller.show_results(custom_output, bonus=True)
@@ -134,3 +135,33 @@ def test_leak_report_invalid_line_range():
     """Test that invalid line_range raises an error."""
     with pytest.raises(ValidationError):
         bonus.LeakReport(filename="test.py", line_range="invalid")
+
+
+def test_iter_leak_reports_trusted():
+    """ the default conversion is lax, the strict --validate mode rejects coerced values """
+    findings = [{"filename": "a.py", "line_range": "1-2", "description": "AWS"},
+                {"filename": b"b.py", "line_range": "1-2", "description": "AWS"}]
+    reports = list(bonus.iter_leak_reports(findings))
+    assert reports[0] == bonus.LeakReport(**findings[0])
+    assert reports[1].filename == "b.py"
+    with pytest.raises(ValidationError):
+        list(bonus.iter_leak_reports(findings, validate=True))
+
+
+def test_iter_leak_reports_validated_in_batches():
+    findings = [{"filename": f"{i}.py", "line_range": f"{i}-{i}", "description": "AWS"} for i in range(25)]
+    reports = list(bonus.iter_leak_reports(iter(findings), validate=True, batch_size=10))
+    assert reports == [bonus.LeakReport(**finding) for finding in findings]
+
+
+def test_iter_leak_reports_validation_error():
+    findings = [{"filename": "a.py", "line_range": "1-2", "description": "AWS"}, {"filename": None}]
+    with pytest.raises(ValidationError):
+        list(bonus.iter_leak_reports(findings, validate=True))
+
+
+def test_show_results_with_validation():
+    custom_output = {'findings': iter([{'filename': 'test.py', 'line_range': '1-2', 'description': 'Sensitive'}])}
+    with patch('builtins.print') as mock_print:
+        controller.show_results(custom_output, bonus=True, validate=True)
+        mock_print.assert_any_call("1) filename='test.py' line_range='1-2' description='Sensitive'")
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import controller
+import synthetic
+from findings_store import Finding, FindingsStore, parse_line_range
+
+FINDINGS = [
+    {"filename": "/repo/src/app.py", "line_range": "3-3", "description": "AWS"},
+    {"filename": "/repo/src/app.py", "line_range": "10-12", "description": "Private Key"},
+    {"filename": "/repo/docs/notes.md", "line_range": "7-7", "description": "AWS"},
+    {"filename": "/repository/x.py", "line_range": "1-1", "description": "Generic API Key"},
+]
+
+
+@pytest.fixture
+def store():
+    return FindingsStore(FINDINGS)
+
+
+def test_round_trip(store):
+    assert len(store) == 4 and store
+    assert store.to_list() == FINDINGS
+    assert store[1] == Finding("/repo/src/app.py", 10, 12, "Private Key")
+    assert store[-1].line_range == "1-1"
+    assert [finding.to_dict() for finding in store] == FINDINGS
+    assert not FindingsStore()
+
+
+def test_strings_are_interned(store):
+    assert store[0].filename is store[1].filename
+    assert store.filenames() == ["/repo/src/app.py", "/repo/docs/notes.md", "/repository/x.py"]
+    assert len(store._strings) == 6  # 3 filenames and 3 descriptions, stored once
+
+
+def test_from_report_matches_transform_findings():
+    report = list(synthetic.iter_findings(50))
+    assert FindingsStore.from_report(report).to_list() == list(controller.transform_findings(report))
+
+
+def test_filter(store):
+    assert store.filter(filename="/repo/src/app.py").to_list() == FINDINGS[:2]
+    assert store.filter(directory="/repo/").to_list() == FINDINGS[:3]  # not /repository
+    assert store.filter(directory="/repo", description="AWS").to_list() == [FINDINGS[0], FINDINGS[2]]
+    assert store.filter(predicate=lambda finding: finding.end_line > finding.start_line).to_list() == [FINDINGS[1]]
+    assert len(store.filter(filename="/missing")) == 0
+
+    filtered = store.filter(description="AWS")
+    filtered.add("/new.py", 5, 5, "New rule")  # the shared string table only grows
+    assert store.to_list() == FINDINGS and filtered[-1] == Finding("/new.py", 5, 5, "New rule")
+
+
+def test_extend_with_records(store):
+    copy = FindingsStore(store)
+    copy.extend([{"filename": "a", "line_range": "4", "description": "d", "fingerprint": 1}])
+    assert copy[-1] == Finding("a", 4, 4, "d")  # the fingerprint is not kept
+    assert parse_line_range("12-14") == (12, 14)
+
+
+@pytest.mark.parametrize("output_format", ["json", "ndjson"])
+def test_write(store, tmp_path, output_format):
+    path = str(tmp_path / f"findings.{output_format}")
+    assert store.write(path, output_format) == 4
+    with open(path, 'r') as f:
+        if output_format == "json":
+            assert json.load(f) == {"findings": FINDINGS}
+        else:
+            assert [json.loads(line) for line in f] == FINDINGS
+
+
+def test_smaller_than_dicts():
+    findings = list(controller.transform_findings(synthetic.iter_findings(2000)))
+    dicts_size = sum(sys.getsizeof(finding) + sum(map(sys.getsizeof, finding.values())) for finding in findings)
+    assert FindingsStore(findings).nbytes() * 2 < dicts_size  # even with no repeated filename
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+from git import Repo
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+
+
+def _commit(repo, filename, content):
+    tests_utils.make_tree(repo.working_tree_dir, {filename: content})
+    repo.index.add([filename])
+    return repo.index.commit(f"update {filename}").hexsha
+
+
+def _fake_history_scan(repo):
+    """ a fake Gitleaks git scan: one finding per commit of the scanned range """
+    def run_gitleaks(directory_to_scan, output_file, report_path=None, git_history=False, log_opts=None, **kwargs):
+        assert git_history
+        findings = [{"Description": "Fake secret", "StartLine": 1, "EndLine": 1, "File": "secret.txt",
+                     "Commit": commit.hexsha, "RuleID": "fake-secret", "Secret": "SECRET"}
+                    for commit in repo.iter_commits(log_opts or "HEAD")]
+        with open(report_path, 'w') as f:
+            json.dump(findings, f)
+        return tests_utils.mock_process(returncode=1 if findings else 0)
+    return run_gitleaks
+
+
+def _report_commits(repo):
+    with open(os.path.join(repo.working_tree_dir, "output_test.json"), 'r') as f:
+        return sorted(finding['Commit'] for finding in json.load(f))
+
+
+def test_incremental_history_scan(tmp_path):
+    repo = Repo.init(str(tmp_path / "repo"))
+    state_path = str(tmp_path / "state.json")
+    first = _commit(repo, "a.txt", "one")
+    second = _commit(repo, "a.txt", "two")
+
+    with patch("controller.run_gitleaks", side_effect=_fake_history_scan(repo)) as mock_run_gitleaks:
+        controller.run_gitleaks_incremental(repo.working_tree_dir, "output_test.json", state_path)
+        assert mock_run_gitleaks.call_args.kwargs['log_opts'] is None  # first run: full history
+        assert _report_commits(repo) == sorted([first, second])
+
+        mock_run_gitleaks.reset_mock()
+        controller.run_gitleaks_incremental(repo.working_tree_dir, "output_test.json", state_path)
+        mock_run_gitleaks.assert_not_called()  # no new commits
+
+        third = _commit(repo, "b.txt", "three")
+        controller.run_gitleaks_incremental(repo.working_tree_dir, "output_test.json", state_path)
+        assert mock_run_gitleaks.call_args.kwargs['log_opts'] == f"{second}..{third}"
+        assert _report_commits(repo) == sorted([first, second, third])
+
+    with open(state_path, 'r') as f:
+        assert json.load(f) == {os.path.abspath(repo.working_tree_dir): {"last_commit": third}}
+
+
+def test_incremental_history_scan_without_report(tmp_path):
+    """ a missing cumulative report forces a full history scan """
+    repo = Repo.init(str(tmp_path / "repo"))
+    state_path = str(tmp_path / "state.json")
+    head = _commit(repo, "a.txt", "one")
+    controller.save_scan_state({os.path.abspath(repo.working_tree_dir): {"last_commit": head}}, state_path)
+
+    with patch("controller.run_gitleaks", side_effect=_fake_history_scan(repo)) as mock_run_gitleaks:
+        controller.run_gitleaks_incremental(repo.working_tree_dir, "output_test.json", state_path)
+        assert mock_run_gitleaks.call_args.kwargs['log_opts'] is None
+    assert _report_commits(repo) == [head]
+
+
+def test_incremental_history_scan_failure(tmp_path):
+    """ the previous cumulative report is not parsed as the result of a failed scan """
+    repo = Repo.init(str(tmp_path / "repo"))
+    state_path = str(tmp_path / "state.json")
+    first = _commit(repo, "a.txt", "one")
+    with patch("controller.run_gitleaks", side_effect=_fake_history_scan(repo)):
+        controller.run_gitleaks_incremental(repo.working_tree_dir, "output_test.json", state_path)
+    _commit(repo, "a.txt", "two")
+
+    args = controller.get_parser().parse_args(['--dir', repo.working_tree_dir, '--output_filename', 'output_test.json',
+                                               '--git', '--state_file', state_path])
+    with patch("controller.run_gitleaks", return_value=tests_utils.mock_process(returncode=2, stderr="boom")), \
+            patch("controller.parse_json_output") as mock_parse, pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
+    mock_parse.assert_not_called()
+    assert _report_commits(repo) == [first]  # kept for the retry
+    with open(state_path, 'r') as f:
+        assert json.load(f) == {os.path.abspath(repo.working_tree_dir): {"last_commit": first}}
+
+
+def test_incremental_history_scan_not_a_repository(tmp_path):
+    with pytest.raises(SystemExit) as excinfo:
+        controller.run_gitleaks_incremental(str(tmp_path), "output_test.json", str(tmp_path / "state.json"))
+    assert excinfo.value.code == 2
+
+
+def test_build_gitleaks_command_history():
+    assert controller.build_gitleaks_command("/repo", "/tmp/report.json", git_history=True, log_opts="a..b") == \
+        "gitleaks detect --report-path /tmp/report.json --source /repo --log-opts a..b"
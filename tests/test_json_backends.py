@@ -0,0 +1,100 @@
+import concurrent.futures
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import json_backends
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'output_test.json')
+
+
+@pytest.fixture(params=json_backends.available_backends())
+def backend(request):
+    """ run the test with every installed backend, then restore the automatic selection """
+    yield json_backends.select(request.param)
+    json_backends.select()
+
+
+def test_mapped_report_matches_json_load(backend):
+    with open(FIXTURE, 'r') as f:
+        expected = json.load(f)
+    assert controller.get_findings_from_output_file(FIXTURE) == expected
+
+
+def test_mapped_report_decode_error(backend, tmp_path):
+    report_path = tmp_path / "output.json"
+    report_path.write_text('[{"File": "a.py",}]')
+    with patch("controller.log_error_to_file") as mock_log_error, pytest.raises(SystemExit) as excinfo:
+        controller.get_findings_from_output_file(str(report_path))
+
+    assert excinfo.value.code == 3
+    assert mock_log_error.call_args.kwargs["error_message"].startswith("JSON decoding error: ")
+
+
+def test_backends_decode_from_several_threads(backend):
+    """ shards and batches decode their reports on worker threads at the same time """
+    with open(FIXTURE, 'rb') as f:
+        content = f.read()
+    reports = [bytes(content) for _ in range(8)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        decoded = list(executor.map(backend.loads, reports * 4))
+    assert all(findings == json.loads(content) for findings in decoded)
+
+
+def test_mapped_report_invalid_utf8(backend, tmp_path):
+    report_path = tmp_path / "output.json"
+    report_path.write_bytes(b'[{"File": "\xff.py"}]')
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.get_findings_from_output_file(str(report_path))
+    assert excinfo.value.code == 3
+
+
+def test_mapped_report_must_be_an_array(tmp_path):
+    report_path = tmp_path / "output.json"
+    report_path.write_text('{"findings": []}')
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.get_findings_from_output_file(str(report_path))
+    assert excinfo.value.code == 3
+
+
+def test_empty_report_is_a_decode_error(tmp_path):
+    """ an empty file cannot be mapped, the streaming parser reports it as before """
+    report_path = tmp_path / "output.json"
+    report_path.write_text('')
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.get_findings_from_output_file(str(report_path))
+    assert excinfo.value.code == 3
+
+
+def test_missing_report(tmp_path):
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.get_findings_from_output_file(str(tmp_path / "missing.json"))
+    assert excinfo.value.code == 2
+
+
+def test_big_reports_are_streamed():
+    with open(FIXTURE, 'r') as f:
+        expected = json.load(f)
+    with patch("controller.MMAP_DECODE_LIMIT", 16), \
+            patch("json_backends.get_backend", side_effect=AssertionError("decoded at once")):
+        assert controller.get_findings_from_output_file(FIXTURE) == expected
+
+
+def test_missing_json_backend_exits():
+    args = controller.get_parser().parse_args(['--dir', '/fake/dir', '--json_backend', 'ujson'])
+    with patch.dict(sys.modules, {"ujson": None}), \
+            patch("controller.run_gitleaks") as mock_run_gitleaks, \
+            patch("controller.log_error_to_file") as mock_log_error, \
+            pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+
+    assert excinfo.value.code == 2
+    assert "ujson" in mock_log_error.call_args.kwargs["error_message"]
+    mock_run_gitleaks.assert_not_called()
+    json_backends.select()
@@ -0,0 +1,53 @@
+import logging
+import os
+import subprocess
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import logging_setup
+
+
+def test_importing_the_controller_does_not_configure_logging(tmp_path):
+    """ library users keep their own logging config (checked in a fresh interpreter, pytest adds its own handlers) """
+    package_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    code = f"import sys, logging; sys.path.insert(0, {package_dir!r}); import controller, server; " \
+           "print(logging.getLogger().handlers)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=tmp_path)
+    assert result.stdout.strip() == "[]"
+    assert not os.listdir(tmp_path)  # no log file created either
+
+
+def test_configure_logging_writes_through_the_queue(tmp_path):
+    log_file = tmp_path / "run.log"
+    log_file.write_text("previous run\n")
+    root_level = logging.getLogger().level
+
+    pipeline = logging_setup.configure_logging("INFO", str(log_file))
+    try:
+        controller.logger.info("scan started")
+        controller.logger.debug("not logged at INFO")
+    finally:
+        pipeline.stop()
+        logging.getLogger().setLevel(root_level)
+
+    content = log_file.read_text()
+    assert "INFO - scan started" in content
+    assert "not logged at INFO" not in content
+    assert (tmp_path / "run.log.1").read_text() == "previous run\n"  # every run starts a fresh file
+    assert pipeline.queue_handler not in logging.getLogger().handlers
+
+
+def test_bounded_queue_handler_drops_records():
+    import queue
+    handler = logging_setup.BoundedQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        handler.emit(logging.makeLogRecord({"msg": f"record {i}"}))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_log_level_flag():
+    assert controller.get_parser().parse_args([]).log_level == "INFO"
+    assert controller.get_parser().parse_args(['--log-level', 'debug']).log_level == "DEBUG"
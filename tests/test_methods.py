@@ -1,4 +1,6 @@
+import io
 import json
+import shlex
 import subprocess
 
 import pytest
@@ -16,18 +18,15 @@ import controller
 def test_execute_command_success():
     """test the case where the process returns success on statuscode."""
     command = "echo Hello, World!"
-    with patch('subprocess.run') as mock_run:
-        mock_run.return_value = subprocess.CompletedProcess(args=command, returncode=0, stdout="Hello, World!",
-                                                            stderr="")
-        result = controller.execute_command(command)
-        assert result.returncode == 0
-        assert result.stdout == "Hello, World!"
+    result = controller.execute_command(command)
+    assert result.returncode == 0
+    assert result.stdout == "Hello, World!"
 
 
 def test_execute_command_failure():
     """test the case where the process returns failure on statuscode."""
     command = "exit 1"
-    with patch('subprocess.run') as mock_run:
+    with patch('subprocess.Popen') as mock_run:
         mock_run.side_effect = subprocess.CalledProcessError(returncode=1, cmd=command, output="Error")
         with pytest.raises(SystemExit) as excinfo:
             controller.execute_command(command)
@@ -39,7 +38,7 @@ def test_gitleaks_on_system():
     command = "gitleaks detect"
     file_not_found_error = FileNotFoundError("No such file or directory: 'gitleaks'")
 
-    with patch("subprocess.run", side_effect=file_not_found_error), \
+    with patch("subprocess.Popen", side_effect=file_not_found_error), \
             patch("controller.log_error_to_file") as mock_log_error, \
             patch("sys.exit") as mock_exit:
         controller.execute_command(command)
@@ -82,6 +81,7 @@ def test_manipulated_output():
         _current_dir_=tests_dirpath,
         __output_filename__=real_output_filename
     )
+    manipulated_output['findings'] = list(manipulated_output['findings'])  # the findings are streamed lazily
     # Step 4: Compare manipulated output with expected manipulated output
     with open(manipulated_output_filepath, 'r') as manipulated_output_file:
         expected_manipulated_output = json.load(manipulated_output_file)
@@ -114,6 +114,9 @@ def test_get_parser_defaults():
     assert args.output_filename == "output_test.json"
     assert args.show_result is True
     assert args.bonus is True
+    assert args.validate is False
+    assert args.dirnames is None
+    assert args.manifest is None
 
 
 def test_get_parser_custom_args():
@@ -142,11 +145,7 @@ def test_get_parser_invalid_args():
 
 def test_main_success():
     """testing the main method """
-    mock_args = MagicMock()
-    mock_args.dirname = "/fake/dir"
-    mock_args.output_filename = "output.json"
-    mock_args.show_result = True
-    mock_args.bonus = True
+    mock_args = controller.get_parser().parse_args(['--dir', '/fake/dir', '--output_filename', 'output.json'])
 
     with patch("controller.run_gitleaks") as mock_run_gitleaks, \
             patch("controller.parse_json_output") as mock_parse_json_output, \
@@ -156,16 +155,17 @@ def test_main_success():
 
         controller.main(mock_args)
 
-        mock_run_gitleaks.assert_called_once_with("/fake/dir", "output.json")
-        mock_parse_json_output.assert_called_once_with("/fake/dir", "output.json")
-        mock_show_results.assert_called_once_with({"findings": []}, bonus=True)
+        mock_run_gitleaks.assert_called_once_with("/fake/dir", "output.json", config_path=None)
+        mock_parse_json_output.assert_called_once_with("/fake/dir", "output.json", output_format="json",
+                                                       custom_output_dir=None, baseline=None, summary=None,
+                                                       triage=None)
+        mock_show_results.assert_called_once_with({"findings": []}, bonus=True, validate=False,
+                                                  page_size=None, page=1)
 
 
 def test_main_clean_outputfile_exception():
     """if the outputfile isn't cleared properly, we want to see and test it """
-    mock_args = MagicMock()
-    mock_args.dirname = "/fake/dir"
-    mock_args.output_filename = "output.json"
+    mock_args = controller.get_parser().parse_args(['--dir', '/fake/dir', '--output_filename', 'output.json'])
 
     with patch("controller.clean_outputfile", side_effect=Exception("Clean error")), \
             patch("controller.log_error_to_file") as mock_log_error, \
@@ -191,3 +191,176 @@ def test_get_findings_from_corrupted_file():
         )
 
         mock_exit.assert_called_once_with(3)
+
+
+def test_iter_json_array_small_chunks():
+    """ the incremental parser must give the same result as json.load, even when elements span many chunks """
+    tests_dirpath = os.path.join(os.getcwd(), 'tests')
+    real_output_filepath = os.path.join(tests_dirpath, "output_test.json")
+    with open(real_output_filepath, 'r') as real_output_file:
+        expected = json.load(real_output_file)
+    with open(real_output_filepath, 'r') as real_output_file:
+        assert list(controller.iter_json_array(real_output_file, chunk_size=7)) == expected
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("[]", []),
+    ("  [ ]\n", []),
+    ("[1, 22, 333]", [1, 22, 333]),
+    ('[{"a": "]"}, {"b": [1, 2]}]', [{"a": "]"}, {"b": [1, 2]}]),
+])
+def test_iter_json_array_valid(content, expected):
+    assert list(controller.iter_json_array(io.StringIO(content), chunk_size=2)) == expected
+
+
+@pytest.mark.parametrize("content", ["", "{}", "[1 2]", "[1,", "[1] x", '[{"a": 1}'])
+def test_iter_json_array_invalid(content):
+    with pytest.raises(json.JSONDecodeError):
+        list(controller.iter_json_array(io.StringIO(content), chunk_size=3))
+
+
+def test_iter_json_array_error_position():
+    """ decode errors must point to the position inside the whole document """
+    content = '[\n {"a": 1},\n {"b": 2},\n {"c": }\n]'
+    with pytest.raises(json.JSONDecodeError) as excinfo:
+        list(controller.iter_json_array(io.StringIO(content), chunk_size=4))
+    with pytest.raises(json.JSONDecodeError) as expected:
+        json.loads(content)
+    assert str(excinfo.value) == str(expected.value)
+
+
+def test_parse_json_output_is_lazy(tmp_path):
+    """ nothing is written until the findings stream is consumed, and the written file matches json.dump """
+    with open(os.path.join(os.getcwd(), 'tests', 'output_test.json'), 'r') as f:
+        raw = f.read()
+    (tmp_path / "output_test.json").write_text(raw)
+
+    custom_output = controller.parse_json_output(str(tmp_path), "output_test.json")
+    assert not (tmp_path / controller.CUSTOM_OUTPUT_FILENAME).exists()
+
+    count = controller.consume_findings(custom_output)
+    written = (tmp_path / controller.CUSTOM_OUTPUT_FILENAME).read_text()
+    assert count == len(json.loads(raw))
+    assert written == json.dumps({"findings": list(controller.transform_findings(json.loads(raw)))}, indent=4)
+
+
+def test_write_custom_output_empty(tmp_path):
+    custom_output_filepath = tmp_path / "custom.json"
+    assert list(controller.write_custom_output(iter(()), custom_output_filepath)) == []
+    assert custom_output_filepath.read_text() == json.dumps({"findings": []}, indent=4)
+
+
+def test_main_no_show_result_consumes_findings():
+    """ with --no-show_result the findings stream is still drained, so the custom output gets written """
+    mock_args = controller.get_parser().parse_args(['--dir', '/fake/dir', '--output_filename', 'output.json',
+                                                    '--no-show_result'])
+
+    with patch("controller.clean_outputfile"), \
+            patch("controller.run_gitleaks"), \
+            patch("controller.parse_json_output", return_value={"findings": iter([{}, {}])}), \
+            patch("controller.show_results") as mock_show_results, \
+            patch("controller.consume_findings") as mock_consume_findings:
+        controller.main(mock_args)
+
+        mock_show_results.assert_not_called()
+        mock_consume_findings.assert_called_once()
+
+
+def test_get_parser_repeated_dir():
+    """ --dir can be repeated, the first directory stays in `dirname` """
+    args = controller.get_parser().parse_args(['--dir', '/a', '--dir', '/b', '--jobs', '3'])
+
+    assert args.dirname == '/a'
+    assert args.dirnames == ['/a', '/b']
+    assert args.jobs == 3
+
+
+def test_get_scan_directories_with_manifest(tmp_path):
+    """ the manifest replaces the default directory, comments and duplicates are ignored """
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# nightly targets\nrepo_a\n\nrepo_b\nrepo_a\n")
+
+    args = controller.get_parser().parse_args(['--manifest', str(manifest)])
+    assert controller.get_scan_directories(args) == [str(tmp_path / "repo_a"), str(tmp_path / "repo_b")]
+
+    args = controller.get_parser().parse_args(['--dir', '/x', '--manifest', str(manifest)])
+    assert controller.get_scan_directories(args) == ['/x', str(tmp_path / "repo_a"), str(tmp_path / "repo_b")]
+
+
+def test_read_manifest_missing_file():
+    with pytest.raises(SystemExit) as excinfo:
+        controller.read_manifest("non_existent_manifest.txt")
+    assert excinfo.value.code == 2
+
+
+def _fake_scan(report):
+    """ returns a scan_directory replacement that writes `report` as the Gitleaks report of the directory """
+    def scan(dirname, output_filename, config_path=None):
+        with open(os.path.join(dirname, output_filename), 'w') as f:
+            json.dump(report, f)
+        return tests_utils.mock_process(returncode=1)
+    return scan
+
+
+def test_scan_directories_merges_reports(tmp_path):
+    """ every directory is scanned with its own report, and the reports are merged into the combined output """
+    with open(os.path.join(os.getcwd(), 'tests', 'output_test.json'), 'r') as f:
+        report = json.load(f)
+    dirnames = [str(tmp_path / name) for name in ("a", "b", "c")]
+    for dirname in dirnames:
+        os.mkdir(dirname)
+    combined_output_filepath = str(tmp_path / "combined.json")
+
+    with patch("controller.scan_directory", side_effect=_fake_scan(report)) as mock_scan_directory:
+        custom_output = controller.scan_directories(dirnames, "output_test.json", 2, combined_output_filepath)
+        findings = list(custom_output['findings'])
+
+    assert mock_scan_directory.call_count == 3
+    assert findings == list(controller.transform_findings(report * 3))
+    with open(combined_output_filepath, 'r') as f:
+        assert json.load(f) == {"findings": findings}
+
+
+def test_scan_directories_missing_directory(tmp_path):
+    with patch("controller.scan_directory") as mock_scan_directory, pytest.raises(SystemExit) as excinfo:
+        controller.scan_directories([str(tmp_path), "/non/existent"], "output_test.json", 2, "combined.json")
+    assert excinfo.value.code == 2
+    mock_scan_directory.assert_not_called()
+
+
+def test_main_multiple_directories():
+    args = controller.get_parser().parse_args(['--dir', '/a', '--dir', '/b', '--jobs', '4', '--no-show_result'])
+
+    with patch("controller.scan_directories", return_value={"findings": iter([])}) as mock_scan_directories, \
+            patch("controller.run_gitleaks") as mock_run_gitleaks:
+        controller.main(args)
+
+        mock_scan_directories.assert_called_once_with(['/a', '/b'], "output_test.json", 4, args.combined_output,
+                                                      config_path=None, output_format="json", baseline=None,
+                                                      summary=None, batch_size=1,
+                                                      batch_max_bytes=controller.BATCH_MAX_BYTES, triage=None)
+        mock_run_gitleaks.assert_not_called()
+
+
+@pytest.mark.parametrize("flag", [['--git'], ['--cache'], ['--shards', '2']])
+def test_main_multiple_directories_rejects_single_directory_modes(flag):
+    args = controller.get_parser().parse_args(['--dir', '/a', '--dir', '/b', *flag])
+    with patch("controller.scan_directories") as mock_scan_directories, \
+            patch("controller.log_error_to_file") as mock_log_error, pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
+    assert "single directory" in mock_log_error.call_args.kwargs['error_message']
+    mock_scan_directories.assert_not_called()
+
+
+def test_execute_command_streams_bounded_output():
+    """ the output is logged line by line (truncated and capped), only its tail is kept in memory """
+    command = f"{shlex.quote(sys.executable)} -c \"[print(i) for i in range(30)]; print('x' * 50)\""
+    with patch("controller.MAX_LOGGED_LINES", 5), patch("controller.MAX_LOGGED_LINE_LENGTH", 10), \
+            patch.object(controller.logger, "isEnabledFor", return_value=True), \
+            patch("controller.logger.debug") as mock_debug:
+        result = controller.execute_command(command, tail_size=2)
+
+    assert result.stdout == "29\n" + "x" * 10 + "... (40 characters truncated)"
+    logged = [call.args[0] for call in mock_debug.call_args_list]
+    assert logged == [f"stdout: {i}" for i in range(5)] + ["stdout: 26 more lines were not logged"]
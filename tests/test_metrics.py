@@ -0,0 +1,113 @@
+import concurrent.futures
+import json
+import os
+import pstats
+import shutil
+import sys
+import time
+from unittest.mock import patch
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import metrics
+
+
+def _slow_stream(count, delay):
+    for i in range(count):
+        time.sleep(delay)
+        yield i
+
+
+def test_nested_stages_report_their_own_time():
+    """ a stage pulling from a slower upstream stream only reports its own time """
+    recorder = metrics.Metrics()
+    with recorder.stage("printing"):
+        for _ in recorder.timed("reading", _slow_stream(5, 0.04)):
+            time.sleep(0.002)
+
+    reading, printing = recorder.stages["reading"], recorder.stages["printing"]
+    assert reading["findings"] == 5
+    assert reading["wall_seconds"] >= 0.2 and printing["wall_seconds"] >= 0.01  # sleeps never return early
+    assert printing["wall_seconds"] < reading["wall_seconds"]  # would be more if it included the reading time
+    assert printing["calls"] == 1
+
+
+def test_parallel_stages_are_counted_exactly():
+    recorder = metrics.Metrics()
+
+    def scan(_):
+        for _ in range(500):
+            with recorder.stage("gitleaks"):
+                pass
+        for _ in recorder.timed("read_report", range(500)):
+            pass
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(scan, range(8)))
+    assert recorder.stages["gitleaks"]["calls"] == 4000
+    assert recorder.stages["read_report"]["calls"] == 8
+    assert recorder.stages["read_report"]["findings"] == 4000
+
+
+def test_timed_counts_a_stream_stopped_early():
+    recorder = metrics.Metrics()
+    stream = recorder.timed("reading", range(10))
+    assert [next(stream) for _ in range(3)] == [0, 1, 2]
+    stream.close()
+    assert recorder.stages["reading"]["findings"] == 3
+
+
+def test_null_metrics_is_transparent():
+    stream = iter([1, 2])
+    assert metrics.timed("stage", stream) is stream
+    with metrics.stage("stage"):
+        metrics.add("stage", bytes_read=10)
+
+
+def test_prometheus_format():
+    recorder = metrics.Metrics()
+    recorder.add("read_report", bytes_read=42)
+    text = recorder.to_prometheus()
+    assert '# TYPE gitleaks_controller_stage_bytes_read gauge' in text
+    assert 'gitleaks_controller_stage_bytes_read{stage="read_report"} 42' in text
+
+
+def _run_main(tmp_path, extra_args):
+    scan_dir = tmp_path / "scan"
+    scan_dir.mkdir()
+    report = os.path.join(os.getcwd(), 'tests', 'output_test.json')
+
+    def fake_run_gitleaks(directory_to_scan, output_file, **kwargs):
+        shutil.copy(report, os.path.join(directory_to_scan, output_file))
+        return tests_utils.mock_process(returncode=1)
+
+    args = controller.get_parser().parse_args(['--dir', str(scan_dir), '--no-show_result'] + extra_args)
+    with patch("controller.run_gitleaks", side_effect=fake_run_gitleaks):
+        controller.main(args)
+    return report
+
+
+def test_main_writes_json_metrics(tmp_path):
+    metrics_path = tmp_path / "metrics.json"
+    report = _run_main(tmp_path, ['--metrics-out', str(metrics_path)])
+
+    with open(metrics_path, 'r') as f:
+        stages = json.load(f)["stages"]
+    with open(report, 'r') as f:
+        count = len(json.load(f))
+    assert stages["read_report"]["bytes_read"] == os.path.getsize(report)
+    assert stages["read_report"]["findings"] == count
+    assert stages["transform"]["findings"] == count
+    assert stages["custom_output"]["bytes_written"] == os.path.getsize(tmp_path / "scan" / "custom_output_test.json")
+    assert isinstance(metrics._current, metrics.NullMetrics)  # disabled again after the run
+
+
+def test_main_writes_prometheus_metrics_and_profile(tmp_path):
+    metrics_path, profile_path = tmp_path / "metrics.prom", tmp_path / "run.prof"
+    _run_main(tmp_path, ['--metrics_out', str(metrics_path), '--profile', str(profile_path)])
+
+    assert 'gitleaks_controller_stage_findings{stage="transform"}' in metrics_path.read_text()
+    assert pstats.Stats(str(profile_path)).total_calls > 0
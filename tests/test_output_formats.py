@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import output_formats
+
+
+def _write_fixture(tmp_path):
+    with open(os.path.join(os.getcwd(), 'tests', 'output_test.json'), 'r') as f:
+        raw = f.read()
+    (tmp_path / "output_test.json").write_text(raw)
+    return list(controller.transform_findings(json.loads(raw)))
+
+
+def _parse(tmp_path, output_format):
+    custom_output = controller.parse_json_output(str(tmp_path), "output_test.json", output_format=output_format)
+    return controller.consume_findings(custom_output)
+
+
+def test_with_format_extension():
+    assert output_formats.with_format_extension("custom_output_test.json", "ndjson") == "custom_output_test.ndjson"
+    assert output_formats.with_format_extension("custom_output_test.json", "json") == "custom_output_test.json"
+    assert output_formats.with_format_extension("/out/findings.dat", "csv") == "/out/findings.dat"
+
+
+def test_ndjson_output(tmp_path):
+    expected = _write_fixture(tmp_path)
+    assert _parse(tmp_path, "ndjson") == len(expected)
+
+    lines = (tmp_path / "custom_output_test.ndjson").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == expected
+    assert not (tmp_path / "custom_output_test.json").exists()
+
+
+def test_csv_output(tmp_path):
+    expected = _write_fixture(tmp_path)
+    _parse(tmp_path, "csv")
+
+    with open(tmp_path / "custom_output_test.csv", newline='') as f:
+        assert list(csv.DictReader(f)) == expected
+
+
+def test_csv_output_extra_columns(tmp_path):
+    """ the columns added by the enabled stages (here the baseline) are kept """
+    findings = [{"filename": "a.py", "line_range": "1-1", "description": "AWS", "fingerprint": "00ff",
+                 "status": "new"},
+                {"filename": "b.py", "line_range": "2-3", "description": "AWS", "fingerprint": "0a0b",
+                 "status": "resolved"}]
+    path = str(tmp_path / "findings.csv")
+    controller._drain(controller.write_custom_output(findings, path, "csv"))
+
+    with open(path, newline='') as f:
+        assert f.readline() == "filename,line_range,description,fingerprint,status\r\n"
+        f.seek(0)
+        assert list(csv.DictReader(f)) == findings
+
+
+def test_msgpack_output(tmp_path):
+    msgpack = pytest.importorskip("msgpack")
+    expected = _write_fixture(tmp_path)
+    _parse(tmp_path, "msgpack")
+
+    with open(tmp_path / "custom_output_test.msgpack", 'rb') as f:
+        assert list(msgpack.Unpacker(f)) == expected
+
+
+def test_empty_outputs(tmp_path):
+    (tmp_path / "output_test.json").write_text("[]")
+    for output_format in ("ndjson", "csv"):
+        assert _parse(tmp_path, output_format) == 0
+    assert (tmp_path / "custom_output_test.ndjson").read_text() == ""
+    assert (tmp_path / "custom_output_test.csv").read_bytes() == b"filename,line_range,description\r\n"
+
+
+def test_main_without_msgpack_exits_before_scanning():
+    args = controller.get_parser().parse_args(['--dir', '/fake/dir', '--format', 'msgpack'])
+    with patch.dict(sys.modules, {"msgpack": None}), \
+            patch("controller.run_gitleaks") as mock_run_gitleaks, \
+            patch("controller.log_error_to_file") as mock_log_error, \
+            pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+
+    assert excinfo.value.code == 2
+    assert "msgpack" in mock_log_error.call_args.kwargs["error_message"]
+    mock_run_gitleaks.assert_not_called()
+
+
+def test_combined_output_format(tmp_path):
+    """ the default combined output path follows the selected format """
+    expected = _write_fixture(tmp_path)
+    with patch("controller.scan_directory", return_value=tests_utils.mock_process(returncode=1)):
+        custom_output = controller.scan_directories([str(tmp_path), str(tmp_path)], "output_test.json", 2,
+                                                    str(tmp_path / "combined.json"), output_format="ndjson")
+        controller.consume_findings(custom_output)
+
+    lines = (tmp_path / "combined.ndjson").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == expected * 2
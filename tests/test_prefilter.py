@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import prefilter
+import staging
+
+TREE = {
+    "app.py": "token = SECRET\n",
+    "empty.txt": "",
+    "big.log": "x" * 5000,
+    "node_modules/lib/index.js": "SECRET\n",
+    "src/config.yml": "SECRET\n",
+    "src/build/out.js": "SECRET\n",
+    "docs/notes.tmp": "SECRET\n",
+}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    tests_utils.make_tree(str(root), TREE)
+    with open(root / "src" / "image.png", 'wb') as f:
+        f.write(b"\x89PNG\r\n\x1a\n\0\0SECRET")
+    return root
+
+
+@pytest.mark.parametrize("patterns, path, is_dir, ignored", [
+    (["*.tmp"], "docs/notes.tmp", False, True),
+    (["*.tmp", "!keep.tmp"], "docs/keep.tmp", False, False),
+    (["/build/"], "src/build", True, False),
+    (["build/"], "src/build", True, True),
+    (["build/"], "src/build", False, False),
+    (["src/*.yml"], "src/config.yml", False, True),
+    (["src/*.yml"], "other/src/config.yml", False, False),
+    (["**/dist"], "a/b/dist", True, True),
+    (["docs/**"], "docs/a/b.md", False, True),
+    (["file[0-9].txt"], "file7.txt", False, True),
+    (["# comment", ""], "# comment", False, False),
+])
+def test_ignore_rules(patterns, path, is_dir, ignored):
+    assert prefilter.IgnoreRules(patterns).ignored(path, is_dir=is_dir) is ignored
+
+
+def test_prefilter_tree(tree):
+    rules = prefilter.IgnoreRules([*prefilter.DEFAULT_EXCLUDES, "build/", "*.tmp"])
+    result = prefilter.prefilter_tree(str(tree), rules, max_file_size=1000, jobs=4)
+
+    assert result.files == [str(tree / "app.py"), str(tree / "src" / "config.yml")]
+    assert result.kept_bytes == len(TREE["app.py"]) + len(TREE["src/config.yml"])
+    assert result.skipped == {"ignored": [1, len(TREE["docs/notes.tmp"])], "too_large": [1, 5000],
+                              "binary": [1, 16], "empty": [1, 0]}
+    assert result.pruned_dirs == 2  # node_modules and src/build, never walked
+    assert result.skipped_files == 4 and result.skipped_bytes == 5000 + 16 + len(TREE["docs/notes.tmp"])
+    assert "kept 2 files" in result.summary()
+
+
+def test_prefilter_tree_defaults_only_prune_node_modules(tree):
+    result = prefilter.prefilter_tree(str(tree), skip_binary=False)
+    assert str(tree / "src" / "image.png") in result.files
+    assert not any("node_modules" in path for path in result.files)
+
+
+@pytest.mark.parametrize("value, size", [("100", 100), ("10K", 10240), ("2m", 2 * 1024 ** 2), ("1GiB", 1024 ** 3)])
+def test_file_size(value, size):
+    assert prefilter.file_size(value) == size
+
+
+def test_run_gitleaks_prefiltered(tree):
+    scanned = []
+
+    def fake_run_gitleaks(directory_to_scan, output_file, report_path=None, **kwargs):
+        scanned.extend(sorted(os.path.relpath(os.path.join(d, f), directory_to_scan)
+                              for d, _, files in os.walk(directory_to_scan) for f in files))
+        return tests_utils.fake_run_gitleaks(directory_to_scan, output_file, report_path=report_path)
+
+    args = controller.get_parser().parse_args(['--dir', str(tree), '--prefilter', '--exclude', 'build/',
+                                               '--exclude', '*.tmp', '--max_file_size', '1K'])
+    with patch("controller.run_gitleaks", side_effect=fake_run_gitleaks):
+        process = controller.run_gitleaks_prefiltered(str(tree), "output_test.json", controller.get_ignore_rules(args),
+                                                      args.max_file_size, args.skip_binary)
+
+    assert process.returncode == 1
+    assert scanned == ["app.py", os.path.join("src", "config.yml")]
+    with open(tree / "output_test.json", 'r') as f:
+        report = json.load(f)
+    assert [finding["File"] for finding in report] == [str(tree / "app.py"), str(tree / "src" / "config.yml")]
+
+
+def test_run_gitleaks_prefiltered_stages_in_the_tree_on_demand(tree):
+    """ a temp directory on another filesystem (a docker volume), with --stage_in_tree: staged in the tree,
+    still hard linked """
+    staged = {}
+
+    def fake_run_gitleaks(directory_to_scan, output_file, report_path=None, **kwargs):
+        staged.update((f, os.path.join(d, f)) for d, _, files in os.walk(directory_to_scan) for f in files)
+        assert os.path.samefile(staged["app.py"], tree / "app.py")
+        return tests_utils.fake_run_gitleaks(directory_to_scan, output_file, report_path=report_path)
+
+    with patch("staging.same_device", return_value=False), patch("staging._stage_in_tree", True), \
+            patch("controller.run_gitleaks", side_effect=fake_run_gitleaks):
+        process = controller.run_gitleaks_prefiltered(str(tree), "output_test.json", prefilter.IgnoreRules(()))
+
+    assert process.returncode == 1
+    assert os.path.basename(os.path.dirname(os.path.dirname(staged["app.py"]))).startswith(staging.SCRATCH_PREFIX)
+    assert not [name for name in os.listdir(tree) if name.startswith(staging.SCRATCH_PREFIX)]
+
+
+def test_scratch_directory_stays_out_of_the_tree_by_default(tree):
+    with patch("staging.same_device", return_value=False), \
+            staging.scratch_directory(str(tree), 'gitleaks-test-') as scratch_dir:
+        assert not scratch_dir.startswith(str(tree))
+        assert os.path.dirname(scratch_dir) == tempfile.gettempdir()
+
+
+def test_stage_files_warns_when_copying(tree, tmp_path, caplog):
+    files = [str(tree / "app.py"), str(tree / "src" / "config.yml")]
+    with patch("staging.os.link", side_effect=OSError("Invalid cross-device link")):
+        assert staging.stage_files(files, str(tree), str(tmp_path / "staging")) == 2
+    assert (tmp_path / "staging" / "src" / "config.yml").read_text() == TREE["src/config.yml"]
+    assert "2 files (22 bytes)" in caplog.text and "copied" in caplog.text
+
+    caplog.clear()
+    assert staging.stage_files(files, str(tree), str(tmp_path / "linked")) == 0
+    assert not caplog.text
+
+
+def test_main_with_prefilter(tree):
+    args = controller.get_parser().parse_args(['--dir', str(tree), '--prefilter', '--no-show_result'])
+    with patch("controller.run_gitleaks_prefiltered", return_value=tests_utils.mock_process()) as mock_prefiltered, \
+            patch("controller.parse_json_output", return_value={"findings": iter([])}):
+        controller.main(args)
+    assert mock_prefiltered.call_args.args[3:] == (None, True, None)
+
+
+def test_main_with_prefilter_failure(tree):
+    args = controller.get_parser().parse_args(['--dir', str(tree), '--prefilter'])
+    with patch("controller.run_gitleaks", return_value=tests_utils.mock_process(returncode=2, stderr="boom")), \
+            patch("controller.parse_json_output") as mock_parse, pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
+    mock_parse.assert_not_called()
+
+
+def test_prefilter_rejects_other_modes():
+    args = controller.get_parser().parse_args(['--dir', '/a', '--prefilter', '--cache'])
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
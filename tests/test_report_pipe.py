@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import bench_pipeline
+import controller
+import synthetic
+
+FINDINGS = 25
+
+
+@pytest.fixture(autouse=True)
+def fake_gitleaks_findings(monkeypatch):
+    """ the number of findings written by bench_pipeline's fake Gitleaks """
+    monkeypatch.setenv("FAKE_GITLEAKS_FINDINGS", str(FINDINGS))
+
+
+def _expected():
+    return list(controller.transform_findings(synthetic.iter_findings(FINDINGS)))
+
+
+@pytest.mark.parametrize("report_path", ["-", "/dev/stdout"])
+def test_report_through_stdout(tmp_path, gitleaks_bin, report_path):
+    bench_pipeline.install_fake_gitleaks(str(gitleaks_bin))
+    scan_dir, output_dir = tests_utils.make_scan_dir(tmp_path), tmp_path / "out"
+    output_dir.mkdir()
+
+    custom_output = controller.stream_json_output(str(scan_dir), report_path, custom_output_dir=str(output_dir))
+    assert list(custom_output['findings']) == _expected()
+    assert os.listdir(scan_dir) == []  # nothing written into the scanned tree
+    with open(output_dir / controller.CUSTOM_OUTPUT_FILENAME, 'r') as f:
+        assert json.load(f) == {"findings": _expected()}
+
+
+def test_report_through_fifo(tmp_path, gitleaks_bin):
+    bench_pipeline.install_fake_gitleaks(str(gitleaks_bin))
+    fifo_path = str(tmp_path / "report.fifo")
+    os.mkfifo(fifo_path)
+
+    assert controller.is_report_pipe(fifo_path)
+    findings = controller.iter_gitleaks_report(str(tests_utils.make_scan_dir(tmp_path)), fifo_path)
+    assert list(controller.transform_findings(findings)) == _expected()
+
+
+def test_findings_are_parsed_while_the_report_is_written(tmp_path, gitleaks_bin):
+    finding = json.dumps(synthetic.make_finding(0))
+    tests_utils.install_gitleaks_script(gitleaks_bin,
+                                        f"printf '[%s,' '{finding}'\nsleep 2\nprintf '%s]' '{finding}'\nexit 1")
+
+    start = time.monotonic()
+    findings = controller.iter_gitleaks_report(str(tests_utils.make_scan_dir(tmp_path)), "-")
+    first = next(findings)
+    assert time.monotonic() - start < 1.5
+    assert list(findings) == [first]
+
+
+@pytest.mark.parametrize("use_fifo", [False, True])
+def test_gitleaks_failure_exits_with_its_code(tmp_path, gitleaks_bin, use_fifo):
+    """ the FIFO reader must not wait forever for a Gitleaks that never opened its report """
+    tests_utils.install_gitleaks_script(gitleaks_bin, "echo 'invalid config' >&2\nexit 126")
+    report_path = "-"
+    if use_fifo:
+        report_path = str(tmp_path / "report.fifo")
+        os.mkfifo(report_path)
+
+    with patch("controller.log_error_to_file") as mock_log_error, pytest.raises(SystemExit) as excinfo:
+        list(controller.iter_gitleaks_report(str(tests_utils.make_scan_dir(tmp_path)), report_path))
+    assert excinfo.value.code == 126
+    mock_log_error.assert_called_once_with(exit_code=126, error_message="invalid config")
+
+
+def test_invalid_report_exits_with_3(tmp_path, gitleaks_bin):
+    tests_utils.install_gitleaks_script(gitleaks_bin, "echo 'not json'\nexit 1")
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        list(controller.iter_gitleaks_report(str(tests_utils.make_scan_dir(tmp_path)), "-"))
+    assert excinfo.value.code == 3
+
+
+def test_stopping_early_kills_gitleaks(tmp_path, gitleaks_bin):
+    finding = json.dumps(synthetic.make_finding(0))
+    tests_utils.install_gitleaks_script(gitleaks_bin, f"printf '[%s,' '{finding}'\nexec sleep 30")
+
+    start = time.monotonic()
+    findings = controller.iter_gitleaks_report(str(tests_utils.make_scan_dir(tmp_path)), "-")
+    next(findings)
+    findings.close()
+    assert time.monotonic() - start < 10
+
+
+def test_main_with_piped_report(tmp_path, gitleaks_bin, monkeypatch):
+    bench_pipeline.install_fake_gitleaks(str(gitleaks_bin))
+    scan_dir = tests_utils.make_scan_dir(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    args = controller.get_parser().parse_args(['--dir', str(scan_dir), '--report-path', '-', '--format', 'ndjson',
+                                               '--no-show_result'])
+    controller.main(args)
+
+    assert os.listdir(scan_dir) == []
+    with open(tmp_path / "custom_output_test.ndjson", 'r') as f:
+        assert [json.loads(line) for line in f] == _expected()
+
+
+def test_main_with_report_path_outside_the_scanned_directory(tmp_path):
+    report_path = str(tmp_path / "report.json")
+    args = controller.get_parser().parse_args(['--dir', '/fake/dir', '--report_path', report_path,
+                                               '--custom_output_dir', str(tmp_path)])
+    with patch("controller.clean_outputfile") as mock_clean, \
+            patch("controller.run_gitleaks") as mock_run_gitleaks, \
+            patch("controller.parse_json_output", return_value={"findings": []}) as mock_parse_json_output, \
+            patch("controller.show_results"):
+        controller.main(args)
+
+    mock_clean.assert_called_once_with(report_path)
+    mock_run_gitleaks.assert_called_once_with("/fake/dir", report_path, config_path=None)
+    mock_parse_json_output.assert_called_once_with("/fake/dir", report_path, output_format="json",
+                                                   custom_output_dir=str(tmp_path), baseline=None, summary=None,
+                                                   triage=None)
+
+
+def test_report_path_rejects_other_modes():
+    args = controller.get_parser().parse_args(['--dir', '/a', '--report-path', '-', '--shards', '2'])
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
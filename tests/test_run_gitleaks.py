@@ -1,3 +1,4 @@
+import json
 import sys
 from unittest.mock import patch
 
@@ -86,3 +87,161 @@ def test_run_gitleaks_execution_error():
             exit_code=2,
             error_message="General error"
         )
+
+
+def _sharding_tree(root):
+    tests_utils.make_tree(root, {
+        "big/a.txt": "x" * 4000 + "\nSECRET\n",
+        "big/nested/b.txt": "SECRET\n" + "y" * 3000,
+        "big/nested/c.txt": "z" * 3000 + "\nSECRET",
+        "small/d.txt": "SECRET SECRET\n",
+        "e.txt": "nothing here\n",
+        "f.txt": "line\nSECRET\n",
+        "empty/g.txt": "",
+    })
+
+
+def test_plan_shards_covers_every_file(tmp_path):
+    """ the shard units must cover every non-empty file exactly once """
+    _sharding_tree(str(tmp_path))
+    units, shards = controller.plan_shards(str(tmp_path), 4)
+
+    covered = []
+    for _, source in units:
+        covered.extend(source if isinstance(source, list) else
+                       [os.path.join(d, f) for d, _, files in os.walk(source) for f in files])
+    expected = [os.path.join(d, f) for d, _, files in os.walk(str(tmp_path)) for f in files
+                if os.path.getsize(os.path.join(d, f))]
+    assert shards == 4
+    assert sorted(covered) == sorted(expected)
+    assert [size for size, _ in units] == sorted((size for size, _ in units), reverse=True)
+
+
+def test_run_gitleaks_sharded_matches_single_scan(tmp_path):
+    """ a sharded scan gives the same findings (and paths) as a single Gitleaks process """
+    root = str(tmp_path / "tree")
+    _sharding_tree(root)
+    expected = tests_utils.fake_gitleaks_findings(root)
+
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks) as mock_run_gitleaks:
+        process = controller.run_gitleaks_sharded(root, "output_test.json", 3)
+
+    assert mock_run_gitleaks.call_count == 3  # exactly one Gitleaks process per shard
+    assert process.returncode == 1
+    with open(os.path.join(root, "output_test.json"), 'r') as f:
+        merged = json.load(f)
+    assert sorted(merged, key=controller.finding_key) == sorted(expected, key=controller.finding_key)
+
+
+def test_pack_shards():
+    units = [(size, f"/tree/pkg{size}") for size in (50, 40, 30, 20, 10, 10)]
+    assert controller.pack_shards(units, 2) == [(80, ["/tree/pkg50", "/tree/pkg20", "/tree/pkg10"]),
+                                                (80, ["/tree/pkg40", "/tree/pkg30", "/tree/pkg10"])]
+    assert len(controller.pack_shards(units[:1], 4)) == 1
+
+
+def test_run_gitleaks_sharded_many_packages(tmp_path):
+    """ 20 top-level packages and --shards 4: 4 Gitleaks runs, not one per package """
+    root = str(tmp_path / "tree")
+    tests_utils.make_tree(root, {f"pkg{index}/mod.py": f"{'x' * index * 10}\nSECRET\n" for index in range(20)})
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks) as mock_run_gitleaks:
+        controller.run_gitleaks_sharded(root, "output_test.json", 4)
+    assert mock_run_gitleaks.call_count == 4
+    with open(os.path.join(root, "output_test.json"), 'r') as f:
+        assert len(json.load(f)) == 20
+
+
+def test_run_gitleaks_sharded_single_shard(tmp_path):
+    root = str(tmp_path / "tree")
+    _sharding_tree(root)
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks) as mock_run_gitleaks:
+        controller.run_gitleaks_sharded(root, "output_test.json", controller.SHARDS_AUTO)  # a tiny tree
+    mock_run_gitleaks.assert_called_once_with(root, "output_test.json", config_path=None)
+
+
+def test_run_gitleaks_sharded_failure(tmp_path):
+    """ the Gitleaks error is kept, the missing shard report is not read """
+    root = str(tmp_path / "tree")
+    _sharding_tree(root)
+    failed = tests_utils.mock_process(returncode=2, stderr="bad config")
+    with patch("controller.run_gitleaks", return_value=failed), \
+            patch("controller.log_error_to_file") as mock_log_error:
+        assert controller.run_gitleaks_sharded(root, "output_test.json", 3) is failed
+    mock_log_error.assert_not_called()
+
+    args = controller.get_parser().parse_args(['--dir', root, '--shards', '3'])
+    with patch("controller.run_gitleaks", return_value=failed), \
+            patch("controller.parse_json_output") as mock_parse, pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
+    mock_parse.assert_not_called()
+
+
+def test_deduplicate_findings():
+    finding = tests_utils.fake_gitleaks_findings(os.path.join(os.getcwd(), 'tests', 'README.md'), marker="test")[0]
+    assert list(controller.deduplicate_findings([finding, dict(finding), finding])) == [finding]
+
+
+def test_shard_count():
+    assert controller.shard_count('auto') == controller.SHARDS_AUTO
+    assert controller.shard_count('8') == 8
+    with pytest.raises(controller.argparse.ArgumentTypeError):
+        controller.shard_count('0')
+    with pytest.raises(SystemExit) as excinfo:
+        controller.get_parser().parse_args(['--shards', 'many'])
+    assert excinfo.value.code == 2
+
+
+def _batch_targets(root, count):
+    dirnames = []
+    for index in range(count):
+        dirname = os.path.join(root, f"package{index}")
+        tests_utils.make_tree(dirname, {"src/a.py": "x = 1\n" * index + "SECRET\n", "b.txt": "SECRET SECRET\n"})
+        dirnames.append(dirname)
+    return dirnames
+
+
+def test_plan_batches(tmp_path):
+    dirnames = _batch_targets(str(tmp_path), 5)
+    big = os.path.join(str(tmp_path), "big")
+    tests_utils.make_tree(big, {"big.txt": "x" * 5000})
+
+    batches = controller.plan_batches([big, *dirnames], batch_size=2, max_bytes=1000)
+    assert batches == [dirnames[:2], dirnames[2:4], [dirnames[4]], [big]]  # smallest first, big on its own
+
+
+def test_scan_batch_splits_the_report(tmp_path):
+    """ every directory of a batch gets the report a scan of its own would have given """
+    dirnames = _batch_targets(str(tmp_path), 3)
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks) as mock_run_gitleaks:
+        process = controller.scan_batch(dirnames, "output_test.json")
+
+    assert mock_run_gitleaks.call_count == 1
+    assert process.returncode == 1
+    for dirname in dirnames:
+        with open(os.path.join(dirname, "output_test.json"), 'r') as f:
+            report = json.load(f)
+        expected = [finding for finding in tests_utils.fake_gitleaks_findings(dirname)
+                    if not finding['File'].endswith("output_test.json")]
+        assert sorted(report, key=controller.finding_key) == sorted(expected, key=controller.finding_key)
+
+
+def test_scan_directories_in_batches(tmp_path):
+    dirnames = _batch_targets(str(tmp_path), 5)
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks) as mock_run_gitleaks:
+        custom_output = controller.scan_directories(dirnames, "output_test.json", 2, None,
+                                                    save_customize_output=False, batch_size=3)
+        batched = list(custom_output['findings'])
+    assert mock_run_gitleaks.call_count == 2
+
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks):
+        custom_output = controller.scan_directories(dirnames, "output_test.json", 2, None,
+                                                    save_customize_output=False)
+        assert batched == list(custom_output['findings'])  # same findings, in the order of the directories
+
+
+def test_scan_batch_failure_is_not_split(tmp_path):
+    dirnames = _batch_targets(str(tmp_path), 2)
+    with patch("controller.run_gitleaks", return_value=tests_utils.mock_process(returncode=2)):
+        assert controller.scan_batch(dirnames, "output_test.json").returncode == 2
+    assert all(os.path.getsize(os.path.join(dirname, "output_test.json")) == 0 for dirname in dirnames)
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import scan_cache
+
+
+def _scan(root, cache_path, version="v8.5.1"):
+    """ runs a cached scan with a fake Gitleaks.
+    returns the files Gitleaks was given (relative to the scanned source) and the merged report """
+    scanned = []
+
+    def fake_run_gitleaks(directory_to_scan, output_file, report_path=None, **kwargs):
+        scanned.extend(sorted(os.path.relpath(os.path.join(d, f), directory_to_scan)
+                              for d, _, files in os.walk(directory_to_scan) for f in files))
+        return tests_utils.fake_run_gitleaks(directory_to_scan, output_file, report_path=report_path)
+
+    with patch("controller.run_gitleaks", side_effect=fake_run_gitleaks), \
+            patch("controller.get_gitleaks_version", return_value=version):
+        controller.run_gitleaks_cached(root, "output_test.json", cache_path=cache_path)
+    with open(os.path.join(root, "output_test.json"), 'r') as f:
+        report = json.load(f)
+    return scanned, sorted(report, key=controller.finding_key)
+
+
+def _expected(root):
+    """ what a full (uncached) scan of root reports """
+    findings = tests_utils.fake_gitleaks_findings(root)
+    return sorted((finding for finding in findings if not finding['File'].endswith("output_test.json")),
+                  key=controller.finding_key)
+
+
+def test_scan_cache_reuses_unchanged_files(tmp_path):
+    root = str(tmp_path / "tree")
+    cache_path = str(tmp_path / "cache.sqlite")
+    tests_utils.make_tree(root, {"a.txt": "SECRET\n", "b/c.txt": "clean\n", "b/d.txt": "x\nSECRET\n"})
+
+    scanned, report = _scan(root, cache_path)
+    assert sorted(scanned) == ["a.txt", os.path.join("b", "c.txt"), os.path.join("b", "d.txt")]
+    assert report == _expected(root)
+
+    scanned, report = _scan(root, cache_path)
+    assert scanned == []  # nothing changed, Gitleaks is not even started
+    assert report == _expected(root)
+
+
+def test_scan_cache_scans_only_changed_files(tmp_path):
+    root = str(tmp_path / "tree")
+    cache_path = str(tmp_path / "cache.sqlite")
+    tests_utils.make_tree(root, {"a.txt": "SECRET\n", "b/c.txt": "clean\n", "b/d.txt": "x\nSECRET\n"})
+    _scan(root, cache_path)
+
+    tests_utils.make_tree(root, {"b/c.txt": "now a SECRET\n", "e.txt": "SECRET\n"})
+    os.remove(os.path.join(root, "a.txt"))
+    scanned, report = _scan(root, cache_path)
+
+    assert scanned == [os.path.join("b", "c.txt"), "e.txt"]  # only the changed files were staged
+    assert report == _expected(root)
+
+
+def test_scan_cache_invalidated_on_new_gitleaks_version(tmp_path):
+    root = str(tmp_path / "tree")
+    cache_path = str(tmp_path / "cache.sqlite")
+    tests_utils.make_tree(root, {"a.txt": "SECRET\n", "b.txt": "clean\n"})
+    _scan(root, cache_path, version="v8.5.1")
+
+    scanned, report = _scan(root, cache_path, version="v8.18.0")
+    assert sorted(scanned) == ["a.txt", "b.txt", "output_test.json"]
+    assert report == _expected(root)
+
+
+def test_scan_cache_failed_scan(tmp_path):
+    """ a failing Gitleaks is not reported as a clean scan of the changed files, and nothing gets cached """
+    root = str(tmp_path / "tree")
+    cache_path = str(tmp_path / "cache.sqlite")
+    tests_utils.make_tree(root, {"a.txt": "SECRET\nSECRET\n", "b.txt": "SECRET\n"})
+    _scan(root, cache_path)
+    tests_utils.make_tree(root, {"a.txt": "SECRET\nSECRET\nx\n"})
+
+    with patch("controller.run_gitleaks", return_value=tests_utils.mock_process(returncode=2)), \
+            patch("controller.get_gitleaks_version", return_value="v8.5.1"):
+        process = controller.run_gitleaks_cached(root, "output_test.json", cache_path=cache_path)
+    assert process.returncode == 2
+
+    args = controller.get_parser().parse_args(['--dir', root, '--output_filename', 'output_test.json', '--cache',
+                                               '--cache_path', cache_path])
+    with patch("controller.run_gitleaks", return_value=tests_utils.mock_process(returncode=2)), \
+            patch("controller.get_gitleaks_version", return_value="v8.5.1"), \
+            patch("controller.parse_json_output") as mock_parse, pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
+    mock_parse.assert_not_called()
+
+    scanned, report = _scan(root, cache_path)
+    assert scanned == ["a.txt"]  # still a miss
+    assert report == _expected(root)
+
+
+def test_scan_cache_lookup_touched_file(tmp_path):
+    """ a file whose mtime changed but whose content did not is still a hit """
+    file_path = tmp_path / "a.txt"
+    file_path.write_text("content")
+    cache = scan_cache.ScanCache(str(tmp_path / "cache.sqlite"), scanner_key="key")
+    digest = scan_cache.hash_file(str(file_path))
+    cache.store([("a.txt", 7, 1, digest, [{"File": "a.txt"}])])
+
+    assert cache.lookup("a.txt", str(file_path), 7, 1) == ([{"File": "a.txt"}], digest)
+    assert cache.lookup("a.txt", str(file_path), 7, 2) == ([{"File": "a.txt"}], digest)
+    file_path.write_text("changed")
+    assert cache.lookup("a.txt", str(file_path), 7, 3) == (None, scan_cache.hash_file(str(file_path)))
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.close()
@@ -0,0 +1,171 @@
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import controller
+import scan_limits
+import synthetic
+
+HANGING_GITLEAKS = "sleep 30"  # not exec'd: the sleep child must be killed with its parent
+
+
+@pytest.fixture(autouse=True)
+def reset_limits():
+    yield
+    scan_limits.configure()
+
+
+@pytest.mark.parametrize("returncode, timed_out, stderr, limits, expected", [
+    (0, False, '', None, 0),
+    (1, False, '', None, 1),
+    (1, True, '', None, 124),
+    (-signal.SIGKILL, False, '', None, 137),
+    (-signal.SIGXCPU, False, '', None, 152),
+    (2, False, 'fatal error: runtime: out of memory', scan_limits.ScanLimits(memory=1024), 137),
+    (2, False, 'fatal error: runtime: out of memory', scan_limits.ScanLimits(), 2),
+])
+def test_exit_code(returncode, timed_out, stderr, limits, expected):
+    assert scan_limits.exit_code(returncode, timed_out, stderr, limits) == expected
+
+
+def test_describe_kill():
+    limits = scan_limits.ScanLimits(timeout=5)
+    assert scan_limits.describe_kill(124, limits) == "Gitleaks timed out after 5 seconds and was killed"
+    assert scan_limits.describe_kill(152, limits) == "Gitleaks was killed by SIGXCPU (CPU time limit reached)"
+    assert not scan_limits.is_killed(1) and not scan_limits.is_killed(2)
+
+
+def test_priorities_wrap_the_command():
+    assert scan_limits.ScanLimits(timeout=5, memory=1024).wrap(["gitleaks", "detect"]) == ["gitleaks", "detect"]
+    command = scan_limits.ScanLimits(nice=5, io_class="idle").wrap(["gitleaks", "detect"])
+    assert [os.path.basename(command[0]), *command[1:3]] == ["nice", "-n", "5"]
+    assert [os.path.basename(command[3]), *command[4:]] == ["ionice", "-c", "3", "gitleaks", "detect"]
+
+
+def test_missing_priority_tool_is_skipped(caplog):
+    with patch("scan_limits.shutil.which", return_value=None):
+        assert scan_limits.ScanLimits(io_class="idle").wrap(["gitleaks"]) == ["gitleaks"]
+    assert "ionice is not installed" in caplog.text
+
+
+def test_execute_command_has_no_preexec_hook():
+    limits = scan_limits.ScanLimits(memory=2 * 1024 ** 3, cpu_time=60, nice=5)
+    with patch("controller.subprocess.Popen", wraps=subprocess.Popen) as mock_popen:
+        controller.execute_command("true", limits=limits)
+    assert "preexec_fn" not in mock_popen.call_args.kwargs
+
+
+def test_execute_command_timeout_kills_the_process_group():
+    start = time.monotonic()
+    process = controller.execute_command(f"sh -c '{HANGING_GITLEAKS}'", limits=scan_limits.ScanLimits(timeout=0.5))
+    assert process.returncode == scan_limits.TIMEOUT_EXIT_CODE
+    assert time.monotonic() - start < 10  # the sleep child held the pipes, it was killed too
+
+
+def test_execute_command_applies_limits_in_the_child():
+    probe = ("import os, resource; "
+             "print(resource.getrlimit(resource.RLIMIT_AS)[0], resource.getrlimit(resource.RLIMIT_CPU)[0], os.nice(0))")
+    limits = scan_limits.ScanLimits(memory=2 * 1024 ** 3, cpu_time=60, nice=5)
+    process = controller.execute_command(f'{sys.executable} -c "{probe}"', limits=limits)
+
+    assert process.returncode == 0
+    memory, cpu_time, niceness = process.stdout.split()
+    assert (int(memory), int(cpu_time)) == (2 * 1024 ** 3, 60)
+    assert int(niceness) >= os.nice(0) + 5
+    assert resource.getrlimit(resource.RLIMIT_CPU)[0] != 60  # the controller itself is untouched
+
+
+def test_execute_command_cpu_limit():
+    process = controller.execute_command(f'{sys.executable} -c "while True: pass"',
+                                         limits=scan_limits.ScanLimits(cpu_time=1))
+    assert process.returncode == scan_limits.SIGNAL_EXIT_CODE_BASE + signal.SIGXCPU
+
+
+def test_run_gitleaks_timeout_is_reported(tmp_path, gitleaks_bin):
+    tests_utils.install_gitleaks_script(gitleaks_bin, HANGING_GITLEAKS)
+    scan_limits.configure(timeout=0.5)
+    with patch("controller.log_error_to_file") as mock_log_error:
+        process = controller.run_gitleaks(str(tests_utils.make_scan_dir(tmp_path)), "output.json")
+
+    assert process.returncode == 124
+    assert mock_log_error.call_args.kwargs['exit_code'] == 124
+    assert "timed out after 0.5 seconds" in mock_log_error.call_args.kwargs['error_message']
+
+
+def test_piped_report_timeout(tmp_path, gitleaks_bin):
+    tests_utils.install_gitleaks_script(gitleaks_bin, HANGING_GITLEAKS)
+    scan_limits.configure(timeout=0.5)
+    with patch("controller.log_error_to_file") as mock_log_error, pytest.raises(SystemExit) as excinfo:
+        list(controller.iter_gitleaks_report(str(tests_utils.make_scan_dir(tmp_path)), '-'))
+    assert excinfo.value.code == 124
+    assert mock_log_error.call_args.kwargs['exit_code'] == 124
+
+
+def test_main_exits_with_the_timeout_code(tmp_path, gitleaks_bin):
+    tests_utils.install_gitleaks_script(gitleaks_bin, HANGING_GITLEAKS)
+    args = controller.get_parser().parse_args(['--dir', str(tests_utils.make_scan_dir(tmp_path)), '--timeout', '0.5',
+                                               '--no-show_result'])
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 124
+
+
+def test_limit_flags():
+    args = controller.get_parser().parse_args(['--max_memory', '2G', '--max_cpu_time', '600', '--nice', '10',
+                                               '--ionice', 'idle'])
+    assert (args.max_memory, args.max_cpu_time, args.nice, args.ionice) == (2 * 1024 ** 3, 600, 10, 'idle')
+
+
+def test_schedule_directories_shortest_first(tmp_path):
+    for name, size in (("big", 3000), ("empty", 0), ("small", 10)):
+        directory = tests_utils.make_scan_dir(tmp_path, name)
+        (directory / "file.txt").write_bytes(b'x' * size)
+    dirnames = [str(tmp_path / name) for name in ("big", "empty", "small")]
+    assert controller.schedule_directories(dirnames) == [str(tmp_path / name) for name in ("empty", "small", "big")]
+
+
+def test_scan_directories_skips_killed_scans(tmp_path):
+    dirnames = [str(tests_utils.make_scan_dir(tmp_path, name)) for name in ("killed", "ok")]
+    report = [synthetic.make_finding(0)]
+
+    def fake_scan(dirname, output_filename, config_path=None):
+        if dirname.endswith("killed"):
+            return subprocess.CompletedProcess(args=dirname, returncode=scan_limits.TIMEOUT_EXIT_CODE)
+        with open(os.path.join(dirname, output_filename), 'w') as f:
+            json.dump(report, f)
+        return subprocess.CompletedProcess(args=dirname, returncode=1)
+
+    with patch("controller.scan_directory", side_effect=fake_scan):
+        custom_output = controller.scan_directories(dirnames, "output.json", 2, None, save_customize_output=False)
+        assert list(custom_output['findings']) == list(controller.transform_findings(report))
+
+
+def test_scan_directories_skips_failed_scans(tmp_path, caplog):
+    """ a failed scan (bad config...) leaves an empty report: it is reported, not decoded """
+    dirnames = [str(tests_utils.make_scan_dir(tmp_path, name)) for name in ("failed", "ok")]
+    report = [synthetic.make_finding(0)]
+
+    def fake_scan(dirname, output_filename, config_path=None):
+        if dirname.endswith("failed"):
+            open(os.path.join(dirname, output_filename), 'w').close()
+            return subprocess.CompletedProcess(args=dirname, returncode=126)
+        with open(os.path.join(dirname, output_filename), 'w') as f:
+            json.dump(report, f)
+        return subprocess.CompletedProcess(args=dirname, returncode=1)
+
+    with patch("controller.scan_directory", side_effect=fake_scan):
+        custom_output = controller.scan_directories(dirnames, "output.json", 2, None, save_customize_output=False)
+        assert list(custom_output['findings']) == list(controller.transform_findings(report))
+    assert f"their scan failed: {dirnames[0]} (return code 126)" in caplog.text
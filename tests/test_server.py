@@ -0,0 +1,115 @@
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import server
+from findings_store import FindingsStore
+
+FINDINGS = [{"filename": "a.py", "line_range": "1-1", "description": "AWS"}]
+
+
+async def fake_scan(directory, config_path=None, timeout=None, compact=False):
+    if directory.endswith("broken"):
+        raise controller.ScanError(exit_code=126, message="bad config")
+    return FindingsStore(FINDINGS) if compact else FINDINGS
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+@pytest.fixture
+def daemon(request, tmp_path):
+    """ a running daemon (TCP, or Unix socket when parametrized with 'unix'), yields a connection factory """
+    queue = server.ScanQueue(jobs=2)
+    socket_path = str(tmp_path / "daemon.sock") if getattr(request, 'param', None) == 'unix' else None
+    httpd = server.make_server(queue, port=0, socket_path=socket_path)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    if socket_path:
+        yield lambda: UnixHTTPConnection(socket_path)
+    else:
+        yield lambda: http.client.HTTPConnection(*httpd.server_address)
+    httpd.shutdown()
+    httpd.server_close()
+    queue.close()
+
+
+def _request(connect, method, path, body=None):
+    connection = connect()
+    connection.request(method, path, body=json.dumps(body) if body is not None else None)
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+def _wait(connect, job_id):
+    for _ in range(100):
+        status, job = _request(connect, "GET", f"/scans/{job_id}")
+        if job["status"] in (server.JOB_DONE, server.JOB_FAILED):
+            return job
+        time.sleep(0.05)
+    pytest.fail(f"scan job {job_id} did not finish")
+
+
+@pytest.mark.parametrize("daemon", ["tcp", "unix"], indirect=True)
+def test_daemon_scan_job(daemon, tmp_path):
+    with patch("controller.scan", side_effect=fake_scan):
+        status, job = _request(daemon, "POST", "/scans", {"dir": str(tmp_path)})
+        assert status == 202
+        assert job["status"] in (server.JOB_QUEUED, server.JOB_RUNNING, server.JOB_DONE)
+
+        job = _wait(daemon, job["id"])
+        assert job["status"] == server.JOB_DONE
+        assert job["findings_count"] == 1
+
+        status, result = _request(daemon, "GET", f"/scans/{job['id']}/result")
+        assert status == 200
+        assert result == {"findings": FINDINGS}
+
+
+def test_daemon_failed_job(daemon, tmp_path):
+    broken = tmp_path / "broken"
+    broken.mkdir()
+    with patch("controller.scan", side_effect=fake_scan):
+        _, job = _request(daemon, "POST", "/scans", {"dir": str(broken)})
+        job = _wait(daemon, job["id"])
+
+    assert job["status"] == server.JOB_FAILED
+    status, result = _request(daemon, "GET", f"/scans/{job['id']}/result")
+    assert status == 500
+    assert result == {"error": "bad config", "exit_code": 126}
+
+
+def test_daemon_invalid_requests(daemon):
+    assert _request(daemon, "POST", "/scans", {"directory": "/tmp"})[0] == 400
+    assert _request(daemon, "POST", "/scans", {"dir": "/non/existent"})[0] == 400
+    assert _request(daemon, "GET", "/scans/unknown")[0] == 404
+    assert _request(daemon, "GET", "/nothing")[0] == 404
+    status, health = _request(daemon, "GET", "/health")
+    assert status == 200 and health["status"] == "ok"
+
+
+def test_serve_parser_defaults():
+    args = server.get_parser().parse_args([])
+    assert (args.host, args.port, args.socket_path) == ("127.0.0.1", 8080, None)
+    assert (args.max_memory, args.max_cpu_time, args.nice, args.ionice) == (None, None, None, None)
+    args = server.get_parser().parse_args(['--max_memory', '4G', '--nice', '10'])
+    assert (args.max_memory, args.nice) == (4 * 1024 ** 3, 10)
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+STARTUP_BUDGET_US = 300_000  # cold `import controller`, pydantic and GitPython alone used to take more than that
+LAZY_MODULES = ("pydantic", "git", "asyncio", "sqlite3", "cProfile", "csv", "ctypes")
+
+
+def _import_times(*args):
+    """ run python -X importtime and return {module: cumulative microseconds} """
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=REPO_DIR, capture_output=True,
+                            text=True, timeout=60)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = int(cumulative)
+    return result, times
+
+
+def _slowest(times, count=10):
+    return ', '.join(f"{module} {us / 1000:.1f}ms"
+                     for module, us in sorted(times.items(), key=lambda item: item[1], reverse=True)[:count])
+
+
+def test_import_time_budget():
+    _, times = _import_times('-c', 'import controller')
+    assert times['controller'] < STARTUP_BUDGET_US, f"slowest imports: {_slowest(times)}"
+
+
+@pytest.mark.parametrize("args", [
+    ('-c', 'import controller'),
+    ('controller.py', '--help'),
+])
+def test_heavy_modules_are_not_imported(args):
+    result, times = _import_times(*args)
+    assert result.returncode == 0, result.stderr
+    imported = {module.split('.')[0] for module in times}
+    assert imported.isdisjoint(LAZY_MODULES), f"imported at start-up: {sorted(imported & set(LAZY_MODULES))}"
+
+
+def test_models_are_loaded_on_use():
+    import bonus
+    import bonus_models
+    import controller
+
+    assert bonus.LeakReport is bonus_models.LeakReport
+    assert controller.LeakReport is bonus_models.LeakReport
+    with pytest.raises(AttributeError):
+        bonus.NotAModel
@@ -0,0 +1,143 @@
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import controller
+import synthetic
+from summary import NO_EXTENSION, Summary
+
+
+def _finding(path, rule_id="generic-api-key", commit="", entropy=3.5):
+    return {"File": path, "RuleID": rule_id, "Description": rule_id.replace('-', ' '), "Commit": commit,
+            "Entropy": entropy, "StartLine": 1, "EndLine": 1}
+
+
+FINDINGS = [
+    _finding("/code/repo/src/app/settings.py", entropy=4.2, commit="abc"),
+    _finding("/code/repo/src/app/deep/config.PY", rule_id="aws-access-token", commit="abc"),
+    _finding("/code/repo/src/lib/keys.js", rule_id="aws-access-token", entropy=5.1, commit="def"),
+    _finding("/code/repo/.env", rule_id="aws-access-token", entropy=2.0),
+    _finding("/elsewhere/Makefile"),
+]
+
+
+def test_summary_single_pass():
+    summary = Summary(depth=2)
+    findings = iter(FINDINGS)  # a one-shot stream
+    assert list(summary.observe(findings, root="/code/repo/")) == FINDINGS
+
+    result = summary.to_dict(top=2)
+    assert (result['findings'], result['files'], result['commits']) == (5, 5, 2)
+    assert result['rules'] == [
+        {"name": "aws-access-token", "description": "aws access token", "findings": 3},
+        {"name": "generic-api-key", "description": "generic api key", "findings": 2},
+    ]
+    assert summary.directories == {"src/app": 2, "src/lib": 1, ".": 1, "/elsewhere": 1}
+    assert summary.extensions == {".py": 2, ".js": 1, NO_EXTENSION: 2}
+    assert result['top_commits'] == [{"name": "abc", "findings": 2}, {"name": "def", "findings": 1}]
+    assert result['entropy'] == {"mean": 3.66, "max": 5.1, "histogram": {"2-3": 1, "3-4": 2, "4-5": 1, "5-6": 1}}
+
+
+def test_summary_top_and_render():
+    summary = Summary()
+    for _ in summary.observe(synthetic.iter_findings(500), root="/code/repo"):
+        pass
+    assert len(summary.to_dict(top=3)['directories']) == 3
+
+    rendered = summary.render(top=3)
+    assert rendered.startswith("Summary: 500 findings in 500 files\n")
+    assert "Top rules:\n       100  aws-access-token (AWS)" in rendered
+    assert "Commits with the most findings" not in rendered  # no git history in the report
+
+
+def test_summary_without_findings():
+    assert Summary().render() == "Summary: 0 findings in 0 files"
+
+
+def _raw_report(tmp_path, count=30):
+    report_path = tmp_path / "output.json"
+    synthetic.write_report(str(report_path), count)
+    return report_path
+
+
+def test_parse_json_output_with_summary(tmp_path):
+    _raw_report(tmp_path)
+    summary = Summary()
+    custom_output = controller.parse_json_output(str(tmp_path), "output.json", save_customize_output=False,
+                                                 summary=summary)
+    assert summary.total == 0  # lazy, counted while the findings stream
+    assert len(list(custom_output['findings'])) == 30
+    assert summary.total == 30
+    assert sum(summary.rules.values()) == 30
+
+
+def test_scan_directories_summary_keeps_the_directory_names(tmp_path):
+    dirnames = []
+    for name in ("first", "second"):
+        directory = tmp_path / name
+        directory.mkdir()
+        dirnames.append(str(directory))
+
+    def fake_scan(dirname, output_filename, config_path=None):
+        with open(os.path.join(dirname, output_filename), 'w') as f:
+            f.write(f'[{{"File": "{dirname}/src/a.py", "StartLine": 1, "EndLine": 1, "Description": "d"}}]')
+        return subprocess.CompletedProcess(args=dirname, returncode=1)
+
+    summary = Summary(depth=1)
+    with patch("controller.scan_directory", side_effect=fake_scan):
+        controller.consume_findings(controller.scan_directories(dirnames, "output.json", 2, None,
+                                                                save_customize_output=False, summary=summary))
+    assert summary.directories == {"first": 1, "second": 1}
+
+
+def test_show_results_page():
+    findings = [{"filename": f"file{i}.py", "line_range": "1-1", "description": "d"} for i in range(5)]
+    with patch('builtins.print') as mock_print:
+        controller.show_results({"findings": iter(findings)}, bonus=False, page_size=2, page=2)
+
+    printed = [call.args[0] for call in mock_print.call_args_list]
+    assert printed == [
+        "\nHere are all the JSON objects:",
+        f"3) {findings[2]}",
+        f"4) {findings[3]}",
+        "\nShown findings 3-4 of 5 (page 2 of 3, --page_size 2)",
+    ]
+
+
+def test_show_results_page_only_converts_the_page():
+    findings = ({"filename": f"file{i}.py", "line_range": "1-1", "description": "d"} for i in range(50))
+    with patch('builtins.print') as mock_print, \
+            patch("controller.iter_leak_reports", side_effect=lambda shown, validate: list(shown)) as mock_models:
+        controller.show_results({"findings": findings}, bonus=True, page_size=10, page=6)
+
+    assert mock_models.call_count == 1
+    assert mock_print.call_args.args[0] == "\nShown findings none of 50 (page 6 of 5, --page_size 10)"
+
+
+def test_main_with_summary(tmp_path, capsys):
+    def fake_run_gitleaks(dirname, output_filename, config_path=None):
+        synthetic.write_report(os.path.join(dirname, output_filename), 40)
+        return subprocess.CompletedProcess(args=dirname, returncode=1)
+
+    args = controller.get_parser().parse_args(['--dir', str(tmp_path), '--output_filename', 'output.json',
+                                               '--summary', '--no-show_result', '--top', '2'])
+    with patch("controller.run_gitleaks", side_effect=fake_run_gitleaks):
+        controller.main(args)
+
+    output = capsys.readouterr().out
+    assert "Summary: 40 findings in 40 files" in output
+    assert "Here are all" not in output
+    assert "Top rules:\n         8  aws-access-token (AWS)\n         8  github-pat" in output
+    assert "slack-access-token" not in output  # only the top 2 of the 5 rules
+
+
+@pytest.mark.parametrize("flag", ['--page', '--page_size', '--top', '--summary_depth'])
+def test_positive_flags(flag):
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit):
+        controller.get_parser().parse_args([flag, '0'])
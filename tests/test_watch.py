@@ -0,0 +1,195 @@
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import controller
+import watch
+from prefilter import DEFAULT_EXCLUDES, IgnoreRules
+
+RULES = IgnoreRules([*watch.WATCH_EXCLUDES, *DEFAULT_EXCLUDES])
+TREE = {
+    "app.py": "token = SECRET\n",
+    "src/config.yml": "user: admin\n",
+    "node_modules/lib/index.js": "SECRET\n",
+    ".git/config": "SECRET\n",
+}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    tests_utils.make_tree(str(root), TREE)
+    return str(root)
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _changes(watcher, timeout=2.0):
+    """ collect the changes of a watcher until it has been quiet for a moment """
+    changed = watcher.changes(timeout)
+    while True:
+        more = watcher.changes(0.2)
+        if not more:
+            return changed
+        changed |= more
+
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_watcher(tree, backend):
+    watcher = watch.make_watcher(tree, RULES, skip_paths={os.path.join(tree, "output.json")}, backend=backend,
+                                 interval=0.05)
+    try:
+        assert watcher.files() == {os.path.join(tree, "app.py"), os.path.join(tree, "src", "config.yml")}
+
+        _write(os.path.join(tree, "src", "config.yml"), "password: SECRET\n")
+        _write(os.path.join(tree, "output.json"), "[]")  # our own report
+        _write(os.path.join(tree, "node_modules", "lib", "other.js"), "SECRET\n")
+        os.remove(os.path.join(tree, "app.py"))
+        assert _changes(watcher) == {os.path.join(tree, "src", "config.yml"), os.path.join(tree, "app.py")}
+
+        os.makedirs(os.path.join(tree, "new", "deep"))
+        _write(os.path.join(tree, "new", "deep", "key.pem"), "SECRET\n")
+        changed = _changes(watcher)
+        assert os.path.join(tree, "new") in changed or os.path.join(tree, "new", "deep", "key.pem") in changed
+    finally:
+        watcher.close()
+
+
+def test_inotify_moved_directory(tree):
+    watcher = watch.make_watcher(tree, RULES, backend="inotify")
+    try:
+        os.rename(os.path.join(tree, "src"), os.path.join(tree, "moved"))
+        assert _changes(watcher) == {os.path.join(tree, "src"), os.path.join(tree, "moved")}
+        _write(os.path.join(tree, "moved", "config.yml"), "SECRET\n")
+        assert _changes(watcher) == {os.path.join(tree, "moved", "config.yml")}  # not reported under src/
+    finally:
+        watcher.close()
+
+
+def test_fallback_to_polling(tree):
+    with patch("watch.InotifyWatcher", side_effect=OSError(28, "No space left on device")):
+        watcher = watch.make_watcher(tree, RULES)
+    assert isinstance(watcher, watch.PollingWatcher)
+    with patch("watch.InotifyWatcher", side_effect=OSError(28, "No space left on device")), \
+            pytest.raises(OSError):
+        watch.make_watcher(tree, RULES, backend="inotify")
+
+
+class ScriptedWatcher:
+    """ returns the given batches of changes, one per call, then nothing """
+
+    def __init__(self, batches, stop):
+        self.batches = list(batches)
+        self.stop = stop
+
+    def changes(self, timeout):
+        if not self.batches:
+            self.stop.set()
+            return set()
+        return self.batches.pop(0)
+
+
+def test_change_batches_are_debounced():
+    stop = threading.Event()
+    watcher = ScriptedWatcher([{"a"}, {"b"}, {"a", "c"}, set(), {"d"}, set()], stop)
+    assert list(watch.iter_change_batches(watcher, debounce=0.01, stop=stop, wait=0.01)) == [{"a", "b", "c"}, {"d"}]
+
+
+def test_change_batches_max_debounce():
+    stop = threading.Event()
+    watcher = ScriptedWatcher([{str(index)} for index in range(1000)], stop)
+    batches = watch.iter_change_batches(watcher, debounce=0.01, max_debounce=0, stop=stop, wait=0.01)
+    assert next(batches) == {"0"}  # a burst that never settles
+
+
+def test_watch_session_rescan(tree):
+    session = watch.WatchSession(tree, os.path.join(tree, "output.json"), RULES)
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks) as mock_run:
+        session.rescan({os.path.join(tree, "app.py"), os.path.join(tree, "src", "config.yml")})
+        assert list(session.findings) == [os.path.join(tree, "app.py")]
+
+        _write(os.path.join(tree, "app.py"), "print('no more secret')\n")
+        _write(os.path.join(tree, "src", "config.yml"), "password: SECRET\n")
+        new_findings = session.rescan({os.path.join(tree, "app.py"), os.path.join(tree, "src", "config.yml")})
+        assert [finding["File"] for finding in new_findings] == [os.path.join(tree, "src", "config.yml")]
+        assert list(session.findings) == [os.path.join(tree, "src", "config.yml")]
+
+        _write(os.path.join(tree, "lib", "a", "key.txt"), "SECRET\n")
+        session.rescan({os.path.join(tree, "lib")})
+        os.rename(os.path.join(tree, "src"), os.path.join(tree, "renamed"))
+        session.rescan({os.path.join(tree, "src"), os.path.join(tree, "renamed")})
+        assert mock_run.call_count == 4
+
+    assert sorted(session.findings) == [os.path.join(tree, "lib", "a", "key.txt"),
+                                        os.path.join(tree, "renamed", "config.yml")]
+    assert session.write_report() == session.count() == 2
+
+
+def test_run_watch(tree, capsys):
+    stop = threading.Event()
+    passes = []
+    report_path = os.path.join(tree, "output.json")
+
+    def on_pass(session, new_findings):
+        passes.append((time.monotonic(), [finding["File"] for finding in new_findings]))
+
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks):
+        thread = threading.Thread(target=watch.run_watch, args=(tree, report_path),
+                                  kwargs=dict(backend="inotify", stop=stop, on_pass=on_pass, interval=0.1))
+        thread.start()
+        try:
+            _wait_for(lambda: len(passes) == 1)
+            saved_at = time.monotonic()
+            _write(os.path.join(tree, "src", "config.yml"), "password: SECRET\n")
+            _wait_for(lambda: len(passes) == 2)
+        finally:
+            stop.set()
+            thread.join(timeout=10)
+
+    assert passes[0][1] == [os.path.join(tree, "app.py")]
+    assert passes[1][1] == [os.path.join(tree, "src", "config.yml")]
+    assert passes[1][0] - saved_at < 1.0  # from the save to the finding
+    with open(report_path, 'r') as f:
+        assert sorted(finding["File"] for finding in json.load(f)) == [os.path.join(tree, "app.py"),
+                                                                        os.path.join(tree, "src", "config.yml")]
+    with open(os.path.join(tree, controller.CUSTOM_OUTPUT_FILENAME), 'r') as f:
+        assert len(json.load(f)['findings']) == 2
+    assert f"'filename': '{os.path.join(tree, 'src', 'config.yml')}'" in capsys.readouterr().out
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_main_with_watch(tree):
+    args = controller.get_parser().parse_args(['--dir', tree, '--watch', '--watch_backend', 'poll',
+                                               '--exclude', '*.yml'])
+    with patch("watch.run_watch") as mock_run_watch:
+        controller.main(args)
+    assert mock_run_watch.call_args.args == (tree, os.path.join(tree, args.output_filename))
+    kwargs = mock_run_watch.call_args.kwargs
+    assert kwargs['backend'] == "poll" and kwargs['rules'].ignored("src/config.yml")
+    assert "runtime_logs.log.1" in kwargs['skip_paths']
+
+
+def test_watch_rejects_other_modes(tree):
+    args = controller.get_parser().parse_args(['--dir', tree, '--watch', '--cache'])
+    with patch("controller.log_error_to_file"), pytest.raises(SystemExit) as excinfo:
+        controller.main(args)
+    assert excinfo.value.code == 2
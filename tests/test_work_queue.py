@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import utils_tests as tests_utils
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import bench_pipeline
+import work_queue
+from work_queue import STATUS_DONE, STATUS_FAILED, STATUS_LEASED, STATUS_PENDING
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = work_queue.WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.reset(["/a", "/b", "/c"], {"max_attempts": 2})
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def targets(tmp_path):
+    dirnames = []
+    for index in range(6):
+        dirname = tmp_path / f"repo{index}"
+        tests_utils.make_tree(str(dirname), {"src/app.py": "token = SECRET\n", "README.md": "hello\n"})
+        dirnames.append(str(dirname))
+    return dirnames
+
+
+def _attempts(queue, target):
+    return queue.connection.execute("SELECT attempts FROM targets WHERE target = ?", (target,)).fetchone()[0]
+
+
+def test_claim_and_complete(queue):
+    first, second = queue.claim("w1"), queue.claim("w2")
+    assert (first[1], second[1]) == ("/a", "/b")  # never the same target twice
+    assert queue.counts() == {STATUS_PENDING: 1, STATUS_LEASED: 2, STATUS_DONE: 0, STATUS_FAILED: 0}
+
+    assert not queue.complete(first[0], "w2", 0, [])  # not the worker of the lease
+    assert queue.complete(first[0], "w1", 1, [{"filename": "/a/x.py"}])
+    assert queue.heartbeat(second[0], "w2") and not queue.heartbeat(first[0], "w1")
+    assert list(queue.iter_findings()) == [{"filename": "/a/x.py"}]
+    assert not queue.finished()
+
+
+def test_expired_leases_are_retried(queue):
+    crashed = queue.claim("crashed", lease=-1)
+    retried = queue.claim("w1")  # expires the lease of the crashed worker first
+    assert retried == crashed and _attempts(queue, "/a") == 2
+    assert not queue.complete(crashed[0], "crashed", 0, [])  # too late, its result is dropped
+
+    queue.connection.execute("UPDATE targets SET lease_expires = 0 WHERE id = ?", (retried[0],))
+    assert queue.expire_leases() == 1
+    assert queue.failures() == [("/a", None, "the lease of worker w1 expired")]  # max_attempts reached
+
+
+def test_failed_scans_are_retried(queue):
+    target_id, _ = queue.claim("w1")
+    assert queue.fail(target_id, "w1", 2, "boom")
+    assert queue.claim("w2")[0] == target_id
+    assert queue.fail(target_id, "w2", 2, "boom again")
+    assert queue.failures() == [("/a", 2, "boom again")]
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    target_id, _ = queue.claim("w1", lease=0.3)
+    heartbeat = work_queue.Heartbeat(queue.queue_path, target_id, "w1", lease=0.3)
+    heartbeat.start()
+    time.sleep(0.6)
+    assert queue.expire_leases() == 0
+    heartbeat.stop()
+    assert not heartbeat.lost and queue.complete(target_id, "w1", 0, [])
+
+
+def test_run_worker(tmp_path, targets):
+    queue_path = str(tmp_path / "queue.sqlite")
+    queue = work_queue.WorkQueue(queue_path)
+    queue.reset([*targets[:2], str(tmp_path / "missing")], {"max_attempts": 1})
+    with patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks):
+        assert work_queue.run_worker(queue_path, "w1", poll_interval=0.01) == 3
+
+    assert [finding["filename"] for finding in queue.iter_findings()] == [
+        os.path.join(target, "src", "app.py") for target in targets[:2]]
+    assert queue.failures() == [(str(tmp_path / "missing"), 2, f"The directory {tmp_path / 'missing'} does not exist.")]
+    queue.close()
+
+
+def test_coordinator_with_worker_processes(tmp_path, targets, monkeypatch):
+    """ three local worker processes, and a worker that crashed holding a lease """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    bench_pipeline.install_fake_gitleaks(str(bin_dir))
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_GITLEAKS_MARKER", "SECRET")
+    monkeypatch.chdir(tmp_path)  # the workers log there
+    queue_path = str(tmp_path / "queue.sqlite")
+    combined_path = str(tmp_path / "combined.json")
+
+    results = []
+    coordinator = threading.Thread(target=lambda: results.append(work_queue.run_coordinator(
+        queue_path, targets, combined_path, {"max_attempts": 3}, poll_interval=0.05)))
+    coordinator.start()
+    queue = work_queue.WorkQueue(queue_path)
+    try:
+        deadline = time.monotonic() + 10
+        while queue.counts()[STATUS_PENDING] == 0:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        crashed_id, crashed_target = queue.claim("crashed", lease=1)
+        processes = work_queue.spawn_workers(queue_path, 3, poll_interval=0.05)
+        coordinator.join(timeout=60)
+        for process in processes:
+            assert process.wait(timeout=60) == 0
+        assert _attempts(queue, crashed_target) == 2
+    finally:
+        queue.close()
+
+    assert results == [(6, [])]
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("runtime_logs")) == [
+        f"runtime_logs.worker-{index}.log" for index in range(3)]  # one log per worker, nothing rotated
+    with open(combined_path, 'r') as f:
+        assert sorted(finding["filename"] for finding in json.load(f)["findings"]) == sorted(
+            os.path.join(target, "src", "app.py") for target in targets)
+
+
+def test_main_coordinate_failures(tmp_path, targets):
+    args = work_queue.get_parser('coordinate').parse_args(
+        ['--queue', str(tmp_path / "queue.sqlite"), '--dir', targets[0], '--dir', str(tmp_path / "missing"),
+         '--max_attempts', '1', '--combined_output', str(tmp_path / "combined.json"), '--poll_interval', '0.01'])
+
+    def spawn_thread_worker(queue_path, count, *args):
+        threading.Thread(target=work_queue.run_worker, args=(queue_path, "w1"), kwargs={"poll_interval": 0.01}).start()
+        return []
+
+    with patch("work_queue.spawn_workers", side_effect=spawn_thread_worker), \
+            patch("controller.run_gitleaks", side_effect=tests_utils.fake_run_gitleaks), \
+            patch("work_queue.log_error_to_file") as mock_log_error, pytest.raises(SystemExit) as excinfo:
+        work_queue.main(args)
+    assert excinfo.value.code == 2
+    assert "missing: The directory" in mock_log_error.call_args.kwargs['error_message']
+    with open(tmp_path / "combined.json", 'r') as f:
+        assert len(json.load(f)["findings"]) == 1
+
+
+def test_worker_log_file():
+    assert work_queue.worker_log_file("runtime_logs.log", 2) == "runtime_logs.worker-2.log"
+    assert work_queue.worker_log_file("/var/log/scan", 0) == "/var/log/scan.worker-0"
+    assert work_queue.worker_log_file("", 0) == ""
+
+
+def test_worker_parser():
+    args = work_queue.get_parser('worker').parse_args(['--queue', 'q.sqlite', '--lease', '60'])
+    assert (args.command, args.queue, args.lease, args.wait) == ('worker', 'q.sqlite', 60, False)
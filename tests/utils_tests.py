@@ -1,3 +1,4 @@
+import json
 import os
 import stat
 from unittest.mock import MagicMock
@@ -9,8 +10,57 @@ def remove_readonly(func, path, _):
     func(path)
 
 
+def install_gitleaks_script(bin_dir, script):
+    """ install a shell script as the `gitleaks` executable of the gitleaks_bin fixture (see conftest.py) """
+    script_path = bin_dir / "gitleaks"
+    script_path.write_text(f"#!/bin/sh\n{script}\n")
+    script_path.chmod(0o755)
+
+
+def make_scan_dir(tmp_path, name="scan"):
+    scan_dir = tmp_path / name
+    scan_dir.mkdir(exist_ok=True)
+    return scan_dir
+
+
 def mock_process(returncode=0, stderr=""):
     process = MagicMock()
     process.returncode = returncode
     process.stderr = stderr
     return process
+
+
+def fake_gitleaks_findings(source, marker="SECRET"):
+    """ findings a fake Gitleaks would report for `source`: one per line containing `marker` """
+    file_paths = [source] if os.path.isfile(source) else [
+        os.path.join(dirpath, filename) for dirpath, _, filenames in os.walk(source) for filename in filenames
+    ]
+    findings = []
+    for file_path in sorted(file_paths):
+        with open(file_path, 'r', errors='ignore') as f:
+            for line_number, line in enumerate(f, start=1):
+                if marker in line:
+                    findings.append({"Description": "Fake secret", "StartLine": line_number, "EndLine": line_number,
+                                     "StartColumn": line.index(marker) + 1, "EndColumn": line.index(marker) + len(marker),
+                                     "Match": marker, "Secret": marker, "File": file_path, "Commit": "",
+                                     "Entropy": 2.5, "RuleID": "fake-secret", "Tags": []})
+    return findings
+
+
+def fake_run_gitleaks(directory_to_scan, output_file, report_path=None, **kwargs):
+    """ stand-in for controller.run_gitleaks that writes the report of fake_gitleaks_findings """
+    if report_path is None:
+        report_path = os.path.join(directory_to_scan, output_file)
+    findings = fake_gitleaks_findings(directory_to_scan)
+    with open(report_path, 'w') as f:
+        json.dump(findings, f)
+    return mock_process(returncode=1 if findings else 0)
+
+
+def make_tree(root, files):
+    """ create the files {relative path: content} below root """
+    for relative_path, content in files.items():
+        file_path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(content)
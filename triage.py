@@ -0,0 +1,156 @@
+import collections
+import hashlib
+import itertools
+import math
+import os
+import re
+
+TRIAGE_ACTIONS = ("mark", "drop")
+DEFAULT_MIN_ENTROPY = 3.0  # bits per character, below this a secret looks like a word or a pattern
+HIGH_ENTROPY = 4.5  # bits per character of a secret scored 1.0 (random base62 is about 5)
+TEST_PATH_PENALTY = 0.5
+TRIAGE_BATCH_SIZE = 10000  # findings scored together, their new secrets go to the pool in one map
+POOL_MIN_SECRETS = 2000  # fewer new secrets in a batch are scored inline, the pool would only add overhead
+MAX_MEMOIZED = 1_000_000  # secret hashes remembered before the memo is cleared
+
+LIKELY, ALLOWLISTED, PLACEHOLDER, LOW_ENTROPY, TEST_FIXTURE = (
+    "likely", "allowlisted", "placeholder", "low_entropy", "test_fixture")
+VERDICTS = (LIKELY, TEST_FIXTURE, LOW_ENTROPY, PLACEHOLDER, ALLOWLISTED)
+
+PLACEHOLDER_PATTERN = re.compile(
+    r"example|sample|dummy|placeholder|changeme|change_me|replace_?me|your[_-]?(api[_-]?)?(key|token|secret)"
+    r"|xxxx|\*\*\*\*|<[^>]*>|\$\{[^}]*}|\{\{[^}]*}}|%\([^)]*\)s|^(?P<char>.)(?P=char)+$"
+    r"|123456789|abcdefghij",
+    re.IGNORECASE,
+)
+TEST_PATH_PATTERN = re.compile(
+    r"(^|/)(tests?|testdata|test_data|__tests__|fixtures?|spec|mocks?|examples?|samples?)(/|$)"
+    r"|(^|/)test_[^/]*$|_test\.[^/]*$|\.(test|spec)\.[^/]*$",
+    re.IGNORECASE,
+)
+
+
+def hash_secret(secret):
+    """ SHA-256 of a secret, the form secrets take in the allowlist (`printf %s SECRET | sha256sum`) """
+    return hashlib.sha256(secret.encode()).digest()
+
+
+def shannon_entropy(secret):
+    """ Shannon entropy of the characters of the secret, in bits per character """
+    length = len(secret)
+    if not length:
+        return 0.0
+    return -sum(count / length * math.log2(count / length) for count in collections.Counter(secret).values())
+
+
+def score_secret(secret):
+    """ the part of the triage that only depends on the secret (memoised by its hash): (entropy, placeholder) """
+    return shannon_entropy(secret), PLACEHOLDER_PATTERN.search(secret) is not None
+
+
+def load_allowlist(allowlist_path):
+    """ hex SHA-256 hashes of accepted secrets, one per line (`#` comments) """
+    hashes = set()
+    with open(allowlist_path, 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                digest = bytes.fromhex(line)
+            except ValueError:
+                digest = b''
+            if len(digest) != hashlib.sha256().digest_size:
+                raise ValueError(f"{allowlist_path}:{line_number}: not a SHA-256 hash: {line}")
+            hashes.add(digest)
+    return hashes
+
+
+class Triage:
+    """ scores the raw Gitleaks findings while they stream through the pipeline (before they are converted and the
+    secret is dropped), to mark or drop the likely false positives: secrets in the allowlist, placeholders (example
+    keys, templates, repeated characters...), low entropy strings, and secrets in test files (down-ranked only).
+    the score is the entropy of the secret relative to HIGH_ENTROPY, halved in test files, 0 for the placeholders and
+    the allowlisted secrets. the secret checks are memoised by secret hash, and for large reports the new secrets of
+    every batch are scored on a process pool (`jobs` processes, the CPU count by default) """
+
+    def __init__(self, action="mark", allowlist=(), min_entropy=DEFAULT_MIN_ENTROPY, jobs=None,
+                 batch_size=TRIAGE_BATCH_SIZE, pool_min_secrets=POOL_MIN_SECRETS):
+        self.action = action
+        self.allowlist = set(allowlist)
+        self.min_entropy = min_entropy
+        self.jobs = jobs or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.pool_min_secrets = pool_min_secrets
+        self.counts = collections.Counter()
+        self.memo = {}  # secret hash -> score_secret(secret)
+        self.memo_hits = 0
+        self._pool = None
+
+    def apply(self, findings):
+        """ pass the raw findings through, in batches. with the drop action only the likely secrets are kept,
+        with mark every finding gets its 'Triage' verdict and 'TriageScore' (see transform_findings) """
+        findings = iter(findings)
+        while True:
+            batch = list(itertools.islice(findings, self.batch_size))
+            if not batch:
+                return
+            hashes = [hash_secret(finding.get('Secret', '')) for finding in batch]
+            self._score_new_secrets(batch, hashes)
+            for finding, secret_hash in zip(batch, hashes):
+                verdict, score = self.verdict(finding, secret_hash)
+                self.counts[verdict] += 1
+                if self.action == "drop" and verdict != LIKELY:
+                    continue
+                finding['Triage'], finding['TriageScore'] = verdict, score
+                yield finding
+
+    def verdict(self, finding, secret_hash):
+        """ (verdict, score) of a raw finding whose secret was scored """
+        if secret_hash in self.allowlist:
+            return ALLOWLISTED, 0.0
+        entropy, placeholder = self.memo[secret_hash]
+        if placeholder:
+            return PLACEHOLDER, 0.0
+        score = min(entropy / HIGH_ENTROPY, 1.0)
+        if entropy < self.min_entropy:
+            return LOW_ENTROPY, round(score, 3)
+        if TEST_PATH_PATTERN.search(finding['File']):
+            return TEST_FIXTURE, round(score * TEST_PATH_PENALTY, 3)
+        return LIKELY, round(score, 3)
+
+    def _score_new_secrets(self, batch, hashes):
+        if len(self.memo) > MAX_MEMOIZED:  # before the batch, its secrets must stay memoised until verdict()
+            self.memo.clear()
+        new_secrets = {}
+        for finding, secret_hash in zip(batch, hashes):
+            if secret_hash not in self.memo and secret_hash not in self.allowlist:  # allowlisted: never scored
+                new_secrets.setdefault(secret_hash, finding.get('Secret', ''))
+        self.memo_hits += len(batch) - len(new_secrets)
+        if not new_secrets:
+            return
+
+        if self.jobs > 1 and len(new_secrets) >= self.pool_min_secrets:
+            chunksize = max(len(new_secrets) // (self.jobs * 4), 1)
+            scores = self._get_pool().map(score_secret, new_secrets.values(), chunksize=chunksize)
+        else:
+            scores = map(score_secret, new_secrets.values())
+        self.memo.update(zip(new_secrets, scores))
+
+    def _get_pool(self):
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor  # loads multiprocessing, only for large reports
+
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def render(self):
+        total = sum(self.counts.values())
+        verdicts = ', '.join(f"{self.counts[verdict]} {verdict}" for verdict in VERDICTS if self.counts[verdict])
+        kept = total if self.action == "mark" else self.counts[LIKELY]
+        return f"Triage: {total} findings ({verdicts or 'none'}), {kept} kept ({self.memo_hits} memoised)"
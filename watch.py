@@ -0,0 +1,345 @@
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+import controller
+from prefilter import DEFAULT_EXCLUDES, IgnoreRules
+from staging import SCRATCH_PREFIX, restore_findings, scratch_directory, stage_file
+
+logger = logging.getLogger(__name__)
+
+WATCH_BACKENDS = ("auto", "inotify", "poll")
+# git rewrites its objects and index all the time, the working tree is what matters. the files staged inside the
+# tree itself (see scratch_directory) are no changes either
+WATCH_EXCLUDES = (".git/", f"{SCRATCH_PREFIX}*/")
+DEFAULT_DEBOUNCE = 0.1  # seconds without a change before the batch of changed files is scanned
+MAX_DEBOUNCE = 1.0  # a burst that never settles is still scanned after this many seconds
+DEFAULT_POLL_INTERVAL = 0.5
+EVENT_BUFFER_SIZE = 64 * 1024
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len (of the name that follows)
+
+
+def walk_tree(root, directory, rules, skip_paths=()):
+    """ returns (directories, files) below `directory` (itself included), leaving out the ignored ones """
+    directories, files = [], []
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        directories.append(current)
+        try:
+            entries = list(os.scandir(current))
+        except OSError:  # removed in the meantime
+            continue
+        for entry in entries:
+            if entry.path in skip_paths:
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if rules.ignored(os.path.relpath(entry.path, root), is_dir=is_dir):
+                continue
+            if is_dir:
+                pending.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files.append(entry.path)
+    return directories, files
+
+
+class PollingWatcher:
+    """ the portable backend: an index of the (mtime, size, inode) of every file, rebuilt every `interval`.
+    a change costs up to `interval` of latency and every poll walks the whole tree """
+
+    def __init__(self, root, rules, skip_paths=(), interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.rules = rules
+        self.skip_paths = set(skip_paths)
+        self.interval = interval
+        self._index = self._snapshot()
+
+    def files(self):
+        return set(self._index)
+
+    def _snapshot(self):
+        index = {}
+        for file_path in walk_tree(self.root, self.root, self.rules, self.skip_paths)[1]:
+            try:
+                file_stat = os.stat(file_path, follow_symlinks=False)
+            except OSError:
+                continue
+            index[file_path] = (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino)
+        return index
+
+    def changes(self, timeout):
+        """ the files added, modified or deleted since the last call, waits up to `timeout` seconds """
+        time.sleep(min(timeout, self.interval))
+        index = self._snapshot()
+        changed = {path for path, signature in index.items() if self._index.get(path) != signature}
+        changed.update(path for path in self._index if path not in index)
+        self._index = index
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """ the Linux backend: a watch on every directory of the tree, through inotify (libc, with ctypes).
+    changes are reported as soon as the file is closed, renamed or deleted. a directory created or moved into
+    the tree is watched and reported as a whole, an overflow of the event queue reports the root (rescan all) """
+
+    def __init__(self, root, rules, skip_paths=()):
+        import ctypes  # only the watch mode needs it
+
+        self.root = root
+        self.rules = rules
+        self.skip_paths = set(skip_paths)
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._get_errno = ctypes.get_errno
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(self._get_errno(), f"inotify_init1: {os.strerror(self._get_errno())}")
+        self._directories = {}  # watch descriptor -> directory
+        try:
+            self._files = self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def files(self):
+        """ the files of the tree when the watch started """
+        return set(self._files)
+
+    def _watch_tree(self, directory):
+        directories, files = walk_tree(self.root, directory, self.rules, self.skip_paths)
+        for path in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = self._get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR):  # removed before it could be watched
+                    continue
+                raise OSError(error, f"inotify_add_watch: {os.strerror(error)} (see fs.inotify.max_user_watches)",
+                              path)
+            self._directories[wd] = path
+        return files
+
+    def changes(self, timeout):
+        """ the paths changed since the last call, waits up to `timeout` seconds for the first event """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        changed = set()
+        while ready:
+            try:
+                data = os.read(self._fd, EVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            changed.update(self._parse(data))
+        return changed
+
+    def _parse(self, data):
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0'))
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Too many changes at once (inotify queue overflow), rescanning the whole tree")
+                yield self.root
+                continue
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                del self._directories[wd]
+                continue
+            path = os.path.join(directory, name)
+            if path in self.skip_paths or self.rules.ignored(os.path.relpath(path, self.root),
+                                                             is_dir=bool(mask & IN_ISDIR)):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(path)  # its files may have been written before the watch was added
+            elif mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                self._unwatch_tree(path)  # its watches would keep reporting the old paths
+            yield path
+
+    def _unwatch_tree(self, directory):
+        prefix = directory + os.sep
+        for wd, path in list(self._directories.items()):
+            if path == directory or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._directories[wd]
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(root, rules, skip_paths=(), backend="auto", interval=DEFAULT_POLL_INTERVAL):
+    """ inotify when available (auto), otherwise the polling backend """
+    if backend != "poll":
+        try:
+            return InotifyWatcher(root, rules, skip_paths)
+        except (OSError, AttributeError) as e:
+            if backend == "inotify":
+                raise
+            logger.warning(f"inotify is not usable ({str(e)}), polling every {interval} seconds instead")
+    return PollingWatcher(root, rules, skip_paths, interval)
+
+
+def iter_change_batches(watcher, debounce=DEFAULT_DEBOUNCE, max_debounce=MAX_DEBOUNCE, stop=None,
+                        wait=DEFAULT_POLL_INTERVAL):
+    """ yields the sets of changed paths, a burst of changes (a checkout, a build, an editor saving through a
+    temporary file) is collected until nothing changed for `debounce` seconds, or `max_debounce` passed """
+    while stop is None or not stop.is_set():
+        changed = watcher.changes(wait)
+        if not changed:
+            continue
+        deadline = time.monotonic() + max_debounce
+        while time.monotonic() < deadline:
+            more = watcher.changes(min(debounce, max(deadline - time.monotonic(), 0)))
+            if not more:
+                break
+            changed |= more
+        yield changed
+
+
+class WatchSession:
+    """ the findings of a watched tree, kept in memory per file. every pass only stages and scans the changed
+    files, with one small Gitleaks run, and replaces their findings. the whole set is then written back to the
+    report and to the custom output, as a full scan would have """
+
+    def __init__(self, root, report_path, rules, skip_paths=(), config_path=None):
+        self.root = root
+        self.report_path = report_path
+        self.rules = rules
+        self.skip_paths = set(skip_paths)
+        self.config_path = config_path
+        self.findings = {}  # file path -> raw Gitleaks findings
+        self.passes = 0
+
+    def rescan(self, paths):
+        """ scan the changed paths (files or whole directories) and forget the deleted ones,
+        returns the new raw findings of the changed files """
+        files = set()
+        for path in paths:
+            if os.path.isdir(path):
+                files.update(walk_tree(self.root, path, self.rules, self.skip_paths)[1])
+                self._forget(path, keep=files)
+            elif os.path.isfile(path):
+                files.add(path)
+            else:
+                self._forget(path)
+        new_findings = self._scan(files) if files else []
+        self.passes += 1
+        return new_findings
+
+    def _forget(self, path, keep=()):
+        prefix = path.rstrip(os.sep) + os.sep
+        for file_path in [file_path for file_path in self.findings
+                          if (file_path == path or file_path.startswith(prefix)) and file_path not in keep]:
+            del self.findings[file_path]
+
+    def _scan(self, files):
+        with scratch_directory(self.root, 'gitleaks-watch-') as scratch_dir:
+            staging_dir = os.path.join(scratch_dir, 'staging')
+            report_path = os.path.join(scratch_dir, 'report.json')
+            os.makedirs(staging_dir)
+            staged, copied = set(), 0
+            for file_path in files:
+                try:
+                    copied += stage_file(file_path, os.path.join(staging_dir, os.path.relpath(file_path, self.root)))
+                    staged.add(file_path)
+                except OSError:  # deleted before it was staged
+                    self._forget(file_path)
+            if copied:
+                logger.warning(f"{copied} changed files were copied to {staging_dir}, they cannot be hard linked "
+                               f"there (another filesystem?)")
+            process = controller.run_gitleaks(staging_dir, 'report.json', report_path=report_path,
+                                              config_path=self.config_path)
+            controller.exit_if_killed(process)
+            if process is None or process.returncode not in (0, 1):
+                return []  # the failure was already reported, keep the previous findings of these files
+
+            findings_per_file = {file_path: [] for file_path in staged}
+            for finding in restore_findings(controller.iter_findings_from_output_file(report_path), staging_dir,
+                                            self.root):
+                findings_per_file.setdefault(finding['File'], []).append(finding)
+        new_findings = []
+        for file_path, findings in findings_per_file.items():
+            if findings:
+                self.findings[file_path] = findings
+                new_findings.extend(findings)
+            else:
+                self.findings.pop(file_path, None)
+        return new_findings
+
+    def count(self):
+        return sum(len(findings) for findings in self.findings.values())
+
+    def write_report(self):
+        return controller.write_report((finding for file_path in sorted(self.findings)
+                                        for finding in self.findings[file_path]), self.report_path)
+
+
+def run_watch(directory, report_path, rules=None, config_path=None, output_format="json", custom_output_dir=None,
+              show_result=True, bonus=False, validate=False, skip_paths=(), backend="auto",
+              debounce=DEFAULT_DEBOUNCE, interval=DEFAULT_POLL_INTERVAL, stop=None, on_pass=None):
+    """ scan `directory`, then keep rescanning the files that change until interrupted (or `stop` is set).
+    after every pass the report and the custom output hold every current finding, and the findings of the
+    changed files are printed. `on_pass(session, new_findings)` is called after every pass """
+    root = os.path.abspath(directory)
+    watch_rules = IgnoreRules(WATCH_EXCLUDES)  # first, so that the caller's patterns can re-include them
+    watch_rules.rules.extend((rules if rules is not None else IgnoreRules(DEFAULT_EXCLUDES)).rules)
+    custom_output_dir = custom_output_dir or root
+    skip_paths = {os.path.abspath(path) for path in (
+        report_path, *skip_paths,
+        *(os.path.join(custom_output_dir, controller.with_format_extension(controller.CUSTOM_OUTPUT_FILENAME,
+                                                                           output_format))
+          for output_format in controller.OUTPUT_FORMATS))}
+
+    session = WatchSession(root, report_path, watch_rules, skip_paths, config_path)
+    watcher = make_watcher(root, watch_rules, skip_paths, backend, interval)
+    logger.info(f"Watching {root} with {type(watcher).__name__}, Ctrl-C to stop")
+    try:
+        _emit(session, session.rescan(watcher.files()), output_format, custom_output_dir, show_result, bonus,
+              validate, on_pass, time.monotonic())
+        for changed in iter_change_batches(watcher, debounce, stop=stop, wait=interval):
+            start = time.monotonic()
+            _emit(session, session.rescan(changed), output_format, custom_output_dir, show_result, bonus, validate,
+                  on_pass, start, changed)
+    except KeyboardInterrupt:
+        logger.info("Watch mode stopped")
+    finally:
+        watcher.close()
+    return session
+
+
+def _emit(session, new_findings, output_format, custom_output_dir, show_result, bonus, validate, on_pass, start,
+          changed=None):
+    session.write_report()
+    custom_output = controller.parse_json_output(os.path.dirname(session.report_path),
+                                                 os.path.basename(session.report_path), output_format=output_format,
+                                                 custom_output_dir=custom_output_dir)
+    controller.consume_findings(custom_output)
+    logger.info(f"Watch pass {session.passes}: {len(changed) if changed is not None else 'all'} changed paths "
+                f"scanned in {time.monotonic() - start:.3f}s, {len(new_findings)} findings in them, "
+                f"{session.count()} in total")
+    if show_result and new_findings:
+        controller.show_results({'findings': controller.transform_findings(new_findings)}, bonus=bonus,
+                                validate=validate)
+    if on_pass is not None:
+        on_pass(session, new_findings)
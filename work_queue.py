@@ -0,0 +1,373 @@
+import contextlib
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import controller
+import scan_limits
+from bonus import log_error_to_file
+from logging_setup import LOG_FILE, add_logging_arguments
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING, STATUS_LEASED, STATUS_DONE, STATUS_FAILED = "pending", "leased", "done", "failed"
+DEFAULT_LEASE = 300  # seconds a claimed target stays reserved without a heartbeat
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 1.0
+BUSY_TIMEOUT = 60  # seconds to wait for the lock of the queue database
+OUTPUT_FILENAME = "output_test.json"  # the default --output_filename of the controller
+
+
+class WorkQueue:
+    """ queue of scan targets shared by a coordinator and any number of workers, in one SQLite database (on a
+    local disk, or a shared filesystem with working locks: every host must see the targets at the same paths).
+    a worker claims a target with a lease that it renews by heartbeats while it scans. the lease of a crashed
+    worker expires, and the target goes back to the queue until it has been tried `max_attempts` times.
+    the leases use the wall clock, the clocks of the hosts are expected to be in sync """
+
+    def __init__(self, queue_path, timeout=BUSY_TIMEOUT):
+        import sqlite3  # only the distributed mode needs it
+
+        self.queue_path = queue_path
+        self.connection = sqlite3.connect(queue_path, timeout=timeout, isolation_level=None)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS targets (
+                id INTEGER PRIMARY KEY,
+                target TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                exit_code INTEGER,
+                error TEXT,
+                findings TEXT,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS targets_status ON targets (status, id);
+        ''')
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """ a write transaction, the lock is taken at BEGIN so that two workers never claim the same target """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def reset(self, targets, options):
+        """ start a new run: forget the previous targets and results, queue `targets` with the scan `options` """
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM targets")
+            connection.execute("DELETE FROM meta")
+            connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                   ((key, json.dumps(value)) for key, value in options.items()))
+            connection.executemany("INSERT OR IGNORE INTO targets (target, status) VALUES (?, ?)",
+                                   ((target, STATUS_PENDING) for target in targets))
+
+    def options(self):
+        return {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM meta")}
+
+    def claim(self, worker, lease=DEFAULT_LEASE):
+        """ reserve the next pending target for `worker`, returns (id, target), or None when nothing is pending """
+        now = time.time()
+        with self._transaction() as connection:
+            self._expire_leases(connection, now)
+            row = connection.execute("SELECT id, target FROM targets WHERE status = ? ORDER BY id LIMIT 1",
+                                     (STATUS_PENDING,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE targets SET status = ?, worker = ?, lease_expires = ?, "
+                                   "attempts = attempts + 1 WHERE id = ?", (STATUS_LEASED, worker, now + lease, row[0]))
+        return row
+
+    def heartbeat(self, target_id, worker, lease=DEFAULT_LEASE):
+        """ renew the lease, returns False when the worker lost it (it expired and the target was retried) """
+        with self._transaction() as connection:
+            cursor = connection.execute("UPDATE targets SET lease_expires = ? WHERE id = ? AND worker = ? "
+                                        "AND status = ?", (time.time() + lease, target_id, worker, STATUS_LEASED))
+        return cursor.rowcount == 1
+
+    def complete(self, target_id, worker, exit_code, findings):
+        """ store the findings of a scanned target, ignored (returns False) when the worker lost the lease """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE targets SET status = ?, exit_code = ?, findings = ?, error = NULL, lease_expires = NULL, "
+                "finished_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (STATUS_DONE, exit_code, json.dumps(findings), time.time(), target_id, worker, STATUS_LEASED))
+        return cursor.rowcount == 1
+
+    def fail(self, target_id, worker, exit_code, error):
+        """ record a failed scan, the target is retried until it has been tried `max_attempts` times """
+        max_attempts = self.options().get('max_attempts', DEFAULT_MAX_ATTEMPTS)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE targets SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, exit_code = ?, error = ?, "
+                "worker = NULL, lease_expires = NULL, finished_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (max_attempts, STATUS_FAILED, STATUS_PENDING, exit_code, error, time.time(), target_id, worker,
+                 STATUS_LEASED))
+        return cursor.rowcount == 1
+
+    def expire_leases(self):
+        """ give the targets of the workers that stopped sending heartbeats back to the queue """
+        with self._transaction() as connection:
+            return self._expire_leases(connection, time.time())
+
+    def _expire_leases(self, connection, now):
+        max_attempts = self.options().get('max_attempts', DEFAULT_MAX_ATTEMPTS)
+        cursor = connection.execute(
+            "UPDATE targets SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = 'the lease of worker ' || worker || ' expired', worker = NULL, lease_expires = NULL "
+            "WHERE status = ? AND lease_expires < ?",
+            (max_attempts, STATUS_FAILED, STATUS_PENDING, STATUS_LEASED, now))
+        if cursor.rowcount:
+            logger.warning(f"{cursor.rowcount} leases expired (crashed or stuck workers), their targets are back "
+                           f"in the queue, or given up after {max_attempts} attempts")
+        return cursor.rowcount
+
+    def counts(self):
+        counts = dict.fromkeys((STATUS_PENDING, STATUS_LEASED, STATUS_DONE, STATUS_FAILED), 0)
+        counts.update(self.connection.execute("SELECT status, COUNT(*) FROM targets GROUP BY status"))
+        return counts
+
+    def finished(self):
+        counts = self.counts()
+        return counts[STATUS_PENDING] == counts[STATUS_LEASED] == 0
+
+    def failures(self):
+        return self.connection.execute("SELECT target, exit_code, error FROM targets WHERE status = ? ORDER BY id",
+                                       (STATUS_FAILED,)).fetchall()
+
+    def iter_findings(self):
+        """ the custom findings of every scanned target, one target at a time """
+        for (findings,) in self.connection.execute("SELECT findings FROM targets WHERE status = ? ORDER BY id",
+                                                   (STATUS_DONE,)):
+            yield from json.loads(findings)
+
+    def close(self):
+        self.connection.close()
+
+
+class Heartbeat(threading.Thread):
+    """ renews the lease of the target being scanned, from its own connection to the queue """
+
+    def __init__(self, queue_path, target_id, worker, lease):
+        super().__init__(name="heartbeat", daemon=True)
+        self.queue_path = queue_path
+        self.target_id = target_id
+        self.worker = worker
+        self.lease = lease
+        self.lost = False
+        self._stopped = threading.Event()
+
+    def run(self):
+        queue = WorkQueue(self.queue_path)
+        try:
+            while not self._stopped.wait(self.lease / 3):
+                if not queue.heartbeat(self.target_id, self.worker, self.lease):
+                    self.lost = True
+                    logger.warning(f"Worker {self.worker} lost the lease of target {self.target_id}")
+                    return
+        finally:
+            queue.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def scan_target(target, options):
+    """ scan one target like a single --dir run, returns (exit code, custom findings or None, error) """
+    output_filename = options.get('output_filename', OUTPUT_FILENAME)
+    if not os.path.isdir(target):
+        return 2, None, f"The directory {target} does not exist."
+    try:
+        process = controller.scan_directory(target, output_filename, options.get('config'))
+        if process is None:
+            return 2, None, "Gitleaks could not be started"
+        if process.returncode not in (0, 1):
+            return process.returncode, None, process.stderr or f"Gitleaks failed with exit code {process.returncode}"
+        custom_output = controller.parse_json_output(target, output_filename, save_customize_output=False)
+        return process.returncode, list(custom_output['findings']), None
+    except SystemExit as e:  # no Gitleaks binary, an unreadable report... (already logged to error.json)
+        return e.code, None, f"The scan of {target} exited with {e.code}"
+
+
+def run_worker(queue_path, worker=None, lease=DEFAULT_LEASE, poll_interval=DEFAULT_POLL_INTERVAL, wait=False,
+               max_targets=None):
+    """ claim and scan targets until the queue is finished (or forever with `wait`), returns the number of
+    targets scanned """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(queue_path)
+    scanned = 0
+    try:
+        options = queue.options()
+        scan_limits.configure(timeout=options.get('timeout'))
+        while max_targets is None or scanned < max_targets:
+            claimed = queue.claim(worker, lease)
+            if claimed is None:
+                if queue.finished() and not wait:
+                    break
+                time.sleep(poll_interval)  # the other targets are leased, one may expire
+                continue
+
+            target_id, target = claimed
+            logger.info(f"Worker {worker} scanning {target}")
+            heartbeat = Heartbeat(queue_path, target_id, worker, lease)
+            heartbeat.start()
+            try:
+                exit_code, findings, error = scan_target(target, options)
+            finally:
+                heartbeat.stop()
+            if findings is not None:
+                stored = queue.complete(target_id, worker, exit_code, findings)
+            else:
+                stored = queue.fail(target_id, worker, exit_code, error)
+            if not stored:
+                logger.warning(f"Worker {worker} lost the lease of {target}, its result was dropped")
+            scanned += 1
+    finally:
+        queue.close()
+    logger.info(f"Worker {worker} done, {scanned} targets scanned")
+    return scanned
+
+
+def worker_log_file(log_file, index):
+    """ the log file of the local worker `index`: runtime_logs.log -> runtime_logs.worker-0.log. every worker needs
+    its own, each process rotates its log file at start-up ('' disables it, like for the coordinator) """
+    if not log_file:
+        return ''
+    root, extension = os.path.splitext(log_file)
+    return f"{root}.worker-{index}{extension}"
+
+
+def spawn_workers(queue_path, count, log_level="INFO", poll_interval=DEFAULT_POLL_INTERVAL, log_file=LOG_FILE):
+    """ start local worker processes (`controller.py worker`) """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'controller.py')
+    return [subprocess.Popen([sys.executable, script, 'worker', '--queue', queue_path, '--log_level', log_level,
+                              '--poll_interval', str(poll_interval), '--log_file', worker_log_file(log_file, index)])
+            for index in range(count)]
+
+
+def run_coordinator(queue_path, targets, combined_output_filepath, options, workers=0,
+                    poll_interval=DEFAULT_POLL_INTERVAL, output_format="json", log_level="INFO", log_file=LOG_FILE):
+    """ queue the targets, wait for the workers (the local ones started here and any other) to scan them all,
+    then merge their findings into the combined output. returns (findings, failed targets) """
+    queue = WorkQueue(queue_path)
+    processes = []
+    try:
+        queue.reset(targets, options)
+        logger.info(f"Queued {len(targets)} targets in {queue_path}")
+        processes = spawn_workers(queue_path, workers, log_level, poll_interval, log_file)
+        progress = None
+        while not queue.finished():
+            queue.expire_leases()
+            counts = queue.counts()
+            if counts != progress:
+                logger.info(f"Queue progress: {', '.join(f'{count} {status}' for status, count in counts.items())}")
+                progress = counts
+            if processes and all(process.poll() is not None for process in processes) and not queue.finished():
+                logger.warning("All the local workers exited, waiting for remote workers")
+                processes = []
+            time.sleep(poll_interval)
+
+        combined_output_filepath = controller.with_format_extension(combined_output_filepath, output_format)
+        count = controller._drain(controller.write_custom_output(queue.iter_findings(), combined_output_filepath,
+                                                                 output_format))
+        failures = queue.failures()
+    finally:
+        for process in processes:
+            process.wait()
+        queue.close()
+    logger.info(f"Merged the findings of {len(targets) - len(failures)} targets into {combined_output_filepath}")
+    return count, failures
+
+
+def get_parser(command):
+    """ returns an argument parser for `controller.py coordinate` or `controller.py worker` """
+    if command == 'coordinate':
+        parser = controller.MyCustomArgumentParser(
+            prog='controller.py coordinate',
+            description='Queue the directories to scan for a pool of workers, and merge their findings.'
+        )
+        parser.add_argument('--dir', dest='dirname', type=str, action=controller.DirectoryListAction,
+                            default=os.getcwd(), help="Directory to scan, repeat the flag for several directories.")
+        parser.set_defaults(dirnames=None)
+        parser.add_argument('--manifest', dest='manifest', type=str, default=None,
+                            help="File listing the directories to scan, one per line. Default: None")
+        parser.add_argument('--workers', dest='workers', type=int, default=0,
+                            help="Local worker processes to start, the others join with `controller.py worker "
+                                 "--queue ...`. Default: 0")
+        parser.add_argument('--combined_output', dest='combined_output', type=str,
+                            default=controller.COMBINED_OUTPUT_FILENAME,
+                            help=f"Custom output merging the findings of every target. "
+                                 f"Default: {controller.COMBINED_OUTPUT_FILENAME}")
+        parser.add_argument('--format', dest='output_format', choices=controller.OUTPUT_FORMATS, default="json",
+                            help="Format of the combined output. Default: json")
+        parser.add_argument('--config', dest='config', type=str, default=None,
+                            help="Gitleaks config file used by every worker. Default: None")
+        parser.add_argument('--output_filename', dest='output_filename', type=str,
+                            default=OUTPUT_FILENAME,
+                            help=f"Report written by the workers into each directory. "
+                                 f"Default: {OUTPUT_FILENAME}")
+        parser.add_argument('--timeout', dest='timeout', type=float, default=None,
+                            help="Wall-clock limit of every scan, in seconds. Default: no limit")
+        parser.add_argument('--max_attempts', dest='max_attempts', type=controller.positive_int,
+                            default=DEFAULT_MAX_ATTEMPTS,
+                            help=f"Tries of a target (failed scans, expired leases) before it is given up. "
+                                 f"Default: {DEFAULT_MAX_ATTEMPTS}")
+    else:
+        parser = controller.MyCustomArgumentParser(
+            prog='controller.py worker',
+            description='Scan the directories queued by `controller.py coordinate`.'
+        )
+        parser.add_argument('--worker_id', dest='worker_id', type=str, default=None,
+                            help="Name of the worker in the queue. Default: <hostname>:<pid>")
+        parser.add_argument('--lease', dest='lease', type=float, default=DEFAULT_LEASE,
+                            help=f"Seconds a claimed target stays reserved without a heartbeat (renewed every "
+                                 f"third of it while scanning). Default: {DEFAULT_LEASE}")
+        parser.add_argument('--wait', dest='wait', action='store_true', default=False,
+                            help="Keep waiting for new targets when the queue is finished. Default: False")
+    parser.add_argument('--queue', dest='queue', type=str, required=True,
+                        help="SQLite database of the work queue, on a filesystem shared by every host.")
+    parser.add_argument('--poll_interval', dest='poll_interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"Seconds between two checks of the queue. Default: {DEFAULT_POLL_INTERVAL}")
+    parser.set_defaults(command=command)
+    add_logging_arguments(parser)
+    return parser
+
+
+def main(__args__):
+    import sqlite3
+
+    try:
+        if __args__.command == 'worker':
+            run_worker(__args__.queue, __args__.worker_id, __args__.lease, __args__.poll_interval, __args__.wait)
+            return
+
+        targets = [os.path.abspath(dirname) for dirname in controller.get_scan_directories(__args__)]
+        options = {"config": __args__.config, "output_filename": __args__.output_filename,
+                   "timeout": __args__.timeout, "max_attempts": __args__.max_attempts}
+        count, failures = run_coordinator(__args__.queue, targets, __args__.combined_output, options,
+                                          __args__.workers, __args__.poll_interval, __args__.output_format,
+                                          __args__.log_level, __args__.log_file)
+    except sqlite3.Error as e:
+        log_error_to_file(exit_code=2, error_message=f"Failed to use the work queue {__args__.queue}: {str(e)}")
+        sys.exit(2)
+    except KeyboardInterrupt:
+        logger.info("Stopped, the queue can be resumed by the workers")
+        return
+
+    logger.info(f"{count} findings in {len(targets)} targets")
+    if failures:
+        error_message = "; ".join(f"{target}: {error} (exit code {exit_code})" for target, exit_code, error in failures)
+        logger.error(f"{len(failures)} targets failed: {error_message}")
+        log_error_to_file(exit_code=2, error_message=error_message)
+        sys.exit(2)